@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+API load and latency benchmark
+
+Seeds a throwaway test database with a synthetic HN-shaped corpus (see
+seed.py), serves the app with gunicorn against it, and drives each endpoint
+at a fixed concurrency:
+
+- list:      GET /api/items/ across the first pages
+- search:    GET /api/items/?search=<word>
+- filter:    GET /api/items/?type=story&by=<user>
+- ordering:  GET /api/items/?ordering=-score
+- detail:    GET /api/items/<id>/ for stories with comments
+- sync:      POST /api/sync/, syncing from a local fake HN API
+
+For every endpoint it reports req/s, p50/p95/p99 latency and the number of
+SQL queries per request (measured in-process with the Django test client).
+Seeding millions of items takes a few minutes; pass --keepdb to keep the
+seeded database for the next run.
+
+Usage:
+    python -m benchmarks.api_load --items 1000000 --concurrency 32 --duration 20 --keepdb --json api.json
+"""
+import argparse, json, logging, random, statistics
+
+from .common import clear_items, django_test_database, free_port, gunicorn, print_table, run_load
+from .fake_hn import Corpus, FakeHackerNews
+from .seed import WORDS, seed_database
+
+ENDPOINTS = {
+    "list": ("GET", "/api/items/?page={page}"),
+    "search": ("GET", "/api/items/?search={word}"),
+    "filter": ("GET", "/api/items/?type=story&by={user}"),
+    "ordering": ("GET", "/api/items/?ordering=-score&page={page}"),
+    "detail": ("GET", "/api/items/{item_id}/"),
+    "sync": ("POST", "/api/sync/"),
+}
+
+
+def ensure_corpus(args):
+    """Seed the test database unless it already holds a corpus of the requested size"""
+    from news.models import Item
+    existing = Item.objects.count()
+    if existing >= args.items * 0.9 and not args.reseed:
+        print(f"Using the {existing} items already in the test database")
+        return existing
+
+    clear_items()
+    print(f"Seeding {args.items} items...", flush=True)
+    stats = seed_database(
+        args.items,
+        seed=args.seed,
+        progress=lambda s: print(f"  {s['read']} items", flush=True),
+    )
+    print(f"Seeded {stats['inserted']} items at {stats['rows_per_sec']:.0f} rows/sec")
+    return Item.objects.count()
+
+
+def endpoint_paths(args):
+    """Concrete request paths for every endpoint"""
+    from news.models import Item
+    rng = random.Random(args.seed)
+    item_ids = list(
+        Item.objects.filter(type='story', descendants__gt=0).order_by('?').values_list('item_id', flat=True)[:args.variants]
+    )
+    users = list(
+        Item.objects.filter(type='story').order_by('?').values_list('by', flat=True)[:args.variants]
+    )
+
+    def paths(template):
+        return [
+            template.format(
+                page=index % 20 + 1,
+                word=rng.choice(WORDS),
+                user=users[index % len(users)] if users else 'user1',
+                item_id=item_ids[index % len(item_ids)] if item_ids else 1,
+            )
+            for index in range(args.variants)
+        ]
+
+    return {name: (method, paths(template)) for name, (method, template) in ENDPOINTS.items()}
+
+
+def queries_per_request(method, paths, sync_count, samples=5):
+    """Average number of SQL queries for a few of the paths, using the test client"""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    counts = []
+    for path in paths[:samples]:
+        with CaptureQueriesContext(connection) as context:
+            if method == 'POST':
+                client.post(path, {"count": sync_count}, content_type='application/json')
+            else:
+                client.get(path)
+        counts.append(len(context.captured_queries))
+    return round(statistics.mean(counts), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the item and sync endpoints")
+    parser.add_argument("--items", type=int, default=1000000, help="Approximate size of the seeded corpus")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the corpus and requests")
+    parser.add_argument("--reseed", action="store_true", help="Seed again even if the test database has a corpus")
+    parser.add_argument("--keepdb", action="store_true", help="Keep the seeded test database for the next run")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run each endpoint")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--variants", type=int, default=50, help="Distinct paths requested per endpoint")
+    parser.add_argument("--sync-count", type=int, default=30, help="count sent with each sync request")
+    parser.add_argument("--hn-latency", type=float, default=0.02, help="Latency of the fake HN API, in seconds")
+    parser.add_argument("--endpoint", action="append", choices=list(ENDPOINTS), help="Only run this endpoint (repeatable)")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    with django_test_database(keepdb=args.keepdb) as connection:
+        logging.getLogger('news').setLevel(logging.WARNING)
+        from news.models import Item
+        from news.services import HackerNewsAPI
+
+        corpus_size = ensure_corpus(args)
+        max_id = Item.objects.order_by('-item_id').values_list('item_id', flat=True).first() or 0
+        fake_corpus = Corpus(stories=200, first_id=max_id + 1)
+        selected = {name: spec for name, spec in endpoint_paths(args).items()
+                    if not args.endpoint or name in args.endpoint}
+
+        rows = []
+        with FakeHackerNews(fake_corpus, latency=args.hn_latency) as fake:
+            HackerNewsAPI.BASE_URL = fake.base_url
+            queries = {
+                name: queries_per_request(method, paths, args.sync_count)
+                for name, (method, paths) in selected.items()
+            }
+
+            port = free_port()
+            env = {'DB_NAME': connection.settings_dict['NAME'], 'HN_API_BASE_URL': fake.base_url}
+            with gunicorn(port, args.workers, env=env):
+                base_url = f"http://127.0.0.1:{port}"
+                for name, (method, paths) in selected.items():
+                    urls = [base_url + path for path in paths]
+                    body = {"count": args.sync_count} if method == 'POST' else None
+                    # Warm up connections and caches before measuring
+                    run_load(urls, args.concurrency, min(args.duration, 2), method=method, json_body=body)
+                    stats = run_load(urls, args.concurrency, args.duration, method=method, json_body=body)
+                    rows.append({"endpoint": name, **stats, "queries_per_request": queries[name]})
+                    print(f"  {name}: {stats['req_per_sec']} req/s, p99 {stats['p99_ms']} ms, "
+                          f"{queries[name]} queries/request", flush=True)
+
+    print()
+    print_table(rows, ["endpoint", "requests", "errors", "req_per_sec", "p50_ms", "p95_ms", "p99_ms",
+                       "queries_per_request"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json"},
+                "corpus_items": corpus_size,
+                "results": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+ASGI vs WSGI read path benchmark
+
+Starts the app under gunicorn (WSGI, as in the Procfile) and under uvicorn
+(ASGI), drives the list, detail and thread endpoints at a fixed concurrency
+and reports req/s and latency percentiles for:
+
+- wsgi:       gunicorn serving the DRF views (/api/items/...)
+- asgi-sync:  uvicorn serving the same DRF views through sync_to_async
+- asgi-async: uvicorn serving the async views (/api/async/items/...)
+
+The database configured through the usual DB_* environment variables must
+already contain synced items.
+
+Usage:
+    python -m benchmarks.asgi_vs_wsgi --concurrency 32 --duration 20
+"""
+import argparse, json, sys
+
+import requests
+
+from .common import free_port, gunicorn, print_table, run_load, uvicorn
+
+ENDPOINTS = {
+    "list": "/api/{prefix}items/?type=story&ordering=-score",
+    "detail": "/api/{prefix}items/{item_id}/",
+    "thread": "/api/{prefix}items/{item_id}/thread/",
+}
+
+
+def sample_item_ids(base_url, count):
+    """Pick stories with comments to use for the detail and thread endpoints"""
+    response = requests.get(f"{base_url}/api/items/?type=story&ordering=-descendants", timeout=30)
+    response.raise_for_status()
+    ids = [item["item_id"] for item in response.json()["results"]][:count]
+    if not ids:
+        sys.exit("No stories in the database, run a sync first")
+    return ids
+
+
+def bench_server(label, base_url, prefix, item_ids, args):
+    rows = []
+    for endpoint, template in ENDPOINTS.items():
+        urls = [base_url + template.format(prefix=prefix, item_id=item_id) for item_id in item_ids]
+        # Warm up connections and caches before measuring
+        run_load(urls, args.concurrency, min(args.duration, 2))
+        stats = run_load(urls, args.concurrency, args.duration)
+        rows.append({"server": label, "endpoint": endpoint, **stats})
+        print(f"  {label} {endpoint}: {stats['req_per_sec']} req/s, p99 {stats['p99_ms']} ms", flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the WSGI and ASGI read paths")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run each endpoint")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes")
+    parser.add_argument("--items", type=int, default=20, help="Number of distinct items to request")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    port = free_port()
+    with gunicorn(port, args.workers):
+        base_url = f"http://127.0.0.1:{port}"
+        item_ids = sample_item_ids(base_url, args.items)
+        rows += bench_server("wsgi", base_url, "", item_ids, args)
+
+    port = free_port()
+    with uvicorn(port, args.workers):
+        base_url = f"http://127.0.0.1:{port}"
+        rows += bench_server("asgi-sync", base_url, "", item_ids, args)
+        rows += bench_server("asgi-async", base_url, "async/", item_ids, args)
+
+    print()
+    print_table(rows, ["server", "endpoint", "requests", "errors", "req_per_sec", "p50_ms", "p95_ms", "p99_ms"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"concurrency": args.concurrency, "workers": args.workers, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Shared helpers for the benchmark scripts: HTTP load generation, latency
+statistics, managing local app servers and running Django in-process.
+"""
+import contextlib, math, os, resource, socket, statistics, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values (nearest rank)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Summarize request latencies (in seconds) as milliseconds and req/s"""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def run_load(urls, concurrency, duration, method='GET', json_body=None, on_response=None):
+    """
+    Hit urls round-robin from `concurrency` threads for `duration` seconds.
+
+    Returns summarize() of the successful requests. on_response, if given, is
+    called with every successful response.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        local = []
+        failed = 0
+        i = offset
+        while time.monotonic() < deadline:
+            url = urls[i % len(urls)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, json=json_body, timeout=30)
+                took = time.perf_counter() - start
+                if response.status_code >= 400:
+                    failed += 1
+                    continue
+                local.append(took)
+                if on_response:
+                    on_response(response)
+            except requests.RequestException:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(latencies, time.monotonic() - started, errors[0])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start within {timeout} seconds")
+
+
+class Server:
+    """Run an app server command from the project root for the duration of a with block"""
+
+    def __init__(self, args, port, env=None):
+        self.args = args
+        self.port = port
+        self.env = dict(os.environ, SCHEDULER_AUTOSTART='false', **(env or {}))
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.args, cwd=ROOT, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_port(self.port)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def gunicorn(port, workers, app='zcore.wsgi', extra=(), env=None):
+    return Server([sys.executable, '-m', 'gunicorn', app, '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(workers), *extra], port, env=env)
+
+
+def uvicorn(port, workers, app='zcore.asgi:application', env=None):
+    return Server([sys.executable, '-m', 'uvicorn', app, '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning'], port, env=env)
+
+
+@contextlib.contextmanager
+def django_test_database(keepdb=False):
+    """
+    Set up Django in this process against a throwaway test database.
+
+    The test database is created next to the one configured through the
+    DB_* environment variables (as `test_<name>`) and migrated, so
+    benchmarks never touch real data.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zcore.settings')
+    os.environ['SCHEDULER_AUTOSTART'] = 'false'
+    import django
+    django.setup()
+
+    from django.db import connection
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def clear_items():
+    """Empty the items table with a TRUNCATE rather than Django's cascading delete"""
+    from django.core.management.color import no_style
+    from django.db import connection
+    from news.models import Item
+    sql = connection.ops.sql_flush(no_style(), [Item._meta.db_table], reset_sequences=True)
+    connection.ops.execute_sql_flush(sql)
+
+
+class QueryCounter:
+    """
+    Count SQL statements executed on the default database from any thread.
+
+    Django connections are per thread, so the counter hooks every connection
+    opened while it is installed, as well as the current thread's.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _hook(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+    def __enter__(self):
+        from django.db import connection
+        from django.db.backends.signals import connection_created
+        connection_created.connect(self._hook)
+        self._hook(None, connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        from django.db import connection
+        from django.db.backends.signals import connection_created
+        connection_created.disconnect(self._hook)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return None
+
+
+class PeakMemory:
+    """
+    Track how far this process's RSS grows during a with block.
+
+    RSS is sampled from a background thread, which unlike tracemalloc does
+    not slow down the code being measured. `growth_mb` is the peak RSS minus
+    the RSS when the block started.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def growth_mb(self):
+        if self.start is None or self.peak is None:
+            return None
+        return round((self.peak - self.start) / 1024 / 1024, 2)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, name='peak-memory', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self.peak = max(self.peak, current_rss())
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as an aligned text table"""
+    widths = {c: max(len(c), *(len(str(r.get(c, ''))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, '')).ljust(widths[c]) for c in columns))
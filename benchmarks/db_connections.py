@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Database connection overhead benchmark
+
+Measures what opening Postgres connections costs, with and without reuse:
+
+- requests:  serves the app with gunicorn against a test database, once with
+             DB_CONN_MAX_AGE=0 (a new connection per request) and once with
+             persistent connections, and loads the item detail endpoint,
+             whose single query makes the connect time stand out
+- threads:   runs short-lived threads making one query each, the way sync
+             jobs and read-through fetches use the database, closing their
+             connection at the end versus borrowing from news.db's pool
+
+It reports req/s and latency percentiles, per-thread time, and how many
+connections each variant opened.
+
+Usage:
+    python -m benchmarks.db_connections --concurrency 16 --duration 10 --json connections.json
+"""
+import argparse, json, re, tempfile, threading, time
+
+import requests
+
+from .common import django_test_database, free_port, gunicorn, print_table, run_load
+
+# Variants of the requests benchmark: name -> DB_CONN_MAX_AGE
+REQUEST_VARIANTS = {
+    "connect-per-request": "0",
+    "persistent": "600",
+}
+
+
+def opened_connections(base_url):
+    """db_connections_opened_total as reported by /metrics"""
+    text = requests.get(f"{base_url}/metrics", timeout=10).text
+    return sum(float(value) for value in re.findall(r'^db_connections_opened_total\{[^}]*\} (\S+)$', text, re.M))
+
+
+def ensure_items(count):
+    """Item IDs to request, seeding a small corpus if the test database is empty"""
+    from news.models import Item
+    from .seed import seed_database
+    if not Item.objects.exists():
+        print(f"Seeding {count} items...", flush=True)
+        seed_database(count)
+    return list(Item.objects.order_by('?').values_list('item_id', flat=True)[:200])
+
+
+def request_costs(args, database, item_ids):
+    rows = []
+    for name, max_age in REQUEST_VARIANTS.items():
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            port = free_port()
+            env = {'DB_NAME': database, 'DB_CONN_MAX_AGE': max_age, 'PROMETHEUS_MULTIPROC_DIR': metrics_dir,
+                   'NEWS_LOG_LEVEL': 'WARNING', 'REQUEST_INSTRUMENTATION': 'false'}
+            with gunicorn(port, args.workers, env=env):
+                base_url = f"http://127.0.0.1:{port}"
+                urls = [f"{base_url}/api/items/{item_id}/" for item_id in item_ids]
+                run_load(urls, args.concurrency, min(args.duration, 2))
+                before = opened_connections(base_url)
+                stats = run_load(urls, args.concurrency, args.duration)
+                opened = opened_connections(base_url) - before
+        rows.append({
+            "variant": name,
+            **stats,
+            "connections_opened": int(opened),
+            "connections_per_request": round(opened / stats["requests"], 3) if stats["requests"] else None,
+        })
+        print(f"  {name}: {stats['req_per_sec']} req/s, p50 {stats['p50_ms']} ms", flush=True)
+    return rows
+
+
+def thread_costs(args):
+    from django.db import connection
+    from prometheus_client import REGISTRY
+    from news.db import pooled_connection
+
+    def opened():
+        return REGISTRY.get_sample_value('db_connections_opened_total', {'alias': connection.alias}) or 0
+
+    def query():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    def closing():
+        try:
+            query()
+        finally:
+            connection.close()
+
+    def pooled():
+        with pooled_connection():
+            query()
+
+    rows = []
+    for name, target in [("close-per-thread", closing), ("pooled", pooled)]:
+        opened_before = opened()
+        durations = []
+        for _ in range(args.threads):
+            started = time.perf_counter()
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+            durations.append(time.perf_counter() - started)
+        rows.append({
+            "variant": name,
+            "threads": args.threads,
+            "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+            "connections_opened": int(opened() - opened_before),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure database connect overhead with and without reuse")
+    parser.add_argument("--items", type=int, default=20000, help="Items seeded when the test database is empty")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run each request variant")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=500, help="Short-lived threads run by the thread benchmark")
+    parser.add_argument("--keepdb", action="store_true", help="Keep the test database for the next run")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    with django_test_database(keepdb=args.keepdb) as connection:
+        item_ids = ensure_items(args.items)
+        request_rows = request_costs(args, connection.settings_dict['NAME'], item_ids)
+        thread_rows = thread_costs(args)
+
+    print()
+    print_table(request_rows, ["variant", "requests", "errors", "req_per_sec", "p50_ms", "p95_ms", "p99_ms",
+                               "connections_per_request"])
+    print()
+    print_table(thread_rows, ["variant", "threads", "mean_ms", "connections_opened"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json"},
+                "requests": request_rows,
+                "threads": thread_rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
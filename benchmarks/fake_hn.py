@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the Hacker News Firebase API (hacker-news.firebaseio.com/v0)
+
+Serves a deterministic synthetic corpus of stories with comment trees and
+polls with options, and the profiles of their authors, with configurable latency and error rate, and counts
+the requests it receives. Item IDs increase in creation order like on HN:
+every story is followed by its comments, breadth first, and every poll by
+its options.
+
+Used in-process by the benchmarks, or standalone to sync a local app
+without network access:
+
+    python -m benchmarks.fake_hn --port 8765 --stories 500
+    HN_API_BASE_URL=http://127.0.0.1:8765/v0 python manage.py sync_latest
+"""
+import argparse, json, random, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_TIME = 1700000000
+
+
+class Corpus:
+    """
+    A synthetic HN item tree.
+
+    Each story gets `fanout` top-level comments and every comment `fanout`
+    replies, down to `depth` levels. Every `poll_every`-th story is a poll
+    with `poll_options` options instead (0 disables polls). IDs start at
+    first_id.
+    """
+
+    def __init__(self, stories=100, fanout=3, depth=2, poll_every=10, poll_options=3, seed=1, first_id=1):
+        self.items = {}
+        self.story_ids = []
+        self.leaf_ids = []
+        rng = random.Random(seed)
+        next_id = first_id
+
+        for index in range(stories):
+            root_id = next_id
+            next_id += 1
+            if poll_every and index % poll_every == poll_every - 1:
+                parts = list(range(next_id, next_id + poll_options))
+                next_id += poll_options
+                self._add(root_id, 'poll', title=f"Poll {root_id}", parts=parts, score=rng.randint(1, 500))
+                for part in parts:
+                    self._add(part, 'pollopt', poll=root_id, text=f"Option {part}", score=rng.randint(0, 100))
+                self.story_ids.append(root_id)
+                continue
+
+            self._add(root_id, 'story', title=f"Story {root_id}", url=f"https://example{rng.randint(1, 50)}.com/{root_id}",
+                      score=rng.randint(1, 1000))
+            level = [root_id]
+            descendants = 0
+            for _ in range(depth):
+                next_level = []
+                for parent_id in level:
+                    kids = list(range(next_id, next_id + fanout))
+                    next_id += fanout
+                    self.items[parent_id]['kids'] = kids
+                    for kid_id in kids:
+                        self._add(kid_id, 'comment', parent=parent_id, text=f"Comment {kid_id} " + "lorem ipsum " * rng.randint(1, 20))
+                    next_level.extend(kids)
+                descendants += len(next_level)
+                level = next_level
+            self.items[root_id]['descendants'] = descendants
+            self.leaf_ids.extend(level)
+            self.story_ids.append(root_id)
+
+        self.max_item_id = next_id - 1
+
+    def user(self, username):
+        """The /user/{id}.json profile of an author of the corpus, or None"""
+        submitted = [item_id for item_id, item in self.items.items() if item['by'] == username]
+        if not submitted:
+            return None
+        number = int(username[len('user'):])
+        return {
+            'id': username,
+            'created': BASE_TIME - 86400 * (number + 1),
+            'karma': sum(self.items[item_id].get('score', 1) for item_id in submitted),
+            'about': f"About {username}",
+            'submitted': sorted(submitted, reverse=True),
+        }
+
+    def _add(self, item_id, item_type, **fields):
+        self.items[item_id] = {
+            'id': item_id,
+            'type': item_type,
+            'by': f"user{item_id % 97}",
+            'time': BASE_TIME + item_id,
+            **fields,
+        }
+
+    def new_story_ids(self):
+        """IDs served by /newstories.json, newest first"""
+        return list(reversed(self.story_ids))[:500]
+
+
+class FakeHackerNews:
+    """
+    Serve a Corpus over HTTP in a background thread.
+
+    latency is added to every request (in seconds) and error_rate is the
+    fraction of item requests answered with HTTP 500. Use as a context
+    manager; `base_url` can be assigned to HackerNewsAPI.BASE_URL.
+    """
+
+    def __init__(self, corpus, latency=0.0, error_rate=0.0, port=0, seed=1):
+        self.corpus = corpus
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v0"
+
+    @property
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-hn', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _route(self, path):
+        """Return (kind, body) for a request path, body None for a 404"""
+        path = path.split('?')[0]
+        if path == '/v0/maxitem.json':
+            return 'maxitem', self.corpus.max_item_id
+        if path == '/v0/newstories.json':
+            return 'newstories', self.corpus.new_story_ids()
+        if path.startswith('/v0/item/') and path.endswith('.json'):
+            try:
+                item_id = int(path[len('/v0/item/'):-len('.json')])
+            except ValueError:
+                return 'item', None
+            # HN answers null for IDs that do not exist
+            return 'item', self.corpus.items.get(item_id)
+        if path.startswith('/v0/user/') and path.endswith('.json'):
+            return 'user', self.corpus.user(path[len('/v0/user/'):-len('.json')])
+        return None, None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this,
+            # keep-alive clients stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                kind, body = fake._route(self.path)
+                with fake._lock:
+                    fake.calls[kind or 'unknown'] += 1
+                    fail = kind == 'item' and fake._rng.random() < fake.error_rate
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if kind is None:
+                    status, payload = 404, b'{"error": "Not found"}'
+                elif fail:
+                    status, payload = 500, b'{"error": "Internal error"}'
+                else:
+                    status, payload = 200, json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--stories", type=int, default=100, help="Number of stories and polls")
+    parser.add_argument("--fanout", type=int, default=3, help="Replies per story and per comment")
+    parser.add_argument("--depth", type=int, default=2, help="Levels of comments below each story")
+    parser.add_argument("--poll-every", type=int, default=10, help="Make every Nth story a poll (0: none)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of item requests failing with HTTP 500")
+
+
+def corpus_from_args(args):
+    return Corpus(stories=args.stories, fanout=args.fanout, depth=args.depth, poll_every=args.poll_every)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Hacker News API")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    corpus = corpus_from_args(args)
+    with FakeHackerNews(corpus, latency=args.latency, error_rate=args.error_rate, port=args.port) as fake:
+        print(f"Serving {len(corpus.items)} items (maxitem {corpus.max_item_id}) at {fake.base_url}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
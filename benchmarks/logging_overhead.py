@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Logging overhead benchmark
+
+Measures what logging costs the sync hot paths under each logging setup
+(see LOG_FORMAT, NEWS_LOG_LEVEL and LOG_QUEUE in the settings):
+
+- calls:  cost of one disabled DEBUG call with an f-string message versus
+          %-style arguments, and of one emitted record on the calling thread
+          for every setup
+- sync:   the latest (pipeline) and tree (inline sync_item) scenarios of
+          sync_throughput.py against a local fake HN API, once per setup
+
+Every setup writes the same handlers as the LOGGING setting, with the log
+files in a temporary directory and the console sent to /dev/null.
+
+Usage:
+    python -m benchmarks.logging_overhead --stories 200 --json logging.json
+"""
+import argparse, json, logging, logging.config, os, tempfile, time, timeit
+
+from .common import clear_items, django_test_database, print_table
+from .fake_hn import FakeHackerNews, add_corpus_arguments, corpus_from_args
+from .sync_throughput import scenarios
+
+# name: (LOG_FORMAT, NEWS_LOG_LEVEL, LOG_QUEUE)
+SETUPS = {
+    "text-debug": ("text", "DEBUG", False),
+    "text-info": ("text", "INFO", False),
+    "json-info-queue": ("json", "INFO", True),
+    "json-debug-queue": ("json", "DEBUG", True),
+}
+
+
+def logging_config(directory, console, fmt, level, use_queue):
+    """The LOGGING setting's handlers for one setup, writing into directory"""
+    formatter = 'json' if fmt == 'json' else None
+
+    def rotating(filename, handler_level):
+        return {
+            'level': handler_level,
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(directory, filename),
+            'maxBytes': 1024 * 1024 * 5,
+            'backupCount': 5,
+            'formatter': formatter or 'verbose',
+        }
+
+    config = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'verbose': {'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}', 'style': '{'},
+            'simple': {'format': '{levelname} {asctime} {message}', 'style': '{'},
+            'json': {'()': 'news.log.JsonFormatter'},
+        },
+        'handlers': {
+            'console': {
+                'level': 'DEBUG', 'class': 'logging.StreamHandler', 'stream': console,
+                'formatter': formatter or 'simple',
+            },
+            'file': rotating('debug.log', 'INFO'),
+            'error_file': rotating('error.log', 'ERROR'),
+        },
+        'loggers': {
+            'news': {'handlers': ['console', 'file', 'error_file'], 'level': level, 'propagate': False},
+        },
+    }
+    if use_queue:
+        config['handlers']['queue'] = {
+            '()': 'news.log.QueueListenerHandler',
+            'handlers': ['console', 'file', 'error_file'],
+        }
+        config['loggers']['news']['handlers'] = ['queue']
+    return config
+
+
+def log_lines(directory):
+    """Number of lines written to the INFO log file and its backups"""
+    total = 0
+    for name in os.listdir(directory):
+        if name.startswith('debug.log'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                total += sum(1 for _ in f)
+    return total
+
+
+def reset_logging():
+    """Close every handler, flushing queued records, and detach them from the news logger"""
+    logging.config.dictConfig({'version': 1, 'disable_existing_loggers': False,
+                               'loggers': {'news': {'handlers': [], 'level': 'WARNING'}}})
+
+
+def call_costs(setups, console, iterations):
+    """Microseconds per logging call, on the calling thread"""
+    logger = logging.getLogger('news.benchmark')
+    item_id, url = 12345678, 'https://hacker-news.firebaseio.com/v0/item/12345678.json'
+    rows = []
+
+    logging.getLogger('news').setLevel(logging.INFO)
+    for name, statement in [
+        ("disabled debug, f-string", lambda: logger.debug(f"Fetching item {item_id} from HN API: {url}")),
+        ("disabled debug, %-args", lambda: logger.debug("Fetching item %s from HN API: %s", item_id, url)),
+    ]:
+        seconds = timeit.timeit(statement, number=iterations * 10)
+        rows.append({"case": name, "us_per_call": round(seconds / (iterations * 10) * 1e6, 3)})
+
+    for name, (fmt, level, use_queue) in setups.items():
+        with tempfile.TemporaryDirectory() as directory:
+            logging.config.dictConfig(logging_config(directory, console, fmt, level, use_queue))
+            logger.info("Warming up")
+            seconds = timeit.timeit(
+                lambda: logger.info("Wrote batch of %d items in %.1f ms", 100, 12.5,
+                                    extra={'batch_size': 100, 'duration_ms': 12.5}),
+                number=iterations,
+            )
+            reset_logging()
+        rows.append({"case": f"emitted info, {name}", "us_per_call": round(seconds / iterations * 1e6, 3)})
+    return rows
+
+
+def sync_costs(setups, console, corpus, args):
+    """Sync throughput under every setup"""
+    from news.models import Item
+    from news.services import HackerNewsAPI
+
+    rows = []
+    with FakeHackerNews(corpus, latency=args.latency) as fake:
+        HackerNewsAPI.BASE_URL = fake.base_url
+        selected = {name: fn for name, fn in scenarios(corpus, args).items() if name in ("latest", "tree")}
+        for name, (fmt, level, use_queue) in setups.items():
+            for scenario, fn in selected.items():
+                with tempfile.TemporaryDirectory() as directory:
+                    clear_items()
+                    logging.config.dictConfig(logging_config(directory, console, fmt, level, use_queue))
+                    started = time.perf_counter()
+                    fn()
+                    elapsed = time.perf_counter() - started
+                    reset_logging()
+                    flushed = time.perf_counter() - started - elapsed
+                    items = Item.objects.count()
+                    rows.append({
+                        "setup": name,
+                        "scenario": scenario,
+                        "items": items,
+                        "elapsed_s": round(elapsed, 3),
+                        "items_per_sec": round(items / elapsed, 1) if elapsed else 0.0,
+                        "flush_ms": round(flushed * 1000, 1),
+                        "info_lines": log_lines(directory),
+                    })
+                print(f"  {name} {scenario}: {rows[-1]['items_per_sec']} items/s", flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost of logging on the sync paths")
+    add_corpus_arguments(parser)
+    parser.add_argument("--tree-items", type=int, default=50, help="Leaf comments synced by the tree scenario")
+    parser.add_argument("--iterations", type=int, default=5000, help="Calls per case in the call benchmark")
+    parser.add_argument("--setup", action="append", choices=list(SETUPS), help="Only run this setup (repeatable)")
+    parser.add_argument("--skip-sync", action="store_true", help="Only measure single calls, without a database")
+    parser.add_argument("--keepdb", action="store_true", help="Reuse the test database between runs")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    setups = {name: setup for name, setup in SETUPS.items() if not args.setup or name in args.setup}
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zcore.settings')
+
+    with open(os.devnull, 'w') as console:
+        sync_rows = []
+        if args.skip_sync:
+            import django
+            django.setup()
+        else:
+            corpus = corpus_from_args(args)
+            print(f"Corpus: {len(corpus.items)} items, {len(corpus.story_ids)} stories/polls")
+            with django_test_database(keepdb=args.keepdb):
+                sync_rows = sync_costs(setups, console, corpus, args)
+        call_rows = call_costs(setups, console, args.iterations)
+
+    print()
+    print_table(call_rows, ["case", "us_per_call"])
+    if sync_rows:
+        print()
+        print_table(sync_rows, ["setup", "scenario", "items", "elapsed_s", "items_per_sec", "flush_ms", "info_lines"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json"},
+                "calls": call_rows,
+                "sync": sync_rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
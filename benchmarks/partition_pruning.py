@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Partition pruning benchmark
+
+Seeds a test database whose items table is split into many small
+partitions, then runs the API's item queries and reports, for each, how
+many partitions Postgres planned to scan out of how many exist (from
+EXPLAIN) and how long the query takes. Lookups by item_id should touch a
+single partition; filters that do not involve item_id scan them all.
+
+The partition size is set through ITEM_PARTITION_SIZE before Django loads,
+so it only applies to a test database created by this run (not --keepdb
+with an existing one).
+
+Usage:
+    python -m benchmarks.partition_pruning --items 200000 --partition-size 20000 --json pruning.json
+"""
+import argparse, json, os, re, statistics, time
+
+from .common import django_test_database, print_table
+
+PARTITION_RE = re.compile(r'\bnews_item_p\d+\b')
+
+
+def scanned_partitions(queryset):
+    return len(set(PARTITION_RE.findall(queryset.explain())))
+
+
+def timed(queryset, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations) * 1000, 3)
+
+
+def queries(item_ids):
+    """(name, queryset) for the lookups the API makes"""
+    from django.db.models import Q
+    from news.models import Item
+    story = Item.objects.filter(type='story', descendants__gt=0).order_by('-descendants').first()
+    return [
+        ("detail", Item.objects.filter(item_id=item_ids[0])),
+        ("batch (100 IDs)", Item.objects.filter(item_id__in=item_ids[:100])),
+        ("ID range", Item.objects.filter(item_id__gte=item_ids[0], item_id__lt=item_ids[0] + 1000)),
+        ("comments of a story", Item.objects.filter(parent__item_id=story.item_id)),
+        ("children by parent_id", Item.objects.filter(parent_id=story.pk)),
+        ("list newest", Item.objects.order_by('-item_id')[:20]),
+        ("filter type", Item.objects.filter(type='poll')[:20]),
+        ("filter by", Item.objects.filter(by='user1')[:20]),
+        ("search", Item.objects.filter(Q(title__icontains='postgres') | Q(by__icontains='postgres'))[:20]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report partitions scanned by the API's item queries")
+    parser.add_argument("--items", type=int, default=200000, help="Items seeded when the test database is empty")
+    parser.add_argument("--partition-size", type=int, default=20000, help="Item IDs per partition in a new test database")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs timed per query")
+    parser.add_argument("--keepdb", action="store_true", help="Keep the test database for the next run")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    os.environ['ITEM_PARTITION_SIZE'] = str(args.partition_size)
+    os.environ.setdefault('NEWS_LOG_LEVEL', 'WARNING')
+    with django_test_database(keepdb=args.keepdb) as connection:
+        from news.models import Item
+        from news.partitions import list_partitions
+        from .seed import seed_database
+        if not Item.objects.exists():
+            print(f"Seeding {args.items} items...", flush=True)
+            seed_database(args.items)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE news_item")
+            total = len(list_partitions(cursor))
+        item_ids = list(Item.objects.order_by('?').values_list('item_id', flat=True)[:100])
+
+        rows = []
+        for name, queryset in queries(item_ids):
+            rows.append({
+                "query": name,
+                "partitions_scanned": scanned_partitions(queryset),
+                "partitions": total,
+                "median_ms": timed(queryset, args.repeat),
+            })
+
+    print()
+    print_table(rows, ["query", "partitions_scanned", "partitions", "median_ms"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "json"}, "queries": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
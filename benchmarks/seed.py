@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Synthetic HN corpus generator
+
+Generates HN-shaped items in the API's JSON format: mostly comments in
+threads below stories, with heavy-tailed thread sizes (most stories get few
+or no comments, a few get thousands), reply trees that thin out with depth,
+a Zipf-like spread of authors, and the odd poll. Output is deterministic
+for a given seed.
+
+Used by the load benchmarks to seed a database through the bulk importer,
+or standalone to write a dump for `manage.py import_items`:
+
+    python -m benchmarks.seed --items 1000000 -o corpus.jsonl.gz
+"""
+import argparse, gzip, json, random, sys
+
+BASE_TIME = 1600000000
+
+WORDS = [
+    'python', 'rust', 'postgres', 'django', 'linux', 'startup', 'ai', 'security', 'compiler',
+    'database', 'kernel', 'browser', 'javascript', 'open', 'source', 'release', 'show', 'ask',
+    'launch', 'performance', 'cloud', 'privacy', 'hiring', 'design', 'math', 'physics', 'history',
+]
+
+# Largest thread generated, and the deepest reply level
+MAX_THREAD_SIZE = 2000
+MAX_DEPTH = 40
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def author(rng, users):
+    # Zipf-like: a few prolific users and a long tail
+    return f"user{int(users ** rng.random()) - 1}"
+
+
+def generate_thread(rng, next_id, users, time_value):
+    """Return a story or poll and its replies, with kids filled in"""
+    root = {
+        'id': next_id,
+        'type': 'story',
+        'by': author(rng, users),
+        'time': time_value,
+        'title': sentence(rng, 3, 10).capitalize(),
+        'score': int(rng.paretovariate(1.1)),
+    }
+    items = [root]
+
+    if rng.random() < 0.01:
+        root['type'] = 'poll'
+        root['parts'] = []
+        for _ in range(rng.randint(2, 6)):
+            option = {
+                'id': root['id'] + len(items), 'type': 'pollopt', 'by': root['by'], 'time': time_value,
+                'poll': root['id'], 'text': sentence(rng, 1, 4), 'score': rng.randint(0, 300),
+            }
+            root['parts'].append(option['id'])
+            items.append(option)
+    elif rng.random() < 0.7:
+        root['url'] = f"https://{rng.choice(WORDS)}{rng.randint(1, 500)}.example.com/{root['id']}"
+    else:
+        root['text'] = sentence(rng, 10, 80)
+
+    size = min(int(rng.paretovariate(1.0)) - 1, MAX_THREAD_SIZE)
+    depths = {root['id']: 0}
+    candidates = [root]
+    for _ in range(size):
+        # Top-level comments are common; otherwise reply to a recent comment
+        if rng.random() < 0.3 or len(candidates) == 1:
+            parent = root
+        else:
+            parent = candidates[-rng.randint(1, min(len(candidates) - 1, 20))]
+        depth = depths[parent['id']] + 1
+        if depth > MAX_DEPTH:
+            parent, depth = root, 1
+
+        comment = {
+            'id': root['id'] + len(items),
+            'type': 'comment',
+            'by': author(rng, users),
+            'time': time_value + len(items) * 30,
+            'text': sentence(rng, 5, 120),
+            'parent': parent['id'],
+        }
+        if rng.random() < 0.01:
+            comment['dead'] = True
+        parent.setdefault('kids', []).append(comment['id'])
+        depths[comment['id']] = depth
+        candidates.append(comment)
+        items.append(comment)
+
+    root['descendants'] = size
+    return items
+
+
+def generate_items(count, seed=1, users=50000):
+    """Yield about count HN items as dicts, in ID order within each thread"""
+    rng = random.Random(seed)
+    next_id = 1
+    while next_id <= count:
+        for item in generate_thread(rng, next_id, users, BASE_TIME + next_id * 2):
+            yield item
+        next_id = item['id'] + 1
+
+
+def seed_database(count, seed=1, chunk_size=50000, progress=None):
+    """Bulk load a generated corpus into the configured database"""
+    from news.importer import ItemImporter
+    lines = (json.dumps(item) + '\n' for item in generate_items(count, seed=seed))
+    return ItemImporter(chunk_size=chunk_size, progress=progress).import_lines(lines, label='synthetic corpus')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic HN corpus as NDJSON")
+    parser.add_argument("--items", type=int, default=1000000, help="Approximate number of items")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("-o", "--output", help="Output file (.gz to compress, default: stdout)")
+    args = parser.parse_args()
+
+    if args.output:
+        opener = gzip.open if args.output.endswith('.gz') else open
+        out = opener(args.output, 'wt', encoding='utf-8')
+    else:
+        out = sys.stdout
+    try:
+        for item in generate_items(args.items, seed=args.seed):
+            out.write(json.dumps(item) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
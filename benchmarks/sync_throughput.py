@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Sync throughput benchmark
+
+Serves a synthetic corpus from a local fake of the HN API (see fake_hn.py)
+and runs the sync paths against a throwaway test database:
+
+- latest:      sync_latest_items for every story, with their comments
+- since_last:  sync_since_last over the newest --batch item IDs, fetching
+               parents that fall outside the range
+- tree:        sync_item of --tree-items deep leaf comments, each pulling in
+               its chain of parents (the read-through path)
+
+For each scenario it reports items written per second, HTTP calls and DB
+queries per item, and how much the process's peak RSS grew. --save-baseline records the
+results; --baseline compares against a recorded file and exits with status 1
+when a metric regressed by more than --tolerance.
+
+Usage:
+    python -m benchmarks.sync_throughput --stories 200 --latency 0.02 --save-baseline sync.json
+    python -m benchmarks.sync_throughput --stories 200 --latency 0.02 --baseline sync.json
+"""
+import argparse, json, logging, sys, time
+
+from .common import PeakMemory, QueryCounter, clear_items, django_test_database, print_table
+from .fake_hn import FakeHackerNews, add_corpus_arguments, corpus_from_args
+
+# Metrics compared against the baseline, and whether higher is better
+BASELINE_METRICS = {
+    "items_per_sec": True,
+    "http_calls_per_item": False,
+    "queries_per_item": False,
+    "peak_memory_mb": False,
+}
+
+# Absolute changes below these are noise, whatever the relative change
+MIN_CHANGE = {
+    "peak_memory_mb": 1.0,
+}
+
+
+def scenarios(corpus, args):
+    from news.services import HackerNewsAPI
+
+    def latest():
+        return HackerNewsAPI.sync_latest_items(count=len(corpus.story_ids))
+
+    def since_last():
+        last_id = max(corpus.max_item_id - args.batch, 1)
+        return HackerNewsAPI.sync_since_last(last_id=last_id, batch_size=args.batch)
+
+    def tree():
+        leaves = corpus.leaf_ids[::max(len(corpus.leaf_ids) // args.tree_items, 1)][:args.tree_items]
+        synced = sum(1 for leaf_id in leaves if HackerNewsAPI.sync_item(leaf_id))
+        return {"synced_count": synced, "failed_count": len(leaves) - synced}
+
+    return {"latest": latest, "since_last": since_last, "tree": tree}
+
+
+def run_scenario(name, fn, fake, queries):
+    from news.models import Item
+
+    clear_items()
+    fake.reset_calls()
+    queries.reset()
+
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+
+    query_count = queries.count
+    items = Item.objects.count()
+    http_calls = fake.total_calls
+
+    return {
+        "scenario": name,
+        "items": items,
+        "synced": result.get("synced_count"),
+        "failed": result.get("failed_count"),
+        "elapsed_s": round(elapsed, 3),
+        "items_per_sec": round(items / elapsed, 1) if elapsed else 0.0,
+        "http_calls": http_calls,
+        "http_calls_per_item": round(http_calls / items, 3) if items else None,
+        "queries": query_count,
+        "queries_per_item": round(query_count / items, 3) if items else None,
+        "peak_memory_mb": memory.growth_mb,
+    }
+
+
+def compare(rows, baseline, tolerance):
+    """Return a description of every metric that regressed beyond tolerance"""
+    regressions = []
+    previous = {row["scenario"]: row for row in baseline["results"]}
+    for row in rows:
+        before = previous.get(row["scenario"])
+        if not before:
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            old, new = before.get(metric), row.get(metric)
+            if not old or new is None or abs(new - old) < MIN_CHANGE.get(metric, 0):
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{row['scenario']} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sync throughput against a fake HN API")
+    add_corpus_arguments(parser)
+    parser.add_argument("--batch", type=int, default=500, help="Item IDs synced by the since_last scenario")
+    parser.add_argument("--tree-items", type=int, default=50, help="Leaf comments synced by the tree scenario")
+    parser.add_argument("--scenario", action="append", choices=["latest", "since_last", "tree"],
+                        help="Run only this scenario (repeatable)")
+    parser.add_argument("--keepdb", action="store_true", help="Reuse the test database between runs")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's debug logging")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    parser.add_argument("--save-baseline", help="Write the results to this baseline file")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    corpus = corpus_from_args(args)
+    print(f"Corpus: {len(corpus.items)} items, {len(corpus.story_ids)} stories/polls, maxitem {corpus.max_item_id}")
+
+    with django_test_database(keepdb=args.keepdb):
+        if not args.verbose:
+            logging.getLogger('news').setLevel(logging.WARNING)
+
+        from news.services import HackerNewsAPI
+        rows = []
+        with FakeHackerNews(corpus, latency=args.latency, error_rate=args.error_rate) as fake, QueryCounter() as queries:
+            HackerNewsAPI.BASE_URL = fake.base_url
+            for name, fn in scenarios(corpus, args).items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                row = run_scenario(name, fn, fake, queries)
+                rows.append(row)
+                print(f"  {name}: {row['items']} items, {row['items_per_sec']} items/s", flush=True)
+
+    print()
+    print_table(rows, ["scenario", "items", "failed", "elapsed_s", "items_per_sec", "http_calls_per_item",
+                       "queries_per_item", "peak_memory_mb"])
+
+    output = {"config": {k: v for k, v in vars(args).items() if k not in ("json", "save_baseline", "baseline")},
+              "results": rows}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(output, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Time window query benchmark
+
+Seeds a test database and compares the indexes that can serve the
+time_after/time_before filters of /api/items/:
+
+- none:      no index on time, every partition is scanned
+- btree:     a B-tree on time
+- brin-32:   the BRIN index the app creates (32 pages per range)
+- brin-128:  a BRIN index with Postgres' default 128 pages per range
+
+For each, it reports the index size and build time, and the median time of
+counting the items in a window and of loading its first page newest first
+(the API's default ordering), for windows of 1 hour, 1 day and 1 week before
+the newest item. BRIN relies on rows being stored roughly in time order;
+--churn updates that fraction of the items first, the way resyncs rewrite
+scores, to show how much that costs it.
+
+Usage:
+    python -m benchmarks.time_windows --items 500000 --json windows.json
+"""
+import argparse, datetime, json, statistics, time
+
+from .common import django_test_database, print_table
+
+# Variants: name -> index definition, None for no index
+VARIANTS = {
+    "none": None,
+    "btree": "USING btree (time)",
+    "brin-32": "USING brin (time) WITH (pages_per_range = 32)",
+    "brin-128": "USING brin (time) WITH (pages_per_range = 128)",
+}
+
+WINDOWS = {
+    "1h": datetime.timedelta(hours=1),
+    "1d": datetime.timedelta(days=1),
+    "7d": datetime.timedelta(days=7),
+}
+
+BENCH_INDEX = 'bench_news_item_time'
+
+
+def time_indexes(cursor):
+    """(name, definition) of the indexes on news_item.time"""
+    cursor.execute("""
+        SELECT index.relname, pg_get_indexdef(index.oid)
+        FROM pg_index
+        JOIN pg_class AS index ON index.oid = pg_index.indexrelid
+        JOIN pg_attribute ON attrelid = pg_index.indrelid AND attnum = ANY(pg_index.indkey)
+        WHERE pg_index.indrelid = 'news_item'::regclass AND attname = 'time'
+    """)
+    return cursor.fetchall()
+
+
+def index_size(cursor, name):
+    """Bytes used by an index, including its partitions' indexes"""
+    cursor.execute("SELECT COALESCE(SUM(pg_relation_size(relid)), 0) FROM pg_partition_tree(%s::regclass)", [name])
+    return cursor.fetchone()[0]
+
+
+def median_ms(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations) * 1000, 3)
+
+
+def churn(cursor, fraction):
+    """Rewrite a random fraction of the items, moving their rows to other pages"""
+    cursor.execute("UPDATE news_item SET score = score + 1 WHERE random() < %s", [fraction])
+    updated = cursor.rowcount
+    cursor.execute("VACUUM ANALYZE news_item")
+    return updated
+
+
+def measure(connection, name, definition, newest, repeat):
+    from news.models import Item
+    with connection.cursor() as cursor:
+        started = time.perf_counter()
+        if definition:
+            cursor.execute(f"CREATE INDEX {BENCH_INDEX} ON news_item {definition}")
+        build_s = time.perf_counter() - started
+        cursor.execute("ANALYZE news_item")
+        size = index_size(cursor, BENCH_INDEX) if definition else 0
+
+    row = {"variant": name, "size_kb": size // 1024, "build_s": round(build_s, 2)}
+    for window, delta in WINDOWS.items():
+        queryset = Item.objects.filter(time__gte=newest - delta, time__lte=newest)
+        row[f"count_{window}_ms"] = median_ms(queryset.count, repeat)
+        row[f"page_{window}_ms"] = median_ms(lambda: list(queryset.order_by('-time')[:20]), repeat)
+
+    if definition:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX {BENCH_INDEX}")
+    print(f"  {name}: {row['size_kb']} kB, 1d page {row['page_1d_ms']} ms", flush=True)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare indexes for time window queries on items")
+    parser.add_argument("--items", type=int, default=500000, help="Items seeded when the test database is empty")
+    parser.add_argument("--churn", type=float, default=0.0, help="Fraction of items updated before measuring")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs timed per query")
+    parser.add_argument("--keepdb", action="store_true", help="Keep the test database for the next run")
+    parser.add_argument("--json", help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    with django_test_database(keepdb=args.keepdb) as connection:
+        from django.db.models import Max
+        from news.models import Item
+        from .seed import seed_database
+        if not Item.objects.exists():
+            print(f"Seeding {args.items} items...", flush=True)
+            seed_database(args.items)
+        newest = Item.objects.aggregate(newest=Max('time'))['newest']
+
+        with connection.cursor() as cursor:
+            if args.churn:
+                print(f"Updated {churn(cursor, args.churn)} items", flush=True)
+            cursor.execute("SELECT correlation FROM pg_stats WHERE tablename LIKE 'news_item_p%%' AND attname = 'time'")
+            correlations = [value for value, in cursor.fetchall() if value is not None]
+            # Measure each variant alone, then put the app's indexes back
+            existing = time_indexes(cursor)
+            for index_name, _ in existing:
+                cursor.execute(f'DROP INDEX "{index_name}"')
+        try:
+            rows = [measure(connection, name, definition, newest, args.repeat) for name, definition in VARIANTS.items()]
+        finally:
+            with connection.cursor() as cursor:
+                for _, definition in existing:
+                    cursor.execute(definition)
+
+    print()
+    print(f"Physical correlation of time: {min(correlations, default=0):.3f} (lowest partition)")
+    print_table(rows, ["variant", "size_kb", "build_s"] + [f"count_{w}_ms" for w in WINDOWS] + [f"page_{w}_ms" for w in WINDOWS])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json"},
+                "correlation": min(correlations, default=None),
+                "variants": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
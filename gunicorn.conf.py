@@ -0,0 +1,24 @@
+"""
+gunicorn settings, picked up automatically when gunicorn starts from the
+project root.
+
+With PROMETHEUS_MULTIPROC_DIR set, workers share their metrics through
+files in that directory. It is emptied when the server starts, and the
+files of a worker that exits are marked dead so its gauges stop being
+reported.
+"""
+import glob, os
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, '*.db')):
+            os.remove(stale)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Item
+from .models import Author, Item, SyncJob
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
@@ -13,4 +13,18 @@ class ItemAdmin(admin.ModelAdmin):
         """Make item_id readonly for existing objects"""
         if obj:
             return self.readonly_fields + ('item_id',)
-        return self.readonly_fields
\ No newline at end of file
+        return self.readonly_fields
+
+
+@admin.register(Author)
+class AuthorAdmin(admin.ModelAdmin):
+    list_display = ('username', 'karma', 'stories', 'comments', 'total_score', 'last_item_at', 'synced_at')
+    search_fields = ('username',)
+    readonly_fields = ('stories', 'comments', 'total_score', 'last_item_at', 'synced_at', 'counted_at')
+
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'status', 'count', 'done', 'total', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('job_id', 'created_at', 'started_at', 'finished_at')
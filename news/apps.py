@@ -1,5 +1,6 @@
 from django.apps import AppConfig
-import logging
+from django.conf import settings
+import logging, os, sys
 
 logger = logging.getLogger(__name__)
 
@@ -11,9 +12,41 @@ class NewsConfig(AppConfig):
         """
         Initialize the app, including starting the scheduler
         """
+        from .db import install_connection_metrics
+        install_connection_metrics()
+
+        from .facets import install_invalidation
+        install_invalidation()
+
+        from .authors import install_counters
+        install_counters()
+
+        if getattr(settings, 'REQUEST_INSTRUMENTATION', True):
+            from .instrumentation import install_query_hook
+            install_query_hook()
+
+        if not self.should_start_scheduler():
+            logger.debug("Not starting APScheduler in this process")
+            return
+
         from . import scheduler
         try:
             scheduler.start()
-            logger.info("APScheduler has been started")
+            logger.info("APScheduler leader election has been started")
         except Exception as e:
-            logger.error(f"Failed to start APScheduler: {str(e)}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Failed to start APScheduler: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def should_start_scheduler():
+        """
+        Decide whether this process should take part in running scheduled jobs.
+
+        Disabled entirely with SCHEDULER_AUTOSTART=false (e.g. for web workers
+        when the scheduler runs as its own process), and skipped for management
+        commands other than runserver; run_scheduler starts it explicitly.
+        """
+        if not getattr(settings, 'SCHEDULER_AUTOSTART', True):
+            return False
+        if os.path.basename(sys.argv[0]) in ('manage.py', 'django-admin') and len(sys.argv) > 1:
+            return sys.argv[1] == 'runserver'
+        return True
@@ -0,0 +1,120 @@
+"""
+Async variants of the item read endpoints.
+
+Under ASGI (e.g. uvicorn) these run on the event loop and query through
+Django's async ORM, instead of hopping through sync_to_async threads like the
+DRF views do. Serialization still uses the DRF serializers, which only touch
+data already loaded here, and filtering reuses the list view's filter backends
+so both variants accept the same query parameters.
+"""
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .models import Item
+from .readthrough import fetch_item
+from .serializers import ItemSerializer, ItemDetailSerializer
+from .threads import acollect_descendants, serialize_thread
+from .views import ItemListCreateView
+
+logger = logging.getLogger(__name__)
+
+
+def not_found():
+    return JsonResponse({"detail": "Not found."}, status=404)
+
+
+class AsyncItemListView(View):
+    """
+    Async API endpoint for listing HN items.
+
+    GET:
+    - Same filtering, search, ordering and pagination as GET /api/items/
+    """
+    async def get(self, request):
+        drf_request = Request(request)
+        view = ItemListCreateView(request=drf_request, format_kwarg=None)
+
+        queryset = Item.objects.all()
+        try:
+            for backend in view.filter_backends:
+                queryset = backend().filter_queryset(drf_request, queryset, view)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400, safe=False)
+
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 0
+        count = await queryset.acount()
+        if page < 1 or (page - 1) * page_size >= max(count, 1):
+            return JsonResponse({"detail": "Invalid page."}, status=404)
+
+        offset = (page - 1) * page_size
+        items = [item async for item in queryset[offset:offset + page_size]]
+        url = request.build_absolute_uri()
+
+        next_url = None
+        if offset + page_size < count:
+            next_url = replace_query_param(url, 'page', page + 1)
+        previous_url = None
+        if page > 2:
+            previous_url = replace_query_param(url, 'page', page - 1)
+        elif page == 2:
+            previous_url = remove_query_param(url, 'page')
+
+        return JsonResponse({
+            "count": count,
+            "next": next_url,
+            "previous": previous_url,
+            "results": ItemSerializer(items, many=True).data,
+        })
+
+
+class AsyncItemDetailView(View):
+    """
+    Async API endpoint for retrieving an item.
+
+    GET:
+    - Same response as GET /api/items/{item_id}/, including comments and the
+      read-through fetch of items not synced yet
+    """
+    async def get(self, request, item_id):
+        try:
+            item = await Item.objects.aget(item_id=item_id)
+        except Item.DoesNotExist:
+            if not getattr(settings, 'ITEM_READ_THROUGH', False):
+                return not_found()
+            item = await sync_to_async(fetch_item)(item_id)
+            if item is None:
+                return not_found()
+
+        comments = []
+        if item.kids:
+            comments = [
+                comment async for comment in
+                Item.objects.filter(item_id__in=item.kids).order_by('-score')
+            ]
+        return JsonResponse(ItemDetailSerializer(item, context={'comments': comments}).data)
+
+
+class AsyncItemThreadView(View):
+    """
+    Async API endpoint for reading a whole discussion thread.
+
+    GET:
+    - Same response as GET /api/items/{item_id}/thread/
+    """
+    async def get(self, request, item_id):
+        try:
+            root = await Item.objects.aget(item_id=item_id)
+        except Item.DoesNotExist:
+            return not_found()
+
+        descendants = await acollect_descendants(root)
+        return JsonResponse(serialize_thread(root, descendants))
@@ -0,0 +1,282 @@
+"""
+Author profiles and activity counters.
+
+Author rows mirror Hacker News users. Their profile (karma, created, about,
+submitted) is fetched from HN on first request and again once it is older
+than AUTHOR_SYNC_TTL seconds. Their counters (stories, comments, total score
+and newest item time over the items stored locally) are maintained on the
+write path as deltas: the sync pipeline compares each batch with the rows it
+replaces, and single saves and deletes do the same through signals, so a
+write costs one upsert however many items its authors have. Imports and
+`sync_authors --counters` recount from the items instead. /api/users/{by}/
+is then one indexed lookup instead of an aggregate over the author's items.
+
+last_item_at only moves forward between recounts: deleting an author's
+newest item leaves it as it was.
+"""
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from .models import Author, Item
+from .readthrough import SingleFlight, cache_not_found, user_negative_cache_key
+from .routers import unpinned
+from .services import HackerNewsAPI
+
+logger = logging.getLogger(__name__)
+
+# Marker returned by HackerNewsAPI.get_user when HN reports a user as null
+NOT_FOUND = object()
+
+# Fields refreshed when a fetched profile is stored
+PROFILE_FIELDS = ['karma', 'created', 'about', 'submitted', 'synced_at']
+
+_flight = SingleFlight()
+
+
+def _counters_sql(where):
+    # Authors seen for the first time get a row with an empty profile, which
+    # sync_authors --missing (or their first request) fills in
+    author_table = Author._meta.db_table
+    item_table = Item._meta.db_table
+    return f"""
+        INSERT INTO {author_table} (username, submitted, stories, comments, total_score, last_item_at, counted_at)
+        SELECT "by", '{{}}', count(*) FILTER (WHERE type = 'story'), count(*) FILTER (WHERE type = 'comment'),
+               COALESCE(sum(score), 0), max(time), %s
+        FROM {item_table}
+        WHERE "by" IS NOT NULL AND "by" <> '' {where}
+        GROUP BY "by"
+        ON CONFLICT (username) DO UPDATE SET
+            stories = EXCLUDED.stories,
+            comments = EXCLUDED.comments,
+            total_score = EXCLUDED.total_score,
+            last_item_at = EXCLUDED.last_item_at,
+            counted_at = EXCLUDED.counted_at
+    """
+
+
+def _zero_sql(where):
+    # Authors none of whose items are stored anymore
+    author_table = Author._meta.db_table
+    item_table = Item._meta.db_table
+    return f"""
+        UPDATE {author_table} SET stories = 0, comments = 0, total_score = 0, last_item_at = NULL, counted_at = %s
+        WHERE (stories <> 0 OR comments <> 0 OR last_item_at IS NOT NULL) {where}
+        AND NOT EXISTS (SELECT 1 FROM {item_table} WHERE "by" = {author_table}.username)
+    """
+
+
+def refresh_counters(usernames=None):
+    """
+    Recompute the counters of these authors from their stored items, or of
+    every author if usernames is None. Returns the number of authors counted.
+    """
+    if usernames is not None:
+        usernames = sorted({username for username in usernames if username})
+        if not usernames:
+            return 0
+    now = timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if usernames is None:
+            cursor.execute(_counters_sql(''), [now])
+            counted = cursor.rowcount
+            cursor.execute(_zero_sql(''), [now])
+        else:
+            # Each author's items come from the (by, time) index
+            cursor.execute(_counters_sql('AND "by" = ANY(%s)'), [now, usernames])
+            counted = cursor.rowcount
+            cursor.execute(_zero_sql('AND username = ANY(%s)'), [now, usernames])
+    logger.debug("Refreshed the counters of %d authors", counted)
+    return counted
+
+
+def counter_deltas(written, replaced):
+    """
+    Changes of the author counters when the written items replace the
+    replaced rows (the stored versions of those that existed), by username.
+
+    Values are [stories, comments, total_score, last_item_at], the latter
+    the newest time among the written items.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0, None])
+
+    def add(item, sign):
+        if not item.by:
+            return
+        delta = deltas[item.by]
+        delta[0] += sign * (item.type == 'story')
+        delta[1] += sign * (item.type == 'comment')
+        delta[2] += sign * (item.score or 0)
+        if sign > 0 and item.time and (delta[3] is None or item.time > delta[3]):
+            delta[3] = item.time
+
+    for item in replaced:
+        add(item, -1)
+    for item in written:
+        add(item, 1)
+    return {username: delta for username, delta in deltas.items() if any(delta[:3]) or delta[3]}
+
+
+def apply_deltas(deltas):
+    """Add counter deltas to the authors in one upsert, creating the authors seen for the first time"""
+    if not deltas:
+        return 0
+    now = timezone.now()
+    values = []
+    params = []
+    # A stable order keeps concurrent writers from deadlocking on author rows
+    for username in sorted(deltas):
+        stories, comments, total_score, last_item_at = deltas[username]
+        values.append("(%s, '{}', %s, %s, %s, %s, %s)")
+        params.extend([username, stories, comments, total_score, last_item_at, now])
+    table = Author._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (username, submitted, stories, comments, total_score, last_item_at, counted_at)
+            VALUES {', '.join(values)}
+            ON CONFLICT (username) DO UPDATE SET
+                stories = {table}.stories + EXCLUDED.stories,
+                comments = {table}.comments + EXCLUDED.comments,
+                total_score = {table}.total_score + EXCLUDED.total_score,
+                last_item_at = GREATEST({table}.last_item_at, EXCLUDED.last_item_at),
+                counted_at = EXCLUDED.counted_at
+        """, params)
+    logger.debug("Applied counter deltas to %d authors", len(deltas))
+    return len(deltas)
+
+
+# Item fields the counters depend on
+COUNTED_FIELDS = ['by', 'type', 'score', 'time']
+
+
+def install_counters():
+    """Update an author's counters when one of their items is saved or deleted one by one"""
+    pre_save.connect(_item_saving, sender=Item, dispatch_uid='news.authors.saving')
+    post_save.connect(_item_saved, sender=Item, dispatch_uid='news.authors.saved')
+    post_delete.connect(_item_deleted, sender=Item, dispatch_uid='news.authors.deleted')
+
+
+def _item_saving(sender, instance, update_fields=None, **kwargs):
+    # Remember the stored row the save replaces, to count the difference.
+    # Instances loaded from the database already carry it.
+    instance._counted_row = None
+    if update_fields is not None and not set(update_fields) & set(COUNTED_FIELDS):
+        instance._counted_row = False
+    elif instance.pk is not None:
+        loaded = getattr(instance, '_loaded_values', {})
+        if all(field in loaded for field in COUNTED_FIELDS):
+            instance._counted_row = Item(**{field: loaded[field] for field in COUNTED_FIELDS})
+        else:
+            instance._counted_row = Item.objects.filter(item_id=instance.item_id).only(*COUNTED_FIELDS).first()
+
+
+def _item_saved(sender, instance, **kwargs):
+    replaced = getattr(instance, '_counted_row', None)
+    if replaced is False:
+        return
+    apply_deltas(counter_deltas([instance], [replaced] if replaced else []))
+    # A later save of the same instance replaces what this one stored
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        **{field: getattr(instance, field) for field in COUNTED_FIELDS},
+    }
+
+
+def _item_deleted(sender, instance, **kwargs):
+    apply_deltas(counter_deltas([], [instance]))
+
+
+def profile_fields(data):
+    """Author fields for a user from the HN API"""
+    created = data.get('created')
+    return {
+        'karma': data.get('karma'),
+        'created': timezone.datetime.fromtimestamp(
+            created, tz=timezone.get_current_timezone()
+        ).replace(tzinfo=None) if created else None,
+        'about': data.get('about'),
+        'submitted': [value for value in data.get('submitted') or [] if isinstance(value, int)],
+    }
+
+
+def sync_authors(usernames):
+    """
+    Fetch the profiles of several users from HN concurrently and store them.
+
+    Users HN has no profile for are negatively cached for
+    READ_THROUGH_NEGATIVE_TTL seconds instead, and only marked as fetched if
+    they already have a row, as authors of stored items do: no row is
+    created for them. Returns the number of users fetched, found or not;
+    those whose fetch failed are left as they were.
+    """
+    def fetch(username, session):
+        return HackerNewsAPI.get_user(username, not_found=NOT_FOUND, session=session)
+
+    profiles = HackerNewsAPI.fetch_concurrently(fetch, [username for username in usernames if username])
+    if not profiles:
+        return 0
+
+    now = timezone.now()
+    authors = []
+    not_found = []
+    for username, data in profiles.items():
+        if data is NOT_FOUND:
+            cache_not_found(user_negative_cache_key(username))
+            not_found.append(username)
+        else:
+            authors.append(Author(username=username, synced_at=now, **profile_fields(data)))
+    if authors:
+        Author.objects.bulk_create(
+            authors,
+            update_conflicts=True,
+            unique_fields=['username'],
+            update_fields=PROFILE_FIELDS,
+        )
+    if not_found:
+        Author.objects.filter(username__in=not_found).update(synced_at=now)
+    logger.info("Synced %d author profiles from HN (%d not found)", len(authors), len(not_found))
+    return len(profiles)
+
+
+def is_stale(author):
+    if author.synced_at is None:
+        return True
+    ttl = getattr(settings, 'AUTHOR_SYNC_TTL', 86400)
+    return (timezone.now() - author.synced_at).total_seconds() > ttl
+
+
+def get_author(username):
+    """
+    An author's profile and counters, or None if neither HN nor the items
+    stored locally know the user.
+
+    Profiles never fetched or older than AUTHOR_SYNC_TTL seconds are fetched
+    from HN first (concurrent requests for the same user share one fetch),
+    unless HN recently reported the user as null; if that fails, the stored
+    profile is served as it is. Storing the fetched profile does not pin the
+    client's reads to the primary.
+    """
+    author = Author.objects.filter(username=username).first()
+    if author is not None and not is_stale(author):
+        return author
+    if not getattr(settings, 'AUTHOR_SYNC', True):
+        return author
+    if cache.get(user_negative_cache_key(username)):
+        logger.debug("User %s is negatively cached, not fetching", username)
+        return known(author)
+
+    with unpinned():
+        _flight.do(username, lambda: sync_authors([username]))
+        # Requests that joined the fetch did not write, so read it from the primary explicitly
+        author = Author.objects.using(DEFAULT_DB_ALIAS).filter(username=username).first()
+    return known(author)
+
+
+def known(author):
+    # None unless HN or the local items know the user
+    if author is None or (author.karma is None and author.last_item_at is None):
+        return None
+    return author
@@ -0,0 +1,157 @@
+"""
+Database connection reuse for background threads.
+
+Web requests keep their connection between requests through CONN_MAX_AGE
+and CONN_HEALTH_CHECKS, but Django's connections belong to a thread, and
+sync jobs, scheduler runs, the pipeline's writer and read-through fetches
+run on threads that close theirs when they finish. Those threads borrow a
+connection from a ConnectionPool instead, so consecutive syncs reuse open
+Postgres connections rather than connecting every time.
+"""
+import contextlib, functools, logging, threading, time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from .metrics import DB_CONNECTIONS_OPENED, DB_POOL_CHECKOUTS, DB_POOL_CONNECTIONS, DB_POOL_DISCARDED
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Open connections to one database, lent to one thread at a time.
+
+    Up to size idle connections are kept. Borrowing never waits: when none
+    is idle a new connection is made, and it is closed on return if the pool
+    is already full. Before a connection is lent out it goes through the
+    same checks as at the start of a request, so connections older than
+    CONN_MAX_AGE are replaced and, with CONN_HEALTH_CHECKS, broken ones are
+    detected before the first query.
+    """
+
+    def __init__(self, alias=DEFAULT_DB_ALIAS, size=None):
+        self.alias = alias
+        self.size = getattr(settings, 'DB_POOL_SIZE', 4) if size is None else size
+        self._idle = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def borrow(self):
+        """Make a pooled connection this thread's connection to the database for the block"""
+        wrapper = self._checkout()
+        previous = next((c for c in connections.all(initialized_only=True) if c.alias == self.alias), None)
+        connections[self.alias] = wrapper
+        try:
+            yield wrapper
+        finally:
+            if previous is None:
+                del connections[self.alias]
+            else:
+                connections[self.alias] = previous
+            self._checkin(wrapper)
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size, 'idle': len(self._idle), 'in_use': self._in_use}
+
+    def close_all(self):
+        """Close the idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for wrapper in idle:
+            DB_POOL_CONNECTIONS.labels(self.alias, 'idle').dec()
+            self._close(wrapper)
+
+    def _checkout(self):
+        with self._lock:
+            wrapper = self._idle.pop() if self._idle else None
+            self._in_use += 1
+        DB_POOL_CONNECTIONS.labels(self.alias, 'in_use').inc()
+
+        if wrapper is None:
+            DB_POOL_CHECKOUTS.labels(self.alias, 'new').inc()
+            wrapper = connections.create_connection(self.alias)
+            wrapper.inc_thread_sharing()
+            return wrapper
+
+        DB_POOL_CONNECTIONS.labels(self.alias, 'idle').dec()
+        expired = wrapper.close_at is not None and time.monotonic() >= wrapper.close_at
+        wrapper.close_if_unusable_or_obsolete()
+        if wrapper.connection is not None and wrapper.health_check_enabled:
+            # Check now rather than on the first query, to count broken connections
+            if not wrapper.is_usable():
+                wrapper.close()
+            wrapper.health_check_done = True
+        if wrapper.connection is None:
+            reason = 'expired' if expired else 'unusable'
+            logger.debug("Discarded %s pooled connection to %s", reason, self.alias)
+            DB_POOL_DISCARDED.labels(self.alias, reason).inc()
+            DB_POOL_CHECKOUTS.labels(self.alias, 'new').inc()
+        else:
+            DB_POOL_CHECKOUTS.labels(self.alias, 'reused').inc()
+        return wrapper
+
+    def _checkin(self, wrapper):
+        # Drop connections left in a transaction, broken or past CONN_MAX_AGE
+        if not wrapper.in_atomic_block:
+            wrapper.close_if_unusable_or_obsolete()
+
+        with self._lock:
+            self._in_use -= 1
+            keep = not wrapper.in_atomic_block and wrapper.connection is not None and len(self._idle) < self.size
+            if keep:
+                self._idle.append(wrapper)
+        DB_POOL_CONNECTIONS.labels(self.alias, 'in_use').dec()
+        if keep:
+            DB_POOL_CONNECTIONS.labels(self.alias, 'idle').inc()
+        else:
+            self._close(wrapper)
+
+    def _close(self, wrapper):
+        try:
+            wrapper.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled connection to {self.alias}: {str(e)}")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias=DEFAULT_DB_ALIAS):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(alias)
+        return _pools[alias]
+
+
+def pooled_connection(alias=DEFAULT_DB_ALIAS):
+    """Borrow a pooled connection for a background thread: `with pooled_connection(): ...`"""
+    return get_pool(alias).borrow()
+
+
+def uses_pooled_connection(func):
+    """Decorator running func with a pooled connection to the default database"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with pooled_connection():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def close_pools():
+    """Close every idle pooled connection, e.g. when the process stops"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+def _count_connection(sender, connection, **kwargs):
+    DB_CONNECTIONS_OPENED.labels(connection.alias).inc()
+
+
+def install_connection_metrics():
+    """Count every new database connection in db_connections_opened_total"""
+    connection_created.connect(_count_connection, dispatch_uid='news_connection_metrics')
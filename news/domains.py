@@ -0,0 +1,65 @@
+"""
+Domains and URL hashes of stories.
+
+Every item with a url stores its normalized domain (lowercased, without
+"www." or a port) and a hash of its normalized URL, so "all stories from
+github.com" is an index lookup instead of a url ILIKE scan, and reposts of
+the same link can be found by hash whatever their scheme, "www.", trailing
+slash, fragment or tracking parameters.
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query parameters dropped from URLs before hashing
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'ref_src')
+
+
+def split(value):
+    # Without a scheme, the host would be read as the start of the path
+    return urlsplit(value if '//' in value else f'//{value}')
+
+
+def normalize_domain(value):
+    """The domain of a URL or host name, e.g. 'github.com' for 'https://www.GitHub.com:443/x'"""
+    if not value:
+        return None
+    try:
+        host = split(value).hostname
+    except ValueError:
+        return None
+    if not host or any(char.isspace() for char in host):
+        return None
+    host = host.rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host or None
+
+
+def normalize_url(url):
+    """The URL with what does not change the page it points to removed, or None"""
+    domain = normalize_domain(url)
+    if not domain:
+        return None
+    parts = split(url)
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ))
+    path = parts.path.rstrip('/')
+    return f"{domain}{path}?{query}" if query else f"{domain}{path}"
+
+
+def url_hash(url):
+    """SHA-1 hex digest of the normalized URL, or None"""
+    normalized = normalize_url(url)
+    if normalized is None:
+        return None
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def url_fields(url):
+    """(domain, url_hash) for an item's url"""
+    try:
+        return normalize_domain(url), url_hash(url)
+    except ValueError:
+        return None, None
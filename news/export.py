@@ -0,0 +1,133 @@
+import csv, datetime, io, json, logging
+from django.conf import settings
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from .filters import ItemFilter
+from .models import Item
+
+logger = logging.getLogger(__name__)
+
+# Exported columns; parent and poll are exported as HN item IDs
+EXPORT_FIELDS = [
+    'item_id', 'type', 'by', 'time', 'text', 'dead', 'parent', 'poll', 'kids',
+    'url', 'score', 'title', 'parts', 'descendants', 'created_locally', 'synced_at',
+]
+COLUMNS = [
+    'parent__item_id' if field == 'parent' else 'poll__item_id' if field == 'poll' else field
+    for field in EXPORT_FIELDS
+]
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    """Raised for invalid export parameters"""
+
+
+def export_queryset(params):
+    """
+    Build the queryset for an export from ItemFilter parameters.
+
+    params may also contain `since`, an ISO timestamp: only items synced after
+    it are exported. Returns (queryset, watermark) where watermark is the
+    snapshot time to pass as `since` for the next incremental export.
+
+    The watermark is read from the database clock, which every writer's
+    synced_at is close to, but a transaction can commit well after the
+    synced_at it wrote (an import chunk stamps its start time). So `since`
+    is moved back by EXPORT_SINCE_OVERLAP seconds, re-exporting the items
+    synced just before it: consecutive exports overlap, and consumers are
+    expected to upsert rows by item_id.
+    """
+    params = params.copy()
+    since = params.pop('since', None)
+    if isinstance(since, list):
+        since = since[-1]
+
+    filterset = ItemFilter(params, queryset=Item.objects.all())
+    if not filterset.is_valid():
+        raise ExportError(json.dumps(filterset.errors))
+
+    queryset = filterset.qs
+    watermark = database_time(queryset.db)
+    queryset = queryset.filter(synced_at__lte=watermark)
+    if since:
+        since_dt = parse_datetime(since)
+        if since_dt is None:
+            raise ExportError(f"Invalid since timestamp: {since}")
+        overlap = getattr(settings, 'EXPORT_SINCE_OVERLAP', 900)
+        queryset = queryset.filter(synced_at__gt=since_dt - datetime.timedelta(seconds=overlap))
+
+    return queryset.order_by('item_id'), watermark
+
+
+def database_time(using):
+    """The current time on the database the export reads from"""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT LOCALTIMESTAMP")
+        return cursor.fetchone()[0]
+
+
+def iter_rows(queryset):
+    """Iterate over export rows as dicts, streaming from a server-side cursor"""
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    count = 0
+    for values in queryset.values_list(*COLUMNS).iterator(chunk_size=chunk_size):
+        count += 1
+        yield dict(zip(EXPORT_FIELDS, values))
+    logger.info(f"Exported {count} items")
+
+
+def format_times(row):
+    for field in ('time', 'synced_at'):
+        if row[field]:
+            row[field] = row[field].isoformat()
+    return row
+
+
+def ndjson_lines(queryset):
+    """Yield the queryset as newline-delimited JSON"""
+    for row in iter_rows(queryset):
+        yield json.dumps(format_times(row)) + '\n'
+
+
+def csv_lines(queryset):
+    """Yield the queryset as CSV, with kids and parts as JSON arrays"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(EXPORT_FIELDS)
+    yield flush()
+    for row in map(format_times, iter_rows(queryset)):
+        row['kids'] = json.dumps(row['kids'] or [])
+        row['parts'] = json.dumps(row['parts'] or [])
+        writer.writerow(row[field] for field in EXPORT_FIELDS)
+        yield flush()
+
+
+def export_chunks(queryset, fmt, rows_per_chunk=500):
+    """Yield the export in the given format, a few hundred rows per chunk"""
+    if fmt == 'csv':
+        lines = csv_lines(queryset)
+    elif fmt == 'ndjson':
+        lines = ndjson_lines(queryset)
+    else:
+        raise ExportError(f"Unsupported format: {fmt}")
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,231 @@
+"""
+Cached aggregates over item queries.
+
+facet_counts() counts the items matching ItemFilter parameters by type, dead
+and created_locally, and finds their top authors, with one grouped aggregate
+over GROUPING SETS instead of a COUNT query per facet value. top_domains()
+and domain_stats() aggregate the items of story domains.
+
+Results are cached under the filter's SQL and the items generation, a
+counter bumped whenever items are written: by the sync pipeline's writes,
+imports and, through signals, single saves and deletes. Bumping it makes
+every cached result unreachable at once, so nothing has to track which
+filters a write affects. With the default per-process cache, a sync in
+another process (e.g. run_scheduler) is only seen once entries expire after
+FACETS_CACHE_TTL seconds; a shared CACHE_BACKEND removes that delay.
+"""
+import hashlib, logging, time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from .filters import ItemFilter
+from .metrics import FACET_CACHE_REQUESTS
+from .models import Item
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'news:items-generation'
+
+FACET_FIELDS = ['type', 'dead', 'created_locally']
+
+
+class FacetError(ValueError):
+    """Raised for invalid filter parameters"""
+
+
+def items_generation():
+    """The current items generation"""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock, so a generation lost from the cache is never
+        # reused for results cached before it was lost
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """Invalidate every cached facet result after items were written"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def install_invalidation():
+    """Bump the items generation when items are saved or deleted one by one"""
+    post_save.connect(_item_changed, sender=Item, dispatch_uid='news.facets.saved')
+    post_delete.connect(_item_changed, sender=Item, dispatch_uid='news.facets.deleted')
+
+
+def _item_changed(sender, **kwargs):
+    bump_generation()
+
+
+def grouped_column(facet_set, count):
+    """
+    Index of the column a GROUPING() bitmask over count columns grouped
+    by, or None for the grand total. GROUPING() sets a bit for each column
+    left out of the row's grouping set, the first column in the highest bit.
+    """
+    all_columns = (1 << count) - 1
+    if facet_set == all_columns:
+        return None
+    return count - (all_columns ^ facet_set).bit_length()
+
+
+def grouping_bitmask(index, count):
+    """The GROUPING() bitmask over count columns of the rows grouped by the column at index alone"""
+    return (1 << count) - 1 & ~(1 << (count - 1 - index))
+
+
+def grouped_counts(queryset, top_authors):
+    """
+    Run the grouped aggregate for a queryset.
+
+    Returns rows of (facet, value, count), where facet is None for the total,
+    a facet field, or 'by' for the top_authors most frequent authors.
+    """
+    columns = FACET_FIELDS + ['by']
+    try:
+        sql, params = queryset.order_by().values(*columns).query.sql_with_params()
+    except EmptyResultSet:
+        # A filter that can match nothing, e.g. a domain that does not normalise
+        return [(None, None, 0)]
+    grouping = ', '.join(f'"{column}"' for column in columns)
+    grouping_sets = ', '.join(['()'] + [f'("{column}")' for column in columns])
+    # GROUPING() returns a bitmask of the columns left out of each row's set,
+    # first column first, which tells the facets apart
+    by_only = grouping_bitmask(columns.index('by'), len(columns))
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"""
+            SELECT facet_set, {grouping}, count FROM (
+                SELECT GROUPING({grouping}) AS facet_set, {grouping}, count(*) AS count,
+                       row_number() OVER (
+                           PARTITION BY GROUPING({grouping}) ORDER BY "by" IS NULL, count(*) DESC, "by"
+                       ) AS rank
+                FROM ({sql}) AS matching
+                GROUP BY GROUPING SETS ({grouping_sets})
+            ) AS grouped
+            WHERE facet_set <> {by_only} OR ("by" IS NOT NULL AND rank <= %s)
+        """, [*params, top_authors])
+        rows = cursor.fetchall()
+
+    results = []
+    for facet_set, *values, count in rows:
+        index = grouped_column(facet_set, len(columns))
+        if index is None:
+            results.append((None, None, count))
+        else:
+            results.append((columns[index], values[index], count))
+    return results
+
+
+def compute_facets(queryset, top_authors):
+    facets = {'count': 0, **{field: {} for field in FACET_FIELDS}, 'top_authors': []}
+    for facet, value, count in grouped_counts(queryset, top_authors):
+        if facet is None:
+            facets['count'] = count
+        elif facet == 'by':
+            facets['top_authors'].append({'by': value, 'count': count})
+        else:
+            key = str(value).lower() if isinstance(value, bool) else value
+            facets[facet][key] = count
+    return facets
+
+
+def filtered_items(params):
+    """Items matching ItemFilter parameters; raises FacetError if they are invalid"""
+    filterset = ItemFilter(params, queryset=Item.objects.all())
+    if not filterset.is_valid():
+        raise FacetError(filterset.errors)
+    return filterset.qs.order_by()
+
+
+def cached(kind, queryset, compute, *extra):
+    """
+    compute(), cached under the queryset's SQL, extra and the items generation.
+
+    kind names the cached aggregate in keys and in facet_cache_requests_total.
+    Querysets that can match nothing have no SQL, and are computed uncached:
+    compute() then runs no query either.
+    """
+    try:
+        sql, sql_params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return compute()
+    signature = hashlib.sha1(f"{sql}|{sql_params!r}|{extra!r}".encode()).hexdigest()
+    key = f"news:{kind}:{items_generation()}:{signature}"
+
+    result = cache.get(key)
+    if result is not None:
+        FACET_CACHE_REQUESTS.labels(kind, 'hit').inc()
+        return result
+
+    FACET_CACHE_REQUESTS.labels(kind, 'miss').inc()
+    started = time.perf_counter()
+    result = compute()
+    logger.debug("Computed %s in %.1f ms", kind, (time.perf_counter() - started) * 1000)
+    cache.set(key, result, getattr(settings, 'FACETS_CACHE_TTL', 300))
+    return result
+
+
+def facet_counts(params):
+    """
+    Facet counts of the items matching ItemFilter parameters, cached per filter.
+
+    Raises FacetError if the parameters are invalid.
+    """
+    queryset = filtered_items(params)
+    top_authors = getattr(settings, 'FACETS_TOP_AUTHORS', 10)
+    return cached('facets', queryset, lambda: compute_facets(queryset, top_authors), top_authors)
+
+
+def domain_aggregates():
+    return {
+        'items': Count('id'),
+        'stories': Count('id', filter=Q(type='story')),
+        'total_score': Coalesce(Sum('score'), 0),
+        'latest': Max('time'),
+    }
+
+
+def top_domains(params, limit):
+    """Domains with the most items matching ItemFilter parameters, cached per filter"""
+    queryset = filtered_items(params).filter(domain__isnull=False)
+
+    def compute():
+        rows = (
+            queryset.values('domain')
+            .annotate(**domain_aggregates())
+            .order_by('-items', 'domain')[:limit]
+        )
+        return [format_domain_stats(row) for row in rows]
+
+    return cached('domains', queryset, compute, limit)
+
+
+def domain_stats(domain, params):
+    """Stats of one domain's items matching ItemFilter parameters, or None if it has none"""
+    queryset = filtered_items(params).filter(domain=domain)
+
+    def compute():
+        row = queryset.aggregate(**domain_aggregates(), first=Min('time'), authors=Count('by', distinct=True))
+        if not row['items']:
+            return {}
+        return {'domain': domain, **format_domain_stats(row)}
+
+    return cached('domain', queryset, compute) or None
+
+
+def format_domain_stats(row):
+    stats = dict(row)
+    stats['avg_score'] = round(stats['total_score'] / stats['items'], 2) if stats['items'] else 0.0
+    for field in ('first', 'latest'):
+        if stats.get(field):
+            stats[field] = stats[field].isoformat()
+    return stats
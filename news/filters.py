@@ -0,0 +1,45 @@
+from django_filters import FilterSet, CharFilter, BooleanFilter, DateTimeFromToRangeFilter, NumberFilter, RangeFilter
+from .domains import normalize_domain, url_hash
+from .models import Item
+
+class ItemFilter(FilterSet):
+    """FilterSet for Item model"""
+    type = CharFilter(field_name='type')
+    by = CharFilter(field_name='by')
+    dead = BooleanFilter(field_name='dead')
+    created_locally = BooleanFilter(field_name='created_locally')
+    top_level = BooleanFilter(method='filter_top_level')
+    time = DateTimeFromToRangeFilter(field_name='time')
+    item_id = RangeFilter(field_name='item_id')
+    domain = CharFilter(method='filter_domain')
+    url = CharFilter(method='filter_url')
+    kid = NumberFilter(method='filter_kid')
+    part = NumberFilter(method='filter_part')
+    
+    def filter_top_level(self, queryset, name, value):
+        """Filter for top-level items (no parent)"""
+        if value:
+            return queryset.filter(parent__isnull=True)
+        return queryset
+    
+    def filter_domain(self, queryset, name, value):
+        """Filter for items linking to a domain, given as a host name or URL"""
+        domain = normalize_domain(value.strip())
+        return queryset.filter(domain=domain) if domain else queryset.none()
+    
+    def filter_url(self, queryset, name, value):
+        """Filter for items linking to the same page as a URL, ignoring scheme, www. and tracking parameters"""
+        digest = url_hash(value.strip())
+        return queryset.filter(url_hash=digest) if digest else queryset.none()
+    
+    def filter_kid(self, queryset, name, value):
+        """Filter for items whose kids contain the ID (GIN index scan)"""
+        return queryset.filter(kids__contains=[int(value)])
+    
+    def filter_part(self, queryset, name, value):
+        """Filter for polls whose parts contain the ID (GIN index scan)"""
+        return queryset.filter(parts__contains=[int(value)])
+    
+    class Meta:
+        model = Item
+        fields = ['type', 'by', 'dead', 'created_locally']
@@ -0,0 +1,218 @@
+"""
+Score history of stories.
+
+Every write of stories and polls by a sync appends a ScoreSnapshot of
+their score and descendants, but only for items that are new or whose
+values changed since they were last stored, so stories nobody votes on
+cost nothing. news_scoresnapshot is range-partitioned by day on `at`
+(see migration 0011), named after the day: news_scoresnapshot_p20250323,
+... Partitions are created as snapshots are written, like those of the
+items table, and maintain() ages them:
+
+- after SCORE_HISTORY_RAW_DAYS days, a partition is downsampled to the
+  last snapshot of each item in each hour, then vacuumed;
+- after SCORE_HISTORY_RETENTION_DAYS days, it is detached and dropped,
+  which costs nothing compared to deleting its rows.
+
+Both stay clear of locks that conflict with snapshot inserts: no VACUUM
+FULL, which would lock the partitioned table's readers and writers out
+while it rewrites, and the detach is CONCURRENTLY.
+"""
+import datetime, logging, re, threading
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from .metrics import SCORE_SNAPSHOTS
+from .models import ScoreSnapshot
+
+logger = logging.getLogger(__name__)
+
+TABLE = ScoreSnapshot._meta.db_table
+
+# Types whose scores are tracked
+TRACKED_TYPES = ('story', 'poll')
+
+# Days of empty partitions created ahead of today
+PARTITIONS_AHEAD = 2
+
+# Table comment marking partitions already downsampled to hourly snapshots
+DOWNSAMPLED = 'hourly'
+
+NAME_RE = re.compile(rf'^{TABLE}_p(\d{{8}})$')
+
+_covered = {}
+_covered_lock = threading.Lock()
+
+
+def partition_name(day):
+    return f'{TABLE}_p{day:%Y%m%d}'
+
+
+def list_partitions(cursor):
+    """(name, day, downsampled) of every partition of the snapshots table, by day"""
+    cursor.execute("""
+        SELECT child.relname, obj_description(child.oid, 'pg_class')
+        FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = %s::regclass
+    """, [TABLE])
+    partitions = []
+    for name, comment in cursor.fetchall():
+        match = NAME_RE.match(name)
+        if match:
+            day = datetime.datetime.strptime(match.group(1), '%Y%m%d').date()
+            partitions.append((name, day, comment == DOWNSAMPLED))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def ensure_partitions(today=None, using=DEFAULT_DB_ALIAS):
+    """
+    Create the partitions from today until PARTITIONS_AHEAD days ahead.
+
+    Returns the names of the partitions created, and an empty list if the
+    snapshots table is not partitioned.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+
+    today = today or timezone.now().date()
+    created = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        # Serialize with other processes extending the table
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('news_scoresnapshot_partitions'))")
+        existing = {day for _, day, _ in list_partitions(cursor)}
+        for offset in range(PARTITIONS_AHEAD + 1):
+            day = today + datetime.timedelta(days=offset)
+            if day in existing:
+                continue
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(day)}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{day}') TO ('{day + datetime.timedelta(days=1)}')"
+            )
+            created.append(partition_name(day))
+
+    if created:
+        logger.info(f"Created score history partitions {', '.join(created)}")
+    return created
+
+
+def cover(now, using=DEFAULT_DB_ALIAS):
+    """Make sure the day of now has a partition before snapshots are written"""
+    day = now.date()
+    if day <= _covered.get(using, datetime.date.min):
+        return
+    with _covered_lock:
+        if day <= _covered.get(using, datetime.date.min):
+            return
+        ensure_partitions(day, using=using)
+        _covered[using] = day + datetime.timedelta(days=PARTITIONS_AHEAD)
+
+
+def is_enabled():
+    return getattr(settings, 'SCORE_HISTORY', True)
+
+
+def has_changed(item, stored):
+    return stored is None or (stored.score, stored.descendants) != (item.score, item.descendants)
+
+
+def record_snapshots(items, stored):
+    """
+    Append snapshots of the tracked items that are new or whose score or
+    descendants differ from their stored rows before they were written,
+    given by item_id in stored. Returns the number of snapshots recorded.
+    """
+    if not is_enabled():
+        return 0
+    now = timezone.now()
+    snapshots = [
+        ScoreSnapshot(item_id=item.item_id, at=now, score=item.score, descendants=item.descendants)
+        for item in items
+        if item.type in TRACKED_TYPES and has_changed(item, stored.get(item.item_id))
+    ]
+    if not snapshots:
+        return 0
+    cover(now)
+    ScoreSnapshot.objects.bulk_create(snapshots)
+    SCORE_SNAPSHOTS.inc(len(snapshots))
+    logger.debug("Recorded %d score snapshots", len(snapshots))
+    return len(snapshots)
+
+
+def downsample_partition(cursor, name):
+    """Keep the last snapshot of each item in each hour of a partition, then vacuum it"""
+    cursor.execute(f"""
+        DELETE FROM "{name}" WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY item_id, date_trunc('hour', at) ORDER BY at DESC, id DESC
+                ) AS position
+                FROM "{name}"
+            ) AS ranked
+            WHERE position > 1
+        )
+    """)
+    deleted = cursor.rowcount
+    cursor.execute(f"""COMMENT ON TABLE "{name}" IS '{DOWNSAMPLED}'""")
+    # Marks the deleted rows' space reusable without blocking anyone
+    cursor.execute(f'VACUUM (ANALYZE) "{name}"')
+    return deleted
+
+
+def drop_partition(cursor, name):
+    """Detach a partition without blocking writes to the table, then drop it"""
+    cursor.execute("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = %s::regclass", [name])
+    row = cursor.fetchone()
+    if row is not None:
+        # A detach interrupted earlier can only be finalized
+        mode = 'FINALIZE' if row[0] else 'CONCURRENTLY'
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}" {mode}')
+    cursor.execute(f'DROP TABLE "{name}"')
+
+
+def maintain(today=None, using=DEFAULT_DB_ALIAS):
+    """
+    Create upcoming partitions, downsample those older than
+    SCORE_HISTORY_RAW_DAYS and drop those older than
+    SCORE_HISTORY_RETENTION_DAYS.
+
+    Returns a dict with the partitions created, downsampled and dropped,
+    and the number of snapshots removed by downsampling.
+    """
+    result = {'created': [], 'downsampled': [], 'dropped': [], 'removed': 0}
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return result
+
+    today = today or timezone.now().date()
+    result['created'] = ensure_partitions(today, using=using)
+    raw_days = getattr(settings, 'SCORE_HISTORY_RAW_DAYS', 2)
+    retention_days = getattr(settings, 'SCORE_HISTORY_RETENTION_DAYS', 30)
+
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return result
+        for name, day, downsampled in list_partitions(cursor):
+            age = (today - day).days
+            if age >= retention_days:
+                drop_partition(cursor, name)
+                result['dropped'].append(name)
+            elif age >= raw_days and not downsampled:
+                result['removed'] += downsample_partition(cursor, name)
+                result['downsampled'].append(name)
+
+    if result['dropped'] or result['downsampled']:
+        logger.info(
+            f"Score history: dropped {result['dropped']}, downsampled {result['downsampled']} "
+            f"({result['removed']} snapshots removed)"
+        )
+    return result
@@ -0,0 +1,337 @@
+import gzip, io, json, logging, time
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .authors import refresh_counters
+from .domains import url_fields
+from .facets import bump_generation
+from .models import Item
+from .partitions import cover
+
+logger = logging.getLogger(__name__)
+
+# Columns of the staging table, in COPY order
+STAGING_COLUMNS = [
+    'seq', 'item_id', 'type', 'by', 'time', 'text', 'dead', 'parent_item_id', 'poll_item_id',
+    'kids', 'url', 'domain', 'url_hash', 'score', 'title', 'parts', 'descendants',
+]
+
+# Columns copied from the staging table into news_item
+ITEM_COLUMNS = [
+    'item_id', 'type', 'by', 'time', 'text', 'dead', 'kids', 'url', 'domain', 'url_hash', 'score', 'title', 'parts',
+    'descendants',
+]
+
+# Range of integer columns
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+
+MAX_LENGTHS = {
+    field: Item._meta.get_field(field).max_length
+    for field in ('type', 'by', 'url', 'domain', 'title')
+}
+
+
+def open_dump(path):
+    """Open an NDJSON file for reading as text, transparently un-gzipping it"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def copy_value(value):
+    """Encode a value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        # Integer array literal, e.g. {1,2,3}
+        value = '{' + ','.join(str(element) for element in value) + '}'
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    return (
+        str(value)
+        .replace('\x00', '')
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def is_int32(value):
+    return isinstance(value, int) and not isinstance(value, bool) and INT32_MIN <= value <= INT32_MAX
+
+
+def id_list(value):
+    """The integer IDs of a kids or parts list, dropping anything else"""
+    if not isinstance(value, list):
+        return []
+    return [element for element in value if is_int32(element)]
+
+
+def to_int(value):
+    """
+    An integer column value: integers, integral floats and numeric strings
+    within the integer column range. Raises ValueError for anything else.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str):
+        value = int(value)
+    if not is_int32(value):
+        raise ValueError(f"Not an integer column value: {value!r}")
+    return value
+
+
+def to_text(value):
+    """A text column value: strings, and numbers as strings. Raises ValueError for lists and objects."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise ValueError(f"Not a text column value: {value!r}")
+
+
+def to_time(value):
+    """
+    A timestamp column value in ISO format, from unix time (API format) or
+    an ISO timestamp (export format); the current time if missing. Raises
+    ValueError for anything else.
+    """
+    if value is None or value == '':
+        parsed = timezone.now()
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            parsed = timezone.datetime.fromtimestamp(value, tz=timezone.get_current_timezone())
+        except (OverflowError, OSError) as e:
+            raise ValueError(f"Invalid unix time {value!r}: {str(e)}")
+    elif isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"Invalid timestamp: {value!r}")
+    else:
+        raise ValueError(f"Invalid time: {value!r}")
+    if timezone.is_aware(parsed):
+        parsed = timezone.make_naive(parsed, timezone.get_current_timezone())
+    return parsed.isoformat()
+
+
+def to_row(seq, data):
+    """
+    Turn one HN item (API or export format) into a staging row, or None to
+    skip it. Fields are checked against their column types, so a bad value
+    raises ValueError here rather than failing the COPY of its whole chunk.
+    """
+    if not isinstance(data, dict):
+        return None
+    item_id = data.get('id', data.get('item_id'))
+    if not is_int32(item_id):
+        return None
+
+    row = {
+        'seq': seq,
+        'item_id': item_id,
+        'type': to_text(data.get('type')) or 'story',
+        'by': to_text(data.get('by')),
+        'time': to_time(data.get('time')),
+        'text': to_text(data.get('text')),
+        'dead': bool(data.get('dead', False)),
+        'parent_item_id': to_int(data.get('parent')),
+        'poll_item_id': to_int(data.get('poll')),
+        'kids': id_list(data.get('kids')),
+        'url': to_text(data.get('url')),
+        'score': to_int(data.get('score')) or 0,
+        'title': to_text(data.get('title')),
+        'parts': id_list(data.get('parts')),
+        'descendants': to_int(data.get('descendants')) or 0,
+    }
+    row['domain'], row['url_hash'] = url_fields(row['url'])
+    for field, max_length in MAX_LENGTHS.items():
+        if row[field] and len(row[field]) > max_length:
+            row[field] = row[field][:max_length]
+    return row
+
+
+class ItemImporter:
+    """
+    Bulk-loads HN items from NDJSON dumps.
+
+    Lines are parsed in chunks, each chunk is COPYed into a temporary staging
+    table and merged into news_item with a single INSERT ... ON CONFLICT, so
+    a chunk costs a handful of statements regardless of its size. Parent and
+    poll references are collected along the way and resolved set-wise once
+    every chunk is in, since a parent may appear later in the file. Items
+    created locally are never overwritten.
+    """
+
+    def __init__(self, chunk_size=50000, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.stats = {
+            'read': 0,
+            'skipped': 0,
+            'inserted': 0,
+            'updated': 0,
+            'parents_linked': 0,
+            'polls_linked': 0,
+            'authors': 0,
+            'elapsed_time': 0.0,
+            'rows_per_sec': 0.0,
+        }
+
+    def import_file(self, path):
+        with open_dump(path) as f:
+            return self.import_lines(f, label=path)
+
+    def import_lines(self, lines, label='items'):
+        """Import an iterable of NDJSON lines, e.g. an open dump or a generator"""
+        start_time = time.time()
+        table = Item._meta.db_table
+
+        with connection.cursor() as cursor:
+            self._create_staging_tables(cursor)
+            try:
+                chunk = []
+                for line in lines:
+                    chunk.append(line)
+                    if len(chunk) >= self.chunk_size:
+                        self._import_chunk(cursor, table, chunk)
+                        chunk = []
+                if chunk:
+                    self._import_chunk(cursor, table, chunk)
+
+                self._link(cursor, table)
+                self.stats['authors'] = refresh_counters()
+            finally:
+                cursor.execute("DROP TABLE IF EXISTS news_item_import")
+                cursor.execute("DROP TABLE IF EXISTS news_item_import_links")
+                bump_generation()
+
+        elapsed = time.time() - start_time
+        self.stats['elapsed_time'] = elapsed
+        self.stats['rows_per_sec'] = self.stats['read'] / elapsed if elapsed else 0.0
+        logger.info(f"Imported {label}: {self.stats}")
+        return self.stats
+
+    def _create_staging_tables(self, cursor):
+        cursor.execute("""
+            CREATE TEMP TABLE news_item_import (
+                "seq" bigint,
+                "item_id" integer,
+                "type" varchar(10),
+                "by" varchar(255),
+                "time" timestamp,
+                "text" text,
+                "dead" boolean,
+                "parent_item_id" integer,
+                "poll_item_id" integer,
+                "kids" integer[],
+                "url" varchar(2000),
+                "domain" varchar(255),
+                "url_hash" varchar(40),
+                "score" integer,
+                "title" varchar(500),
+                "parts" integer[],
+                "descendants" integer
+            )
+        """)
+        cursor.execute("""
+            CREATE TEMP TABLE news_item_import_links (
+                item_id integer,
+                parent_item_id integer,
+                poll_item_id integer
+            )
+        """)
+
+    def _import_chunk(self, cursor, table, lines):
+        buffer = io.StringIO()
+        rows = 0
+        max_item_id = None
+        for line in lines:
+            self.stats['read'] += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = to_row(self.stats['read'], json.loads(line))
+            except (ValueError, TypeError, OverflowError):
+                row = None
+            if row is None:
+                self.stats['skipped'] += 1
+                continue
+            buffer.write('\t'.join(copy_value(row[column]) for column in STAGING_COLUMNS))
+            buffer.write('\n')
+            rows += 1
+            max_item_id = max(max_item_id or 0, row['item_id'])
+
+        if not rows:
+            return
+        buffer.seek(0)
+        cover(max_item_id)
+
+        columns = ', '.join(f'"{column}"' for column in ITEM_COLUMNS)
+        excluded = ', '.join(f'"{column}" = EXCLUDED."{column}"' for column in ITEM_COLUMNS[1:])
+        with transaction.atomic():
+            staging_columns = ', '.join(f'"{column}"' for column in STAGING_COLUMNS)
+            self._copy(cursor, f"COPY news_item_import ({staging_columns}) FROM STDIN", buffer)
+            # Keep the last occurrence of each ID in the chunk. Partitioned
+            # tables cannot return xmax to tell inserts from updates, so the
+            # updates are counted from the rows that existed before: the
+            # subquery sees the table as of the start of the statement.
+            cursor.execute(f"""
+                WITH upserted AS (
+                    INSERT INTO {table} ({columns}, created_locally, synced_at)
+                    SELECT DISTINCT ON (item_id) {columns}, false, now()
+                    FROM news_item_import
+                    ORDER BY item_id, seq DESC
+                    ON CONFLICT (item_id) DO UPDATE SET {excluded}, synced_at = EXCLUDED.synced_at
+                    WHERE {table}.created_locally = false
+                    RETURNING 1
+                )
+                SELECT
+                    (SELECT count(*) FROM upserted),
+                    (SELECT count(*) FROM {table}
+                     WHERE item_id IN (SELECT item_id FROM news_item_import) AND created_locally = false)
+            """)
+            written, updated = cursor.fetchone()
+            cursor.execute("""
+                INSERT INTO news_item_import_links (item_id, parent_item_id, poll_item_id)
+                SELECT item_id, parent_item_id, poll_item_id
+                FROM news_item_import
+                WHERE parent_item_id IS NOT NULL OR poll_item_id IS NOT NULL
+            """)
+            cursor.execute("TRUNCATE news_item_import")
+
+        self.stats['inserted'] += written - updated
+        self.stats['updated'] += updated
+        self.stats['skipped'] += rows - written
+        if self.progress:
+            self.progress(self.stats)
+
+    @staticmethod
+    def _copy(cursor, sql, buffer):
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def _link(self, cursor, table):
+        """Point parent and poll foreign keys at the imported items, set-wise"""
+        for column, stat in (('parent', 'parents_linked'), ('poll', 'polls_linked')):
+            cursor.execute(f"""
+                UPDATE {table} AS child
+                SET {column}_id = target.id
+                FROM news_item_import_links AS link
+                JOIN {table} AS target ON target.item_id = link.{column}_item_id
+                WHERE child.item_id = link.item_id
+                  AND child.{column}_id IS DISTINCT FROM target.id
+            """)
+            self.stats[stat] = cursor.rowcount
@@ -0,0 +1,259 @@
+"""
+Per-request instrumentation: SQL query count and time, serializer time and
+total time for every request.
+
+RequestInstrumentationMiddleware starts a RequestMetrics for each request in
+a context variable. Queries are counted by an execute wrapper installed on
+every database connection (see install_query_hook), so queries made from
+sync_to_async threads are attributed to the right request too, and
+serializers using TimedSerializerMixin add their rendering time. The
+middleware reports the numbers in a Server-Timing header, aggregates them
+per route and logs requests that go over their query budget.
+"""
+import bisect, contextvars, logging, threading, time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from .metrics import HTTP_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('news_request_metrics', default=None)
+_serializer_depth = contextvars.ContextVar('news_serializer_depth', default=0)
+
+# Upper bounds (in ms) of the request duration histogram buckets
+DURATION_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Number of SQL statements quoted in a query budget warning
+BUDGET_SAMPLE_QUERIES = 5
+
+
+class RequestMetrics:
+    """Measurements for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.sample_queries = []
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            if len(self.sample_queries) < BUDGET_SAMPLE_QUERIES:
+                self.sample_queries.append(sql)
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def current_metrics():
+    """The RequestMetrics of the request being handled, or None"""
+    return _current.get()
+
+
+def query_hook(execute, sql, params, many, context):
+    """Database execute wrapper attributing every query to the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def _add_query_hook(sender, connection, **kwargs):
+    if query_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_hook)
+
+
+def install_query_hook():
+    """Count queries on every database connection opened from now on"""
+    connection_created.connect(_add_query_hook, dispatch_uid='news_query_hook')
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding to_representation() time to the request's metrics.
+
+    Only the outermost serializer call is timed, so nested serializers and
+    the items of a many=True list are not counted twice.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        depth = _serializer_depth.get()
+        if metrics is None or depth:
+            return super().to_representation(instance)
+
+        token = _serializer_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            _serializer_depth.reset(token)
+
+
+class RouteStats:
+    """Aggregated request metrics for one route"""
+
+    def __init__(self):
+        self.requests = 0
+        self.total_time = 0.0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.over_budget = 0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+
+    def add(self, metrics, total_time, over_budget):
+        self.requests += 1
+        self.total_time += total_time
+        self.db_time += metrics.db_time
+        self.serializer_time += metrics.serializer_time
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.over_budget += over_budget
+        self.buckets[bisect.bisect_left(DURATION_BUCKETS, total_time * 1000)] += 1
+
+    def percentile(self, pct):
+        """Upper bound (ms) of the bucket holding the pct-th percentile, None if beyond the last"""
+        rank = pct / 100.0 * self.requests
+        seen = 0
+        for bound, count in zip(DURATION_BUCKETS + [None], self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.total_time / requests * 1000, 2),
+            'mean_db_ms': round(self.db_time / requests * 1000, 2),
+            'mean_serializer_ms': round(self.serializer_time / requests * 1000, 2),
+            'mean_queries': round(self.queries / requests, 2),
+            'max_queries': self.max_queries,
+            'over_budget': self.over_budget,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'histogram_ms': {
+                (f"le_{bound}" if bound else "inf"): count
+                for bound, count in zip(DURATION_BUCKETS + [None], self.buckets)
+            },
+        }
+
+
+class RequestStatsRegistry:
+    """Per-route aggregates for this process"""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, metrics, total_time, over_budget):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            stats.add(metrics, total_time, over_budget)
+
+    def snapshot(self):
+        with self._lock:
+            return {route: stats.as_dict() for route, stats in sorted(self._routes.items())}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+request_stats = RequestStatsRegistry()
+
+
+def query_budget(route):
+    """Maximum number of queries a request to route should make"""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(route, getattr(settings, 'QUERY_BUDGET_DEFAULT', 20))
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return '/' + match.route
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Measure every request and report it in a Server-Timing header.
+
+    Enabled with REQUEST_INSTRUMENTATION (default: true). The header can be
+    turned off with SERVER_TIMING_HEADER=false, e.g. when timings should not
+    be visible to clients.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current.set(RequestMetrics())
+        try:
+            response = self.get_response(request)
+            self.finish(request, response)
+            return response
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(RequestMetrics())
+        try:
+            response = await self.get_response(request)
+            self.finish(request, response)
+            return response
+        finally:
+            _current.reset(token)
+
+    def finish(self, request, response):
+        metrics = _current.get()
+        total_time = metrics.total_time
+        route = route_of(request)
+
+        budget = query_budget(route)
+        over_budget = metrics.queries > budget
+        if over_budget:
+            logger.warning(
+                f"{request.method} {request.path} made {metrics.queries} queries "
+                f"(budget {budget} for {route}), first: {metrics.sample_queries}"
+            )
+        request_stats.add(route, metrics, total_time, over_budget)
+        HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(total_time)
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.serializer_time * 1000:.2f}',
+                f'total;dur={total_time * 1000:.2f}',
+            ])
+        logger.debug(
+            f"{request.method} {request.path}: {metrics.queries} queries, db {metrics.db_time * 1000:.1f} ms, "
+            f"serialize {metrics.serializer_time * 1000:.1f} ms, total {total_time * 1000:.1f} ms"
+        )
@@ -0,0 +1,173 @@
+import logging, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from django.utils import timezone
+from .db import uses_pooled_connection
+from .locks import AdvisoryLock
+from .metrics import SYNC_JOB_SECONDS, SYNC_JOBS, SYNC_LAG
+from .models import SyncJob
+from .services import HackerNewsAPI
+
+logger = logging.getLogger(__name__)
+
+# Name of the advisory lock shared by every sync entry point
+SYNC_LOCK = 'sync'
+
+# Minimum number of seconds between two progress writes for the same job
+PROGRESS_INTERVAL = 1.0
+
+
+class SyncJobRunner:
+    """
+    Runs syncs one at a time across the deployment and records them as SyncJobs.
+
+    Every entry point (the API, the scheduler and the management commands)
+    goes through here and takes the shared sync advisory lock first. When
+    another sync already holds it, API requests are coalesced into the running
+    job and scheduled or command runs are skipped; either way a SyncJob row
+    records what happened.
+    """
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls):
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sync-job')
+        return cls._executor
+
+    @classmethod
+    def submit(cls, count, source='api'):
+        """
+        Enqueue a background sync of the latest count items.
+
+        Returns the new queued SyncJob, or a 'coalesced' SyncJob pointing at
+        the running job if another sync is already in progress.
+        """
+        lock = AdvisoryLock(SYNC_LOCK)
+        if not lock.acquire():
+            return cls._record_not_run('latest', source, count, 'coalesced')
+
+        try:
+            cls._expire_stale_jobs()
+            job = SyncJob.objects.create(kind='latest', source=source, count=count)
+        except Exception:
+            lock.release()
+            raise
+
+        logger.info(f"Enqueued sync job {job.job_id} with count={count}")
+        cls.get_executor().submit(cls._run_in_background, job.pk, lock)
+        return job
+
+    @classmethod
+    def run_now(cls, kind, source, count=100):
+        """
+        Run a sync in the current thread, or skip it if one is already running.
+
+        Returns the finished (or skipped) SyncJob.
+        """
+        lock = AdvisoryLock(SYNC_LOCK)
+        if not lock.acquire():
+            return cls._record_not_run(kind, source, count, 'skipped')
+
+        try:
+            cls._expire_stale_jobs()
+            job = SyncJob.objects.create(kind=kind, source=source, count=count)
+            cls.execute(job.pk)
+            job.refresh_from_db()
+            return job
+        finally:
+            lock.release()
+
+    @classmethod
+    def execute(cls, pk):
+        """Execute a queued job in the current thread, recording its progress"""
+        start_time = time.monotonic()
+        job = None
+        try:
+            SyncJob.objects.filter(pk=pk).update(status='running', started_at=timezone.now())
+            job = SyncJob.objects.get(pk=pk)
+            logger.info(f"Starting {job.kind} sync job {job.job_id} ({job.source})")
+
+            last_write = [0.0]
+
+            def progress(done, total):
+                now = time.monotonic()
+                if done < total and now - last_write[0] < PROGRESS_INTERVAL:
+                    return
+                last_write[0] = now
+                SyncJob.objects.filter(pk=pk).update(done=done, total=total)
+
+            if job.kind == 'since_last':
+                result = HackerNewsAPI.sync_since_last(progress=progress, batch_size=job.count)
+            elif job.kind == 'refresh':
+                result = HackerNewsAPI.sync_recent_stories(job.count, progress=progress)
+            else:
+                result = HackerNewsAPI.sync_latest_items(job.count, progress=progress)
+
+            status = 'failed' if 'error' in result else 'succeeded'
+            SyncJob.objects.filter(pk=pk).update(
+                status=status,
+                result=result,
+                error=result.get('error'),
+                lag=result.get('lag'),
+                finished_at=timezone.now()
+            )
+            logger.info(f"Sync job {job.job_id} finished: {result}")
+            SYNC_JOBS.labels(job.kind, job.source, status).inc()
+            SYNC_JOB_SECONDS.labels(job.kind, job.source).observe(time.monotonic() - start_time)
+            if result.get('lag') is not None:
+                SYNC_LAG.set(result['lag'])
+        except Exception as e:
+            logger.error(f"Sync job {pk} failed: {str(e)}", exc_info=True)
+            SyncJob.objects.filter(pk=pk).update(
+                status='failed',
+                error=str(e),
+                finished_at=timezone.now()
+            )
+            if job is not None:
+                SYNC_JOBS.labels(job.kind, job.source, 'failed').inc()
+
+    @classmethod
+    @uses_pooled_connection
+    def _run_in_background(cls, pk, lock):
+        try:
+            cls.execute(pk)
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _record_not_run(kind, source, count, status):
+        """Record a trigger that found another sync holding the lock"""
+        running = SyncJob.objects.filter(status__in=['queued', 'running']).order_by('-created_at').first()
+        now = timezone.now()
+        job = SyncJob.objects.create(
+            kind=kind,
+            source=source,
+            count=count,
+            status=status,
+            coalesced_into=running,
+            started_at=now,
+            finished_at=now
+        )
+        logger.info(
+            f"Sync already in progress ({running.job_id if running else 'unknown job'}), "
+            f"{status} {kind} sync from {source} as {job.job_id}"
+        )
+        SYNC_JOBS.labels(kind, source, status).inc()
+        return job
+
+    @staticmethod
+    def _expire_stale_jobs():
+        """
+        Fail jobs left queued or running by a process that died mid-sync.
+
+        Only called while holding the sync lock, when no other job can be live.
+        """
+        stale = SyncJob.objects.filter(status__in=['queued', 'running']).update(
+            status='failed',
+            error='Interrupted before completion',
+            finished_at=timezone.now()
+        )
+        if stale:
+            logger.warning(f"Marked {stale} interrupted sync job(s) as failed")
@@ -0,0 +1,108 @@
+"""
+Logging helpers: a JSON lines formatter and a non-blocking queue handler.
+
+Both are referenced from the LOGGING setting (see LOG_FORMAT and LOG_QUEUE
+in zcore/settings.py). QueueListenerHandler puts records on an in-memory
+queue and returns; a background thread formats them and writes them to the
+real handlers, so a slow disk or terminal does not hold up syncing.
+"""
+import copy, json, logging, logging.handlers, queue
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+
+    Fields passed with extra= are added as top-level keys, so summary
+    records can carry counts and durations that log processors can query.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+def _handler_by_name(name):
+    getter = getattr(logging, 'getHandlerByName', None)  # Python 3.12+
+    handler = getter(name) if getter else logging._handlers.get(name)
+    if handler is None:
+        raise ValueError(f"Logging handler {name!r} is not configured yet")
+    return handler
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for a background thread writing them to other handlers.
+
+    handlers names handlers of the same LOGGING config. dictConfig creates
+    handlers in the order of their names, so this one's name must sort
+    after theirs. When queue_size records are waiting, new ones are dropped
+    and counted instead of blocking the caller.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        # Only loggers hold on to handlers, so keep the targets alive here
+        self.handlers = [_handler_by_name(name) for name in handlers]
+        self.listener = None
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the arguments now, as they may change once the caller goes on,
+        # but leave formatting (including the traceback's) to the targets
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from .metrics import LOG_RECORDS_DROPPED
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def emit(self, record):
+        # Called with the handler lock held, so the listener starts only once
+        if self.listener is None:
+            self.listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+        super().emit(record)
+
+    def close(self):
+        # logging.shutdown() closes handlers newest first, so this flushes the
+        # queue into its targets before they are closed themselves
+        self.acquire()
+        try:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+        finally:
+            self.release()
+        super().close()
@@ -0,0 +1,65 @@
+import logging, time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from news.domains import url_fields
+from news.facets import bump_generation
+from news.models import Item
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Fill in the domain and URL hash of items stored before they were derived on write'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Items updated per statement')
+        parser.add_argument('--all', action='store_true', help='Recompute every item with a URL, not only those missing a domain')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Item.objects.filter(url__isnull=False).exclude(url='')
+        if not options['all']:
+            queryset = queryset.filter(domain__isnull=True)
+
+        self.stdout.write("Backfilling item domains and URL hashes...")
+        start_time = time.time()
+        updated = 0
+        last_id = -1
+        try:
+            while True:
+                # Walk the items in item_id order, so every batch only touches
+                # the partitions covering its ID range
+                rows = list(
+                    queryset.filter(item_id__gt=last_id).order_by('item_id').values_list('item_id', 'url')[:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                updated += self.update_batch(rows)
+                self.stdout.write(f"  {updated} items updated, up to item {last_id}")
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error backfilling domains: {str(e)}"))
+            logger.error(f"Error in backfill_domains command: {str(e)}", exc_info=True)
+            return
+        finally:
+            if updated:
+                bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated} items in {time.time() - start_time:.2f} seconds"
+        ))
+
+    @staticmethod
+    def update_batch(rows):
+        values = []
+        params = []
+        for item_id, url in rows:
+            values.append("(%s, %s, %s)")
+            params.extend([item_id, *url_fields(url)])
+        table = Item._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {table} SET domain = v.domain, url_hash = v.url_hash
+                FROM (VALUES {', '.join(values)}) AS v (item_id, domain, url_hash)
+                WHERE {table}.item_id = v.item_id AND {table}.item_id BETWEEN %s AND %s
+            """, [*params, rows[0][0], rows[-1][0]])
+            return cursor.rowcount
@@ -0,0 +1,56 @@
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from news.models import Item
+from news.partitions import dangling_links, ensure_partitions, is_partitioned, list_partitions
+from news.services import HackerNewsAPI
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Create the item partitions needed up to HN maxitem, plus the spare ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--up-to', type=int, default=None,
+            help='Cover item IDs up to this one (default: HN maxitem, or the highest stored ID if HN is unreachable)'
+        )
+        parser.add_argument('--list', action='store_true', help='List the partitions and their estimated row counts')
+        parser.add_argument('--check', action='store_true', help='Count parent and poll links to missing items')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError("news_item is not partitioned, run migrate first")
+
+        up_to = options['up_to']
+        if up_to is None:
+            up_to = HackerNewsAPI.get_max_item_id()
+        if up_to is None:
+            self.stdout.write(self.style.WARNING("Could not get HN maxitem, using the highest stored item ID"))
+            up_to = Item.objects.aggregate(max_id=Max('item_id'))['max_id'] or 0
+
+        created = ensure_partitions(up_to)
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions: {', '.join(created)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Item IDs up to {up_to} are already covered"))
+
+        if options['list']:
+            with connection.cursor() as cursor:
+                partitions = list_partitions(cursor)
+                cursor.execute(
+                    "SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)",
+                    [[name for name, _, _ in partitions]]
+                )
+                rows = {name: int(max(reltuples, 0)) for name, reltuples in cursor.fetchall()}
+            for name, lower, upper in partitions:
+                self.stdout.write(f"{name}: item IDs {lower} to {upper - 1}, ~{rows.get(name, 0)} rows")
+
+        if options['check']:
+            dangling = dangling_links()
+            style = self.style.WARNING if any(dangling.values()) else self.style.SUCCESS
+            self.stdout.write(style(
+                f"Items linked to missing items: {dangling['parent']} by parent, {dangling['poll']} by poll"
+            ))
@@ -0,0 +1,50 @@
+import gzip, logging, sys
+from django.core.management.base import BaseCommand, CommandError
+from news.export import ExportError, export_chunks, export_queryset
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Export items as NDJSON or CSV, optionally only those synced since a watermark'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help='Output format')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout). Gzipped if it ends in .gz')
+        parser.add_argument('--since', help='Only export items synced after this ISO timestamp')
+        parser.add_argument('--type', help='Filter by item type')
+        parser.add_argument('--by', help='Filter by author')
+        parser.add_argument('--dead', choices=['true', 'false'], help='Filter by dead status')
+        parser.add_argument('--created-locally', choices=['true', 'false'], help='Filter by origin')
+        parser.add_argument('--top-level', choices=['true', 'false'], help='Only top-level items')
+    
+    def handle(self, *args, **options):
+        params = {
+            key: options[key]
+            for key in ('since', 'type', 'by', 'dead', 'created_locally', 'top_level')
+            if options[key] is not None
+        }
+        
+        try:
+            queryset, watermark = export_queryset(params)
+        except ExportError as e:
+            raise CommandError(str(e))
+        
+        output = options['output']
+        if not output:
+            stream = sys.stdout
+        elif output.endswith('.gz'):
+            stream = gzip.open(output, 'wt', encoding='utf-8', newline='')
+        else:
+            stream = open(output, 'w', encoding='utf-8', newline='')
+        
+        try:
+            for chunk in export_chunks(queryset, options['format']):
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        
+        # Keep stdout clean for the data; the watermark goes to stderr
+        self.stderr.write(self.style.SUCCESS(
+            f"Export complete. Pass --since {watermark.isoformat()} for the next incremental export"
+        ))
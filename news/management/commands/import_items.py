@@ -0,0 +1,38 @@
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from news.importer import ItemImporter
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Bulk import Hacker News items from NDJSON/JSONL dumps (optionally gzipped)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Dump files, one HN item JSON object per line')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Lines loaded per COPY batch')
+    
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            self.stdout.write(f"Importing {path}...")
+            
+            def progress(stats):
+                self.stdout.write(
+                    f"  {stats['read']} lines read, {stats['inserted']} inserted, "
+                    f"{stats['updated']} updated, {stats['skipped']} skipped"
+                )
+            
+            try:
+                stats = ItemImporter(chunk_size=options['chunk_size'], progress=progress).import_file(path)
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error importing {path}: {str(e)}", exc_info=True)
+                raise CommandError(f"Error importing {path}: {str(e)}")
+            
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {stats['inserted']} new and {stats['updated']} updated items "
+                f"({stats['skipped']} skipped, {stats['parents_linked']} parents and "
+                f"{stats['polls_linked']} polls linked, {stats['authors']} authors counted) "
+                f"in {stats['elapsed_time']:.2f} seconds "
+                f"({stats['rows_per_sec']:.0f} rows/sec)"
+            ))
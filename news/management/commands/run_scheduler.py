@@ -0,0 +1,35 @@
+import logging, signal, threading
+from django.core.management.base import BaseCommand
+from news.db import close_pools
+from news.pipeline import IngestPipeline
+from news.scheduler import SchedulerLeader
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the APScheduler jobs in this process, as leader or standby'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-interval', type=int, default=None,
+            help='Seconds between leadership attempts (default: SCHEDULER_LEADER_RETRY)'
+        )
+    
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        
+        leader = SchedulerLeader(retry_interval=options['retry_interval'])
+        leader.start()
+        self.stdout.write("Scheduler started, waiting for leadership. Press Ctrl+C to stop.")
+        
+        try:
+            stop.wait()
+        finally:
+            self.stdout.write("Stopping scheduler...")
+            # Let a running sync write what it has fetched instead of finishing the batch
+            IngestPipeline.stop_all()
+            leader.stop()
+            close_pools()
+            self.stdout.write(self.style.SUCCESS("Scheduler stopped"))
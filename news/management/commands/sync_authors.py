@@ -0,0 +1,69 @@
+import datetime, logging, time
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+from news.authors import refresh_counters, sync_authors
+from news.models import Author
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recompute author counters and fetch author profiles from Hacker News API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Users whose profiles are fetched')
+        parser.add_argument('--counters', action='store_true', help='Recompute the counters of every author first')
+        parser.add_argument('--missing', action='store_true', help='Fetch the profiles of authors never fetched')
+        parser.add_argument('--stale', type=int, metavar='SECONDS', help='Also refetch profiles older than this')
+        parser.add_argument('--limit', type=int, default=1000, help='Most active authors fetched with --missing or --stale')
+        parser.add_argument('--batch-size', type=int, default=100, help='Profiles fetched and stored together')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        try:
+            if options['counters']:
+                self.stdout.write("Recomputing author counters...")
+                counted = refresh_counters()
+                self.stdout.write(f"  {counted} authors counted")
+
+            usernames = list(options['usernames'])
+            if options['missing'] or options['stale'] is not None:
+                pending = self.pending(options['missing'], options['stale'], options['limit'])
+                if options['missing'] and not options['counters']:
+                    # Recount the authors about to be fetched from their items
+                    refresh_counters(pending)
+                usernames += pending
+            if not usernames:
+                if not options['counters']:
+                    self.stdout.write(self.style.WARNING("No authors to sync; pass usernames, --missing or --stale"))
+                return
+
+            self.stdout.write(f"Fetching {len(usernames)} author profiles from Hacker News...")
+            synced = 0
+            batch_size = options['batch_size']
+            for start in range(0, len(usernames), batch_size):
+                synced += sync_authors(usernames[start:start + batch_size])
+                self.stdout.write(f"  {synced} profiles stored")
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error syncing authors: {str(e)}"))
+            logger.error(f"Error in sync_authors command: {str(e)}", exc_info=True)
+            return
+
+        failed = len(usernames) - synced
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Synced {synced} author profiles ({failed} failed) in {time.time() - start_time:.2f} seconds"
+        ))
+
+    @staticmethod
+    def pending(missing, stale, limit):
+        """Usernames of the most active authors whose profiles need fetching"""
+        condition = Q()
+        if missing:
+            condition |= Q(synced_at__isnull=True)
+        if stale is not None:
+            condition |= Q(synced_at__lt=timezone.now() - datetime.timedelta(seconds=stale))
+        queryset = Author.objects.filter(condition).order_by(
+            (F('stories') + F('comments')).desc(), 'username'
+        )
+        return list(queryset.values_list('username', flat=True)[:limit])
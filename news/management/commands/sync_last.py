@@ -1,6 +1,6 @@
 import logging
 from django.core.management.base import BaseCommand
-from news.services import HackerNewsAPI
+from news.jobs import SyncJobRunner
 
 logger = logging.getLogger(__name__)
 
@@ -11,12 +11,19 @@ class Command(BaseCommand):
         self.stdout.write("Syncing items since last sync...")
         
         try:
-            result = HackerNewsAPI.sync_since_last()
+            job = SyncJobRunner.run_now('since_last', 'command')
             
-            if 'error' in result:
-                self.stdout.write(self.style.ERROR(f"Sync failed: {result['error']}"))
+            if job.status == 'skipped':
+                self.stdout.write(self.style.WARNING(
+                    f"Another sync is already running, skipped (job {job.job_id})"
+                ))
                 return
-                
+            
+            if job.status == 'failed':
+                self.stdout.write(self.style.ERROR(f"Sync failed: {job.error}"))
+                return
+            
+            result = job.result or {}
             self.stdout.write(self.style.SUCCESS(
                 f"Successfully synced {result.get('synced_count', 0)} items "
                 f"({result.get('failed_count', 0)} failed) "
@@ -25,4 +32,4 @@ class Command(BaseCommand):
             ))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error syncing items: {str(e)}"))
-            logger.error(f"Error in sync_since_last command: {str(e)}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Error in sync_since_last command: {str(e)}", exc_info=True)
@@ -1,6 +1,6 @@
 import logging
 from django.core.management.base import BaseCommand
-from news.services import HackerNewsAPI
+from news.jobs import SyncJobRunner
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,18 @@ class Command(BaseCommand):
         self.stdout.write(f"Syncing {count} latest items from Hacker News...")
         
         try:
-            result = HackerNewsAPI.sync_latest_items(count)
+            job = SyncJobRunner.run_now('latest', 'command', count=count)
+            
+            if job.status == 'skipped':
+                self.stdout.write(self.style.WARNING(
+                    f"Another sync is already running, skipped (job {job.job_id})"
+                ))
+                return
+            if job.status == 'failed':
+                self.stdout.write(self.style.ERROR(f"Sync failed: {job.error}"))
+                return
+            
+            result = job.result or {}
             self.stdout.write(self.style.SUCCESS(
                 f"Successfully synced {result.get('synced_count', 0)} items "
                 f"({result.get('failed_count', 0)} failed) "
@@ -23,4 +34,4 @@ class Command(BaseCommand):
             ))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error syncing items: {str(e)}"))
-            logger.error(f"Error in sync_latest command: {str(e)}", exc_info=True)
\ No newline at end of file
+            logger.error(f"Error in sync_latest command: {str(e)}", exc_info=True)
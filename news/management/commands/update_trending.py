@@ -0,0 +1,60 @@
+import logging
+from django.core.management.base import BaseCommand
+from django.db import connection
+from news.history import is_partitioned, list_partitions, maintain
+from news.models import TrendingStory
+from news.trending import compute_trending, update_trending
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Refresh recent stories, age the score history and recompute the trending stories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-refresh', action='store_true', help='Rank from the stored history without resyncing stories')
+        parser.add_argument('--list', action='store_true', help='List the score history partitions and exit')
+        parser.add_argument('--top', type=int, default=10, help='Trending stories printed afterwards')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.list_partitions()
+            return
+
+        try:
+            if options['no_refresh']:
+                result = {
+                    'refreshed': 0, 'refresh_failed': 0, 'refresh_status': None,
+                    'history': maintain(), 'ranked': compute_trending(),
+                }
+            else:
+                self.stdout.write("Refreshing recent stories from Hacker News...")
+                result = update_trending('command')
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error updating trending stories: {str(e)}"))
+            logger.error(f"Error in update_trending command: {str(e)}", exc_info=True)
+            return
+
+        history = result['history']
+        if result['refresh_status'] == 'skipped':
+            self.stdout.write(self.style.WARNING("  Another sync is running, ranking without refreshing"))
+        self.stdout.write(
+            f"  {result['refreshed']} stories refreshed ({result['refresh_failed']} failed), "
+            f"{len(history['downsampled'])} history partitions downsampled, {len(history['dropped'])} dropped"
+        )
+        for entry in TrendingStory.objects.all()[:options['top']]:
+            self.stdout.write(
+                f"  #{entry.rank} item {entry.item_id}: +{entry.score_gain} points "
+                f"({entry.score_velocity:.1f}/h), +{entry.descendants_gain} comments"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Ranked {result['ranked']} trending stories"))
+
+    def list_partitions(self):
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                self.stdout.write(self.style.WARNING("The score history table is not partitioned"))
+                return
+            for name, day, downsampled in list_partitions(cursor):
+                cursor.execute(f'SELECT count(*), pg_total_relation_size(%s) FROM "{name}"', [name])
+                rows, size = cursor.fetchone()
+                kind = 'hourly' if downsampled else 'raw'
+                self.stdout.write(f"  {name}  {day}  {kind:6}  {rows} snapshots  {size // 1024} kB")
@@ -0,0 +1,100 @@
+"""
+Prometheus metrics for syncing and the API.
+
+Metrics are module-level prometheus_client objects, updated in place by the
+code they measure. When the app runs under several gunicorn workers, set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by them (see
+gunicorn.conf.py): every process then writes its samples to memory-mapped
+files there and /metrics aggregates them, whichever worker serves it.
+"""
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+
+# Latency buckets (seconds) for calls to the HN API and for API requests
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Duration buckets (seconds) for whole sync runs
+RUN_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+HN_FETCH_SECONDS = Histogram(
+    'hn_fetch_duration_seconds', 'Latency of Hacker News API calls',
+    ['endpoint'], buckets=LATENCY_BUCKETS,
+)
+HN_FETCH_ERRORS = Counter(
+    'hn_fetch_errors_total', 'Failed Hacker News API calls, by HTTP status or exception',
+    ['endpoint', 'reason'],
+)
+SYNC_ITEMS = Counter(
+    'hn_sync_items_total', 'Items processed by syncs, written to the database or skipped',
+    ['outcome'],
+)
+SYNC_LAG = Gauge(
+    'hn_sync_lag_items', 'Items between the last synced ID and HN maxitem after the latest sync',
+    multiprocess_mode='mostrecent',
+)
+SYNC_JOBS = Counter(
+    'hn_sync_jobs_total', 'Sync jobs by kind, trigger and final status',
+    ['kind', 'source', 'status'],
+)
+SYNC_JOB_SECONDS = Histogram(
+    'hn_sync_job_duration_seconds', 'Duration of sync jobs',
+    ['kind', 'source'], buckets=RUN_BUCKETS,
+)
+SCHEDULER_RUN_SECONDS = Histogram(
+    'hn_scheduler_run_duration_seconds', 'Duration of scheduled sync runs, including skipped ones',
+    ['status'], buckets=RUN_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'API request latency by route',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS,
+)
+DB_CONNECTIONS_OPENED = Counter(
+    'db_connections_opened_total', 'New database connections, from requests and background threads',
+    ['alias'],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Connections of the background thread pool, idle or lent out',
+    ['alias', 'state'], multiprocess_mode='livesum',
+)
+DB_POOL_CHECKOUTS = Counter(
+    'db_pool_checkouts_total', 'Connections lent to background threads, reusing an open one or not',
+    ['alias', 'result'],
+)
+DB_POOL_DISCARDED = Counter(
+    'db_pool_discarded_total', 'Pooled connections closed before reuse, past CONN_MAX_AGE or unusable',
+    ['alias', 'reason'],
+)
+DB_REPLICA_LAG = Gauge(
+    'db_replica_lag_seconds', 'Replication lag of each read replica at its last check, +Inf if unreachable',
+    ['alias'], multiprocess_mode='mostrecent',
+)
+DB_READ_REQUESTS = Counter(
+    'db_read_requests_total', 'Read-only API requests by the database serving their item reads',
+    ['alias'],
+)
+FACET_CACHE_REQUESTS = Counter(
+    'facet_cache_requests_total', 'Facet counts and domain stats served from the cache or computed',
+    ['kind', 'result'],
+)
+SCORE_SNAPSHOTS = Counter(
+    'hn_score_snapshots_total', 'Score history snapshots recorded for stories whose score or descendants changed',
+)
+TRENDING_RUN_SECONDS = Histogram(
+    'hn_trending_run_duration_seconds', 'Duration of trending runs, including the refresh of recent stories',
+    buckets=RUN_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total', 'Log records dropped because the logging queue was full',
+)
+
+
+def render():
+    """Return (body, content type) of the metrics exposition for this deployment"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:47
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0002_alter_item_by_alter_item_created_locally_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='The public identifier of the sync job.', unique=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', help_text='The current state of the job.', max_length=10)),
+                ('count', models.IntegerField(default=100, help_text='The number of latest items requested.')),
+                ('total', models.IntegerField(default=0, help_text='The number of items the job has to process.')),
+                ('done', models.IntegerField(default=0, help_text='The number of items processed so far.')),
+                ('result', models.JSONField(blank=True, help_text='The sync statistics, once the job has finished.', null=True)),
+                ('error', models.TextField(blank=True, help_text='The error message if the job failed.', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='The timestamp when the job was enqueued.')),
+                ('started_at', models.DateTimeField(blank=True, help_text='The timestamp when a worker picked up the job.', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='The timestamp when the job finished.', null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
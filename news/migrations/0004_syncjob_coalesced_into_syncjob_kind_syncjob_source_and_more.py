@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0003_syncjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='coalesced_into',
+            field=models.ForeignKey(blank=True, help_text='The running job this one was merged into, for skipped or coalesced jobs.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coalesced_jobs', to='news.syncjob'),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('latest', 'Latest items'), ('since_last', 'Since last sync')], default='latest', help_text='Which sync the job runs: the latest items or everything since the last sync.', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='source',
+            field=models.CharField(choices=[('api', 'API'), ('scheduler', 'Scheduler'), ('command', 'Management command')], default='api', help_text='What triggered the job.', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='syncjob',
+            name='count',
+            field=models.IntegerField(default=100, help_text='The number of latest items requested, or the batch size for incremental syncs.'),
+        ),
+        migrations.AlterField(
+            model_name='syncjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('skipped', 'Skipped'), ('coalesced', 'Coalesced')], default='queued', help_text='The current state of the job.', max_length=10),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_syncjob_coalesced_into_syncjob_kind_syncjob_source_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='ingest_rate',
+            field=models.FloatField(blank=True, help_text='The rate at which new items appeared on Hacker News, in items per second.', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='lag',
+            field=models.IntegerField(blank=True, help_text="The number of items still behind Hacker News' maxitem after the job.", null=True),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='next_batch_size',
+            field=models.IntegerField(blank=True, help_text='For scheduled jobs, the batch size chosen for the next run.', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='next_interval',
+            field=models.IntegerField(blank=True, help_text='For scheduled jobs, the seconds until the next run chosen after this one.', null=True),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:31
+
+import re
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+TABLE = 'news_item'
+
+
+def rebuild_items_table(schema_editor, partitioned):
+    """
+    Recreate news_item, range-partitioned by item_id or as a plain table.
+
+    The rows are copied into a new table and the indexes and unique
+    constraints are recreated under their old names. Partitioned tables
+    cannot have identity columns before Postgres 17, so there id takes its
+    values from a sequence owned by the column instead.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        if (cursor.fetchone()[0] == 'p') == partitioned:
+            return
+
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'u'
+        """, [TABLE])
+        unique_constraints = cursor.fetchall()
+        cursor.execute("""
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = %s::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)
+        """, [TABLE])
+        indexes = [definition for definition, in cursor.fetchall()]
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0), COALESCE(MAX(item_id), 0) FROM "{TABLE}"')
+        max_id, max_item_id = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE}_old"')
+        if partitioned:
+            cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{TABLE}_old" INCLUDING DEFAULTS) PARTITION BY RANGE (item_id)')
+            size = getattr(settings, 'ITEM_PARTITION_SIZE', 1000000)
+            ahead = getattr(settings, 'ITEM_PARTITIONS_AHEAD', 2)
+            for lower in range(0, max_item_id + (ahead + 1) * size, size):
+                cursor.execute(
+                    f'CREATE TABLE "{TABLE}_p{lower}" PARTITION OF "{TABLE}" FOR VALUES FROM ({lower}) TO ({lower + size})'
+                )
+        else:
+            cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{TABLE}_old" INCLUDING DEFAULTS)')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{TABLE}_old"')
+        cursor.execute(f'DROP TABLE "{TABLE}_old" CASCADE')
+
+        if partitioned:
+            cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}".id')
+            cursor.execute(f"""ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval('"{TABLE}_id_seq"')""")
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, item_id)')
+        else:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id)')
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)", [TABLE, max(max_id, 1), max_id > 0])
+
+        for name, definition in unique_constraints:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        for definition in indexes:
+            cursor.execute(re.sub(r' ON (ONLY )?\S+ USING ', f' ON "{TABLE}" USING ', definition, count=1))
+
+
+def partition_items(apps, schema_editor):
+    rebuild_items_table(schema_editor, partitioned=True)
+
+
+def unpartition_items(apps, schema_editor):
+    rebuild_items_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_syncjob_ingest_rate_syncjob_lag_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='The parent of the comment, which can be another comment or the relevant story.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='news.item'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='poll',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='The poll associated with a poll option.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='poll_options', to='news.item'),
+        ),
+        migrations.RunPython(partition_items, unpartition_items),
+    ]
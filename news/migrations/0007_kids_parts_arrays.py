@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:37
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+# jsonb cannot be cast to integer[] directly, and ALTER COLUMN ... USING does
+# not allow subqueries, so the conversion goes through a temporary function
+TO_ARRAYS = """
+    CREATE FUNCTION pg_temp.news_jsonb_to_ints(value jsonb) RETURNS integer[]
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE WHEN jsonb_typeof(value) = 'array'
+            THEN ARRAY(SELECT element::integer FROM jsonb_array_elements_text(value) AS element)
+        END
+    $$;
+    ALTER TABLE news_item
+        ALTER COLUMN kids TYPE integer[] USING pg_temp.news_jsonb_to_ints(kids),
+        ALTER COLUMN parts TYPE integer[] USING pg_temp.news_jsonb_to_ints(parts);
+    DROP FUNCTION pg_temp.news_jsonb_to_ints(jsonb);
+"""
+
+TO_JSON = """
+    ALTER TABLE news_item
+        ALTER COLUMN kids TYPE jsonb USING to_jsonb(kids),
+        ALTER COLUMN parts TYPE jsonb USING to_jsonb(parts);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0006_partition_items'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(TO_ARRAYS, TO_JSON),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='item',
+                    name='kids',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, help_text="A list of IDs of the item's comments, in ranked display order.", null=True, size=None),
+                ),
+                migrations.AlterField(
+                    model_name='item',
+                    name='parts',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, help_text='A list of related poll options, in display order.', null=True, size=None),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['kids'], name='news_item_kids_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['parts'], name='news_item_parts_gin'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:41
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_kids_parts_arrays'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['time'], name='news_item_time_brin', pages_per_range=32),
+        ),
+    ]
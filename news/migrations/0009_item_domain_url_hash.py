@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0008_item_time_brin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='domain',
+            field=models.CharField(blank=True, editable=False, help_text="The domain of the URL, lowercased and without 'www.'.", max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='url_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-1 of the normalized URL, shared by reposts of the same link.', max_length=40, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['domain', 'time'], name='news_item_domain_time'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['url_hash'], name='news_item_url_hash'),
+        ),
+    ]
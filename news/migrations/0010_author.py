@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:51
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_item_domain_url_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(help_text="The user's unique username, as in Item.by.", max_length=255, unique=True)),
+                ('karma', models.IntegerField(blank=True, help_text="The user's karma on Hacker News.", null=True)),
+                ('created', models.DateTimeField(blank=True, help_text='Creation date of the user on Hacker News.', null=True)),
+                ('about', models.TextField(blank=True, help_text="The user's self-description. May contain HTML.", null=True)),
+                ('submitted', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, help_text="IDs of the user's stories, polls and comments on Hacker News, newest first.", size=None)),
+                ('stories', models.IntegerField(default=0, help_text="The number of the user's stories stored locally.")),
+                ('comments', models.IntegerField(default=0, help_text="The number of the user's comments stored locally.")),
+                ('total_score', models.IntegerField(default=0, help_text="The sum of the scores of the user's items stored locally.")),
+                ('last_item_at', models.DateTimeField(blank=True, help_text="Creation date of the user's newest item stored locally.", null=True)),
+                ('synced_at', models.DateTimeField(blank=True, help_text='The timestamp when the profile was last fetched from Hacker News.', null=True)),
+                ('counted_at', models.DateTimeField(blank=True, help_text='The timestamp when the counters were last updated.', null=True)),
+            ],
+            options={
+                'ordering': ['username'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['by', 'time'], name='news_item_by_time'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:59
+
+from django.db import migrations, models
+
+
+TABLE = 'news_scoresnapshot'
+
+
+def partition_snapshots(apps, schema_editor):
+    """
+    Recreate the empty news_scoresnapshot range-partitioned by day on at.
+
+    As for news_item, id takes its values from a sequence instead of an
+    identity, and the primary key includes the partition key. Partitions
+    are created as snapshots are written; see news/history.py.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE}_old"')
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{TABLE}_old" INCLUDING DEFAULTS) PARTITION BY RANGE (at)')
+        cursor.execute(f'DROP TABLE "{TABLE}_old"')
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}".id')
+        cursor.execute(f"""ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval('"{TABLE}_id_seq"')""")
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, at)')
+        # The (item_id, at) index is created afterwards, with the migration's deferred SQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0010_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingStory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField(help_text='The item_id of the story.', unique=True)),
+                ('rank', models.IntegerField(help_text='Position in the ranking, starting at 1.')),
+                ('score_gain', models.IntegerField(help_text='Points gained over the trending window.')),
+                ('descendants_gain', models.IntegerField(help_text='Comments gained over the trending window.')),
+                ('score_velocity', models.FloatField(help_text='Points gained per hour.')),
+                ('descendants_velocity', models.FloatField(help_text='Comments gained per hour.')),
+                ('computed_at', models.DateTimeField(help_text='The timestamp when the ranking was computed.')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField(help_text='The item_id of the story.')),
+                ('at', models.DateTimeField(help_text='The timestamp when the values were synced.')),
+                ('score', models.IntegerField(help_text="The story's score.")),
+                ('descendants', models.IntegerField(blank=True, help_text="The story's total comment count.", null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_id', 'at'], name='news_snapshot_item_at')],
+            },
+        ),
+        # Dropping the table when the model is removed drops its partitions
+        migrations.RunPython(partition_snapshots, migrations.RunPython.noop),
+    ]
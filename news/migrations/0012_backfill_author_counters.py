@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Counters are maintained as deltas from here on, so they must start from
+# the items already stored
+BACKFILL_SQL = """
+    INSERT INTO news_author (username, submitted, stories, comments, total_score, last_item_at, counted_at)
+    SELECT "by", '{}', count(*) FILTER (WHERE type = 'story'), count(*) FILTER (WHERE type = 'comment'),
+           COALESCE(sum(score), 0), max(time), now()
+    FROM news_item
+    WHERE "by" IS NOT NULL AND "by" <> ''
+    GROUP BY "by"
+    ON CONFLICT (username) DO UPDATE SET
+        stories = EXCLUDED.stories,
+        comments = EXCLUDED.comments,
+        total_score = EXCLUDED.total_score,
+        last_item_at = EXCLUDED.last_item_at,
+        counted_at = EXCLUDED.counted_at
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0011_score_history'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0012_backfill_author_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('latest', 'Latest items'), ('since_last', 'Since last sync'), ('refresh', 'Recent stories refresh')], default='latest', help_text='Which sync the job runs: the latest items, everything since the last sync or a refresh of recent stories.', max_length=10),
+        ),
+    ]
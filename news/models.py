@@ -1,5 +1,10 @@
-import logging
+import logging, uuid
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 from django.db import models
+from django.utils import timezone
+from .domains import url_fields
+from .partitions import cover
 
 logger = logging.getLogger(__name__)
 
@@ -42,11 +47,15 @@ class Item(models.Model):
         default=False,
         help_text="Indicates whether the item is marked as dead."
     )
+    # news_item is partitioned by item_id (see news/partitions.py), so its
+    # primary key is (id, item_id) in the database and id alone cannot be the
+    # target of a database-level foreign key; Django still cascades deletes
     parent = models.ForeignKey(
         'self',
         null=True,
         blank=True,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='children',
         help_text="The parent of the comment, which can be another comment or the relevant story."
     )
@@ -55,10 +64,15 @@ class Item(models.Model):
         null=True,
         blank=True,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='poll_options',
         help_text="The poll associated with a poll option."
     )
-    kids = models.JSONField(
+    # kids and parts are integer arrays with GIN indexes, so reverse lookups
+    # (the parent listing a comment, the poll listing an option) use
+    # kids__contains=[item_id] as an index scan
+    kids = ArrayField(
+        models.IntegerField(),
         default=list,
         blank=True,
         null=True,
@@ -70,6 +84,20 @@ class Item(models.Model):
         blank=True,
         help_text="The URL of the story."
     )
+    domain = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="The domain of the URL, lowercased and without 'www.'."
+    )
+    url_hash = models.CharField(
+        max_length=40,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="SHA-1 of the normalized URL, shared by reposts of the same link."
+    )
     score = models.IntegerField(
         default=0,
         help_text="The story's score or the number of votes for a poll option."
@@ -80,7 +108,8 @@ class Item(models.Model):
         blank=True,
         help_text="The title of the story, poll, or job. May contain HTML."
     )
-    parts = models.JSONField(
+    parts = ArrayField(
+        models.IntegerField(),
         default=list,
         blank=True,
         null=True,
@@ -103,13 +132,308 @@ class Item(models.Model):
     def __str__(self):
         return f"{self.type}: {self.title or self.text or self.item_id}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The values as loaded, for comparing with them on save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
     def save(self, *args, **kwargs):
         is_new = self.pk is None
-        super().save(*args, **kwargs)
         if is_new:
-            logger.info(f"Created new item: {self.type} (ID: {self.item_id})")
-        else:
-            logger.info(f"Updated item: {self.type} (ID: {self.item_id})")
+            cover(self.item_id)
+        self.domain, self.url_hash = url_fields(self.url)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'url' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'domain', 'url_hash'}
+        super().save(*args, **kwargs)
+        logger.debug("%s item: %s (ID: %s)", 'Created new' if is_new else 'Updated', self.type, self.item_id)
     
     class Meta:
-        ordering = ['-time']
\ No newline at end of file
+        ordering = ['-time']
+        indexes = [
+            GinIndex(fields=['kids'], name='news_item_kids_gin'),
+            GinIndex(fields=['parts'], name='news_item_parts_gin'),
+            # Items are written roughly in time order, so a BRIN index of
+            # block ranges serves time windows at a fraction of a B-tree's size
+            BrinIndex(fields=['time'], name='news_item_time_brin', pages_per_range=32, autosummarize=True),
+            # Stories of a domain, newest first
+            models.Index(fields=['domain', 'time'], name='news_item_domain_time'),
+            models.Index(fields=['url_hash'], name='news_item_url_hash'),
+            # An author's items, newest first, and the author counters
+            models.Index(fields=['by', 'time'], name='news_item_by_time'),
+        ]
+
+
+class Author(models.Model):
+    """
+    Model mirroring a Hacker News user, with counters over their stored items
+    """
+    username = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="The user's unique username, as in Item.by."
+    )
+    karma = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="The user's karma on Hacker News."
+    )
+    created = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Creation date of the user on Hacker News."
+    )
+    about = models.TextField(
+        null=True,
+        blank=True,
+        help_text="The user's self-description. May contain HTML."
+    )
+    submitted = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        help_text="IDs of the user's stories, polls and comments on Hacker News, newest first."
+    )
+    stories = models.IntegerField(
+        default=0,
+        help_text="The number of the user's stories stored locally."
+    )
+    comments = models.IntegerField(
+        default=0,
+        help_text="The number of the user's comments stored locally."
+    )
+    total_score = models.IntegerField(
+        default=0,
+        help_text="The sum of the scores of the user's items stored locally."
+    )
+    last_item_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Creation date of the user's newest item stored locally."
+    )
+    synced_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="The timestamp when the profile was last fetched from Hacker News."
+    )
+    counted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="The timestamp when the counters were last updated."
+    )
+
+    def __str__(self):
+        return f"author {self.username}"
+
+    class Meta:
+        ordering = ['username']
+
+
+class ScoreSnapshot(models.Model):
+    """
+    Model recording a story's score and descendants when a refresh changed them
+
+    The table is append-only and range-partitioned by day on `at`; see
+    news/history.py.
+    """
+    item_id = models.IntegerField(
+        help_text="The item_id of the story."
+    )
+    at = models.DateTimeField(
+        help_text="The timestamp when the values were synced."
+    )
+    score = models.IntegerField(
+        help_text="The story's score."
+    )
+    descendants = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="The story's total comment count."
+    )
+
+    def __str__(self):
+        return f"item {self.item_id} at {self.at}: {self.score}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item_id', 'at'], name='news_snapshot_item_at'),
+        ]
+
+
+class TrendingStory(models.Model):
+    """
+    Model holding the stories ranked by recent velocity, as of the last
+    trending run
+    """
+    item_id = models.IntegerField(
+        unique=True,
+        help_text="The item_id of the story."
+    )
+    rank = models.IntegerField(
+        help_text="Position in the ranking, starting at 1."
+    )
+    score_gain = models.IntegerField(
+        help_text="Points gained over the trending window."
+    )
+    descendants_gain = models.IntegerField(
+        help_text="Comments gained over the trending window."
+    )
+    score_velocity = models.FloatField(
+        help_text="Points gained per hour."
+    )
+    descendants_velocity = models.FloatField(
+        help_text="Comments gained per hour."
+    )
+    computed_at = models.DateTimeField(
+        help_text="The timestamp when the ranking was computed."
+    )
+
+    def __str__(self):
+        return f"#{self.rank} item {self.item_id}"
+
+    class Meta:
+        ordering = ['rank']
+
+
+class SyncJob(models.Model):
+    """
+    Model tracking a sync with Hacker News that runs in the background
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+        ('coalesced', 'Coalesced'),
+    )
+    KIND_CHOICES = (
+        ('latest', 'Latest items'),
+        ('since_last', 'Since last sync'),
+        ('refresh', 'Recent stories refresh'),
+    )
+    SOURCE_CHOICES = (
+        ('api', 'API'),
+        ('scheduler', 'Scheduler'),
+        ('command', 'Management command'),
+    )
+
+    job_id = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text="The public identifier of the sync job."
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+        default='latest',
+        help_text="Which sync the job runs: the latest items, everything since the last sync or a refresh of recent stories."
+    )
+    source = models.CharField(
+        max_length=10,
+        choices=SOURCE_CHOICES,
+        default='api',
+        help_text="What triggered the job."
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        help_text="The current state of the job."
+    )
+    coalesced_into = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='coalesced_jobs',
+        help_text="The running job this one was merged into, for skipped or coalesced jobs."
+    )
+    count = models.IntegerField(
+        default=100,
+        help_text="The number of latest items requested, or the batch size for incremental syncs."
+    )
+    total = models.IntegerField(
+        default=0,
+        help_text="The number of items the job has to process."
+    )
+    done = models.IntegerField(
+        default=0,
+        help_text="The number of items processed so far."
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="The sync statistics, once the job has finished."
+    )
+    lag = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="The number of items still behind Hacker News' maxitem after the job."
+    )
+    ingest_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="The rate at which new items appeared on Hacker News, in items per second."
+    )
+    next_interval = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="For scheduled jobs, the seconds until the next run chosen after this one."
+    )
+    next_batch_size = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="For scheduled jobs, the batch size chosen for the next run."
+    )
+    error = models.TextField(
+        null=True,
+        blank=True,
+        help_text="The error message if the job failed."
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="The timestamp when the job was enqueued."
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="The timestamp when a worker picked up the job."
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="The timestamp when the job finished."
+    )
+
+    def __str__(self):
+        return f"sync job {self.job_id} ({self.status})"
+
+    @property
+    def elapsed_time(self):
+        """Seconds spent running so far, or in total once finished"""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def rate(self):
+        """Items processed per second"""
+        elapsed = self.elapsed_time
+        if not elapsed:
+            return 0.0
+        return self.done / elapsed
+
+    @property
+    def eta(self):
+        """Estimated seconds until the job completes, if it can be estimated"""
+        if self.status != 'running' or not self.rate:
+            return None
+        return max(self.total - self.done, 0) / self.rate
+
+    class Meta:
+        ordering = ['-created_at']
@@ -0,0 +1,135 @@
+"""
+Range partitions of the items table.
+
+news_item is partitioned by item_id into ranges of ITEM_PARTITION_SIZE IDs
+(see migration 0006), named after their lower bound: news_item_p0,
+news_item_p1000000, ... There is no default partition, so the partition for
+an ID must exist before the item is written. ensure_partitions() creates
+the missing ones up to an ID plus ITEM_PARTITIONS_AHEAD spare ones; syncs
+call it with HN's maxitem, and every write path goes through cover(), which
+only looks at the catalog once an ID is beyond what this process knows to
+be covered.
+
+The primary key of a partitioned table must include the partition key, so
+it is (id, item_id), and parent/poll cannot be database foreign keys to id.
+dangling_links() finds the links nothing enforces.
+"""
+import logging, re, threading
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'news_item'
+
+# Partition bounds as printed by pg_get_expr(relpartbound)
+BOUND_RE = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+_covered = {}
+_covered_lock = threading.Lock()
+
+
+def partition_name(lower):
+    return f'{TABLE}_p{lower}'
+
+
+def list_partitions(cursor):
+    """(name, lower, upper) of every partition of the items table, by lower bound"""
+    cursor.execute("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = %s::regclass
+    """, [TABLE])
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = BOUND_RE.search(bound)
+        if match:
+            partitions.append((name, int(match.group(1)), int(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def create_partitions(cursor, start, up_to, size):
+    """Create partitions of size IDs from start until one contains up_to. Returns their names."""
+    created = []
+    lower = start
+    while lower <= up_to:
+        name = partition_name(lower)
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM ({lower}) TO ({lower + size})'
+        )
+        created.append(name)
+        lower += size
+    return created
+
+
+def ensure_partitions(up_to, using=DEFAULT_DB_ALIAS):
+    """
+    Create the partitions needed for item IDs up to up_to, plus the spare ones.
+
+    Returns the names of the partitions created, and an empty list if the
+    items table is not partitioned.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+
+    size = getattr(settings, 'ITEM_PARTITION_SIZE', 1000000)
+    target = up_to + getattr(settings, 'ITEM_PARTITIONS_AHEAD', 2) * size
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        # Serialize with other processes extending the table
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('news_item_partitions'))")
+        partitions = list_partitions(cursor)
+        start = partitions[-1][2] if partitions else 0
+        created = create_partitions(cursor, start, target, size) if start <= target else []
+
+    if created:
+        logger.info(f"Created item partitions {', '.join(created)}")
+    return created
+
+
+def covered_up_to(using=DEFAULT_DB_ALIAS):
+    """Highest item ID that fits in an existing partition, None if the table is not partitioned"""
+    with connections[using].cursor() as cursor:
+        if not is_partitioned(cursor):
+            return None
+        partitions = list_partitions(cursor)
+    return partitions[-1][2] - 1 if partitions else -1
+
+
+def cover(item_id, using=DEFAULT_DB_ALIAS):
+    """Make sure item_id has a partition before it is written"""
+    if item_id is None or item_id <= _covered.get(using, -1):
+        return
+    with _covered_lock:
+        if item_id <= _covered.get(using, -1):
+            return
+        ensure_partitions(item_id, using=using)
+        upper = covered_up_to(using=using)
+        # An unpartitioned table covers every ID
+        _covered[using] = float('inf') if upper is None else upper
+
+
+def dangling_links(using=DEFAULT_DB_ALIAS):
+    """
+    Number of items whose parent or poll points at no stored item, by link
+    field. Scans the whole table, so it belongs in maintenance, not requests.
+    """
+    counts = {}
+    with connections[using].cursor() as cursor:
+        for field in ('parent', 'poll'):
+            cursor.execute(f"""
+                SELECT count(*) FROM {TABLE} AS child
+                WHERE child.{field}_id IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM {TABLE} AS target WHERE target.id = child.{field}_id)
+            """)
+            counts[field] = cursor.fetchone()[0]
+    return counts
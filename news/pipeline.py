@@ -0,0 +1,526 @@
+"""
+Staged ingestion pipeline for HN items.
+
+Syncing is split into three stages connected by bounded queues:
+
+    fetcher pool -> normalizer -> batched writer
+
+Fetchers download items over keep-alive sessions, the normalizer maps them
+onto Item fields, and a single writer upserts them in batches and resolves
+parent/poll links set-wise. A slow database therefore only stalls fetching
+once the queues in front of the writer are full, and vice versa.
+"""
+import logging, queue, threading, time, weakref
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .db import uses_pooled_connection
+from .domains import url_fields
+from .facets import bump_generation
+from .history import record_snapshots
+from .locks import lock_ids
+from .metrics import SYNC_ITEMS
+from .models import Item
+from .partitions import cover
+
+logger = logging.getLogger(__name__)
+
+# Fields refreshed when an item already exists
+UPDATE_FIELDS = [
+    'type', 'by', 'time', 'text', 'dead', 'kids', 'url', 'domain', 'url_hash', 'score', 'title', 'parts',
+    'descendants', 'synced_at',
+]
+
+# HN fields that reference another item, resolved after writing
+LINK_FIELDS = ('parent', 'poll')
+
+# Seconds the writer waits for more items before flushing a partial batch
+WRITE_FLUSH_INTERVAL = 0.2
+
+# Queue marker telling a stage to exit
+_SHUTDOWN = object()
+
+
+def normalize_item(item_id, data):
+    """
+    Map an HN API item onto an unsaved Item.
+
+    Returns (item, links) where links maps 'parent'/'poll' to the referenced
+    HN item ID.
+    """
+    time_value = data.get('time', 0)
+    if time_value:
+        time_dt = timezone.datetime.fromtimestamp(time_value, tz=timezone.get_current_timezone())
+    else:
+        time_dt = timezone.now()
+        logger.warning(f"No time value for item {item_id}, using current time")
+
+    domain, url_hash = url_fields(data.get('url'))
+    item = Item(
+        item_id=item_id,
+        type=data.get('type', 'story'),
+        by=data.get('by'),
+        time=time_dt,
+        text=data.get('text'),
+        dead=data.get('dead', False),
+        kids=data.get('kids', []),
+        url=data.get('url'),
+        domain=domain,
+        url_hash=url_hash,
+        score=data.get('score', 0),
+        title=data.get('title'),
+        parts=data.get('parts', []),
+        descendants=data.get('descendants', 0),
+    )
+    links = {field: data[field] for field in LINK_FIELDS if data.get(field)}
+    return item, links
+
+
+def stored_items(items):
+    """The stored rows of these items that exist, by item_id, with the fields compared on write"""
+    return Item.objects.only('item_id', 'by', 'type', 'time', 'score', 'descendants').in_bulk(
+        [item.item_id for item in items], field_name='item_id'
+    )
+
+
+def write_items(items):
+    """
+    Insert or update items in one statement, the last occurrence of an ID
+    winning, recording score history snapshots of the stories that changed
+    and the changes of their authors' counters.
+
+    The items are locked for the transaction before their stored rows are
+    read, so concurrent writers of the same item (the pipeline and a
+    read-through, say) compare with each other's rows instead of both
+    counting it as new.
+    """
+    unique = list({item.item_id: item for item in items}.values())
+    if unique:
+        cover(max(item.item_id for item in unique))
+    # Imported here, as news.authors depends on the services using this module
+    from .authors import apply_deltas, counter_deltas
+    with transaction.atomic():
+        lock_ids('item', [item.item_id for item in unique])
+        stored = stored_items(unique)
+        Item.objects.bulk_create(
+            unique,
+            update_conflicts=True,
+            unique_fields=['item_id'],
+            update_fields=UPDATE_FIELDS,
+        )
+        record_snapshots(unique, stored)
+        apply_deltas(counter_deltas(unique, stored.values()))
+    SYNC_ITEMS.labels('written').inc(len(unique))
+    bump_generation()
+    logger.debug("Wrote %d items to the database", len(unique))
+    return len(unique)
+
+
+def link_items(links):
+    """
+    Set parent/poll foreign keys for already written items.
+
+    links is a list of (item_id, field, target_item_id). Returns the links
+    whose target is not in the database yet.
+    """
+    if not links:
+        return []
+
+    item_ids = {item_id for item_id, _, _ in links} | {target for _, _, target in links}
+    pks = dict(Item.objects.filter(item_id__in=item_ids).values_list('item_id', 'pk'))
+
+    unresolved = []
+    updates = {field: {} for field in LINK_FIELDS}
+    for item_id, field, target in links:
+        if item_id not in pks:
+            continue
+        if target not in pks:
+            unresolved.append((item_id, field, target))
+            continue
+        updates[field][item_id] = pks[target]
+
+    table = Item._meta.db_table
+    with connection.cursor() as cursor:
+        for field, targets in updates.items():
+            if not targets:
+                continue
+            # Matched on item_id rather than the primary key, so only the
+            # partitions holding the children are scanned
+            values = ', '.join(['(%s, %s)'] * len(targets))
+            cursor.execute(f"""
+                UPDATE {table} AS child SET {field}_id = link.target_id
+                FROM (VALUES {values}) AS link (item_id, target_id)
+                WHERE child.item_id = link.item_id AND child.item_id = ANY(%s)
+            """, [value for pair in targets.items() for value in pair] + [list(targets)])
+            logger.debug("Linked %d items to their %s", len(targets), field)
+    if any(updates.values()):
+        bump_generation()
+    return unresolved
+
+
+class StageMetrics:
+    """Throughput and queue depth counters for one pipeline stage"""
+
+    def __init__(self, name, inbox):
+        self.name = name
+        self.inbox = inbox
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    def sample_queue(self):
+        depth = self.inbox.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self._depth_total += depth
+            self._samples += 1
+
+    def record(self, started, processed=1, failed=0):
+        with self._lock:
+            self.busy_time += time.time() - started
+            self.processed += processed
+            self.failed += failed
+
+    def as_dict(self, elapsed):
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'failed': self.failed,
+                'per_sec': self.processed / elapsed if elapsed else 0.0,
+                'busy_time': self.busy_time,
+                'queue_depth': self.inbox.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'avg_queue_depth': self._depth_total / self._samples if self._samples else 0.0,
+            }
+
+
+class IngestPipeline:
+    """
+    Fetches, normalizes and writes HN items on background threads.
+
+    Submitted IDs are the pipeline's roots: progress and the synced/failed
+    counts refer to them. Items pulled in along the way (missing parents, the
+    options of polls and, with expand_kids, the comments of submitted
+    stories) are synced too but only show up in the stage metrics. submit()
+    blocks while queue_size roots are in flight, which keeps memory bounded
+    however many IDs are fed in.
+
+    Use it as a context manager: leaving the block drains the pipeline, and
+    stop() (or stop_all() from a signal handler) makes the drain finish the
+    items already fetched without fetching the rest.
+    """
+    _active = weakref.WeakSet()
+
+    def __init__(self, fetch, progress=None, expand_kids=False, follow_links=True,
+                 concurrency=None, queue_size=None, batch_size=None):
+        self.fetch = fetch
+        self.progress = progress
+        self.expand_kids = expand_kids
+        self.follow_links = follow_links
+        self.concurrency = concurrency or getattr(settings, 'SYNC_FETCH_CONCURRENCY', 8)
+        self.queue_size = queue_size or getattr(settings, 'SYNC_QUEUE_SIZE', 200)
+        self.batch_size = batch_size or getattr(settings, 'SYNC_WRITE_BATCH_SIZE', 100)
+
+        # Fetch requests come from the caller and from later stages, so that
+        # queue is unbounded; submit() applies the backpressure instead
+        self.fetch_queue = queue.Queue()
+        self.normalize_queue = queue.Queue(maxsize=self.queue_size)
+        self.write_queue = queue.Queue(maxsize=self.queue_size)
+        self.metrics = {
+            'fetch': StageMetrics('fetch', self.fetch_queue),
+            'normalize': StageMetrics('normalize', self.normalize_queue),
+            'write': StageMetrics('write', self.write_queue),
+        }
+
+        self.synced_count = 0
+        self.failed_count = 0
+        self.dropped_count = 0
+        self._roots = set()
+        self._slotted = set()
+        self._status = {}
+        self._pending = 0
+        self._waiting_links = {}
+        self._slots = threading.Semaphore(self.queue_size)
+        self._state_lock = threading.Condition()
+        self._progress_lock = threading.Lock()
+        self._reported = 0
+        self._stopping = threading.Event()
+        self._threads = []
+        self._start_time = None
+        self._end_time = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.stop()
+        self.drain()
+
+    @classmethod
+    def stop_all(cls):
+        """Stop every running pipeline in this process, e.g. on shutdown"""
+        for pipeline in list(cls._active):
+            pipeline.stop()
+
+    def start(self):
+        self._start_time = time.time()
+        for index in range(self.concurrency):
+            self._spawn(self._fetch_loop, f'ingest-fetch-{index}')
+        self._spawn(self._normalize_loop, 'ingest-normalize')
+        self._spawn(self._write_loop, 'ingest-write')
+        IngestPipeline._active.add(self)
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, item_id):
+        """Queue a root item, blocking while the pipeline is full. Returns False once stopped."""
+        self._slots.acquire()
+        if self._stopping.is_set():
+            self._slots.release()
+            return False
+
+        with self._state_lock:
+            self._roots.add(item_id)
+            status = self._status.get(item_id)
+            if status is None:
+                self._slotted.add(item_id)
+            elif status != 'pending':
+                self._count_root(item_id, status == 'ok')
+        self._report_progress()
+        if status is None:
+            self._request(item_id)
+        else:
+            # Already pulled in as another item's parent or comment
+            self._slots.release()
+        return True
+
+    def stop(self):
+        """Stop fetching; items fetched already are still written by drain()"""
+        if not self._stopping.is_set():
+            logger.info("Stopping ingest pipeline, dropping items not fetched yet")
+            self._stopping.set()
+
+    def drain(self):
+        """Wait for every queued item to be written, then shut the stages down"""
+        with self._state_lock:
+            while self._pending:
+                self._state_lock.wait()
+
+        fetchers = self._threads[:self.concurrency]
+        for _ in fetchers:
+            self.fetch_queue.put(_SHUTDOWN)
+        for thread in fetchers:
+            thread.join()
+        self.normalize_queue.put(_SHUTDOWN)
+        self._threads[-2].join()
+        self.write_queue.put(_SHUTDOWN)
+        self._threads[-1].join()
+        IngestPipeline._active.discard(self)
+        self._end_time = time.time()
+
+        stats = self.stats()
+        logger.info("Ingest pipeline drained: %s", stats, extra={'pipeline': stats})
+        return stats
+
+    def stats(self):
+        if not self._start_time:
+            return {'elapsed_time': 0.0, 'dropped': 0, 'stages': {}}
+        elapsed = (self._end_time or time.time()) - self._start_time
+        return {
+            'elapsed_time': elapsed,
+            'dropped': self.dropped_count,
+            'stages': {name: metrics.as_dict(elapsed) for name, metrics in self.metrics.items()},
+        }
+
+    def _request(self, item_id):
+        """Queue an item for fetching unless it was requested before"""
+        with self._state_lock:
+            if item_id in self._status:
+                return
+            self._status[item_id] = 'pending'
+            self._pending += 1
+        self.fetch_queue.put(item_id)
+
+    def _finish(self, item_ids, ok):
+        if not ok:
+            SYNC_ITEMS.labels('skipped').inc(len(item_ids))
+        with self._state_lock:
+            for item_id in item_ids:
+                self._status[item_id] = 'ok' if ok else 'failed'
+                if item_id in self._roots:
+                    self._count_root(item_id, ok)
+                if item_id in self._slotted:
+                    self._slotted.discard(item_id)
+                    self._slots.release()
+                if not ok:
+                    self._waiting_links.pop(item_id, None)
+            self._pending -= len(item_ids)
+            self._state_lock.notify_all()
+        self._report_progress()
+
+    def _count_root(self, item_id, ok):
+        # Called with _state_lock held
+        if ok:
+            self.synced_count += 1
+        else:
+            self.failed_count += 1
+
+    def _report_progress(self):
+        # Called without _state_lock, as callbacks may write to the database.
+        # One thread reports at a time and the others move on; the reporter
+        # checks again once done, so the last count is always reported.
+        if not self.progress:
+            return
+        while self._progress_lock.acquire(blocking=False):
+            try:
+                done = self.synced_count + self.failed_count
+                if done != self._reported:
+                    self._reported = done
+                    self.progress(done)
+            except Exception as e:
+                logger.error(f"Error reporting sync progress: {str(e)}", exc_info=True)
+            finally:
+                self._progress_lock.release()
+            if self.synced_count + self.failed_count == self._reported:
+                break
+
+    def _fetch_loop(self):
+        metrics = self.metrics['fetch']
+        session = requests.Session()
+        try:
+            while True:
+                item_id = self.fetch_queue.get()
+                if item_id is _SHUTDOWN:
+                    break
+                if self._stopping.is_set():
+                    with self._state_lock:
+                        self.dropped_count += 1
+                    self._finish([item_id], ok=False)
+                    continue
+
+                metrics.sample_queue()
+                started = time.time()
+                try:
+                    data = self.fetch(item_id, session=session)
+                except Exception as e:
+                    logger.error(f"Error fetching item {item_id}: {str(e)}", exc_info=True)
+                    metrics.record(started, failed=1)
+                    self._finish([item_id], ok=False)
+                    continue
+                metrics.record(started, failed=0 if data else 1)
+                if not data:
+                    logger.warning("No data returned for item %s, skipping sync", item_id)
+                    self._finish([item_id], ok=False)
+                    continue
+                self.normalize_queue.put((item_id, data))
+        finally:
+            session.close()
+            connection.close()
+
+    def _normalize_loop(self):
+        metrics = self.metrics['normalize']
+        while True:
+            entry = self.normalize_queue.get()
+            if entry is _SHUTDOWN:
+                break
+
+            metrics.sample_queue()
+            started = time.time()
+            item_id, data = entry
+            try:
+                item, links = normalize_item(item_id, data)
+            except Exception as e:
+                logger.error(f"Error normalizing item {item_id}: {str(e)}", exc_info=True)
+                metrics.record(started, failed=1)
+                self._finish([item_id], ok=False)
+                continue
+
+            if self.expand_kids and item_id in self._roots and item.type == 'story' and item.kids:
+                logger.debug("Queueing %d comments for story %s", len(item.kids), item_id)
+                for kid_id in item.kids:
+                    self._request(kid_id)
+            # Fetch a poll's options alongside it rather than waiting for
+            # each option to be synced on its own
+            if self.follow_links and item.type == 'poll' and item.parts:
+                logger.debug("Queueing %d options for poll %s", len(item.parts), item_id)
+                for part_id in item.parts:
+                    self._request(part_id)
+            metrics.record(started)
+            self.write_queue.put((item, links))
+
+    @uses_pooled_connection
+    def _write_loop(self):
+        metrics = self.metrics['write']
+        while True:
+            batch = []
+            shutdown = False
+            try:
+                while len(batch) < self.batch_size:
+                    entry = self.write_queue.get(timeout=WRITE_FLUSH_INTERVAL if batch else None)
+                    if entry is _SHUTDOWN:
+                        shutdown = True
+                        break
+                    metrics.sample_queue()
+                    batch.append(entry)
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._write_batch(batch, metrics)
+            if shutdown:
+                break
+
+    def _write_batch(self, batch, metrics):
+        started = time.time()
+        item_ids = [item.item_id for item, _ in batch]
+        try:
+            write_items([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(batch)} items: {str(e)}", exc_info=True)
+            metrics.record(started, processed=0, failed=len(batch))
+            self._finish(item_ids, ok=False)
+            return
+
+        try:
+            self._link(batch, set(item_ids))
+        except Exception as e:
+            logger.error(f"Error linking batch of {len(batch)} items: {str(e)}", exc_info=True)
+        metrics.record(started, processed=len(batch))
+        self._finish(item_ids, ok=True)
+        duration_ms = (time.time() - started) * 1000
+        logger.info(
+            "Wrote batch of %d items in %.1f ms", len(batch), duration_ms,
+            extra={'batch_size': len(batch), 'duration_ms': round(duration_ms, 1)},
+        )
+
+    def _link(self, batch, written):
+        links = [
+            (item.item_id, field, target)
+            for item, item_links in batch
+            for field, target in item_links.items()
+        ]
+        # Retry links that were waiting for one of the items just written
+        with self._state_lock:
+            for item_id in written:
+                links.extend(self._waiting_links.pop(item_id, []))
+
+        for item_id, field, target in link_items(links):
+            with self._state_lock:
+                status = self._status.get(target)
+                if status == 'failed' or (status is None and not self.follow_links):
+                    logger.debug("Cannot link item %s to %s %s", item_id, field, target)
+                    continue
+                self._waiting_links.setdefault(target, []).append((item_id, field, target))
+            if status is None:
+                logger.debug("%s %s of item %s not in database, queueing it", field.capitalize(), target, item_id)
+                self._request(target)
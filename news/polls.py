@@ -0,0 +1,51 @@
+import logging
+from django.db.models.expressions import RawSQL
+from .models import Item
+from .serializers import ItemSerializer
+
+logger = logging.getLogger(__name__)
+
+# The poll's item_id followed by its parts, so the poll and its options come
+# back from one query: an index lookup of the poll, then one of each option
+POLL_AND_PARTS_SQL = f"SELECT unnest(array_prepend(item_id, parts)) FROM {Item._meta.db_table} WHERE item_id = %s"
+
+
+def load_poll(item_id, using=None):
+    """
+    Load a poll and its options with a single query, from the using
+    database or the one the router picks.
+
+    Returns (poll, options, missing): options in the poll's display order
+    and the IDs of options not in the database. poll is None if there is no
+    item with that ID.
+    """
+    items = {
+        item.item_id: item
+        for item in Item.objects.db_manager(using).filter(item_id__in=RawSQL(POLL_AND_PARTS_SQL, [item_id]))
+    }
+    poll = items.get(item_id)
+    if poll is None:
+        return None, [], []
+    parts = poll.parts or []
+    options = [items[part] for part in parts if part in items]
+    missing = [part for part in parts if part not in items]
+    return poll, options, missing
+
+
+def serialize_poll(poll, options, missing):
+    """The poll with its options, their votes and share of the total votes"""
+    total = sum(max(option.score, 0) for option in options)
+    data = ItemSerializer(poll).data
+    data['total_votes'] = total
+    data['options'] = [
+        {
+            'item_id': option.item_id,
+            'text': option.text,
+            'votes': option.score,
+            'share': round(max(option.score, 0) / total, 4) if total else 0.0,
+        }
+        for option in options
+    ]
+    data['missing'] = missing
+    logger.debug("Serialized poll %s with %d options (%d missing)", poll.item_id, len(options), len(missing))
+    return data
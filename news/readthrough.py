@@ -0,0 +1,133 @@
+import hashlib, logging, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from .db import uses_pooled_connection
+from .models import Item
+from .routers import unpinned
+from .services import HackerNewsAPI
+
+logger = logging.getLogger(__name__)
+
+# Marker returned by HackerNewsAPI.get_item when HN reports an item as null
+NOT_FOUND = object()
+
+# Seconds to trust a cached maxitem when checking whether an ID is plausible
+MAX_ITEM_TTL = 60
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            logger.debug(f"Joining in-flight fetch for {key}")
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+_flight = SingleFlight()
+
+
+def negative_cache_key(item_id):
+    return f"news:hn-null:{item_id}"
+
+
+def user_negative_cache_key(username):
+    # Usernames may hold characters some cache backends reject in keys
+    return f"news:hn-null-user:{hashlib.sha1(username.encode()).hexdigest()}"
+
+
+def cache_not_found(key):
+    """Remember that HN reported something as null for READ_THROUGH_NEGATIVE_TTL seconds"""
+    cache.set(key, True, getattr(settings, 'READ_THROUGH_NEGATIVE_TTL', 600))
+
+
+def get_max_item_id():
+    """HN's maxitem, cached briefly"""
+    max_id = cache.get('news:hn-maxitem')
+    if max_id is None:
+        max_id = HackerNewsAPI.get_max_item_id()
+        if max_id:
+            cache.set('news:hn-maxitem', max_id, MAX_ITEM_TTL)
+    return max_id
+
+
+def is_plausible_item_id(item_id):
+    """Whether item_id could be an existing HN item"""
+    if item_id <= 0:
+        return False
+    max_id = get_max_item_id()
+    return bool(max_id) and item_id <= max_id
+
+
+def fetch_item(item_id):
+    """
+    Fetch, store and return an item that is missing from the database.
+
+    Concurrent requests for the same ID share one upstream fetch, and IDs that
+    HN reports as null are remembered for READ_THROUGH_NEGATIVE_TTL seconds.
+    Storing the item does not pin the client's reads to the primary, so
+    callers re-reading it should read from the primary explicitly. Returns
+    None if the item does not exist or could not be fetched.
+    """
+    if cache.get(negative_cache_key(item_id)):
+        logger.debug(f"Item {item_id} is negatively cached, not fetching")
+        return None
+    if not is_plausible_item_id(item_id):
+        logger.debug(f"Item {item_id} is beyond HN's maxitem, not fetching")
+        return None
+    with unpinned():
+        return _flight.do(item_id, lambda: _fetch_and_store(item_id))
+
+
+def fetch_items(item_ids):
+    """fetch_item for several IDs concurrently, returning a dict of ID to Item or None"""
+    # Pool threads are discarded after the batch, so they borrow pooled connections
+    @uses_pooled_connection
+    def fetch_one(item_id):
+        return fetch_item(item_id)
+
+    item_ids = list(item_ids)
+    max_workers = getattr(settings, 'HN_FETCH_CONCURRENCY', 8)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hn-read-through') as pool:
+        return dict(zip(item_ids, pool.map(fetch_one, item_ids)))
+
+
+def _fetch_and_store(item_id):
+    # A previous flight may have stored the item since the caller's lookup
+    item = Item.objects.filter(item_id=item_id).first()
+    if item:
+        return item
+
+    logger.info(f"Read-through fetch of item {item_id} from HN")
+    data = HackerNewsAPI.get_item(item_id, not_found=NOT_FOUND)
+    if data is NOT_FOUND:
+        cache_not_found(negative_cache_key(item_id))
+        return None
+    if data is None:
+        return None
+    return HackerNewsAPI.sync_item(item_id, data=data)
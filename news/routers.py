@@ -0,0 +1,195 @@
+"""
+Read replica routing.
+
+When DB_REPLICAS lists read replicas, API requests that only read (GET,
+HEAD, OPTIONS) have their item queries served by one of them; everything
+else (writes, sync jobs, the scheduler, management commands and sync job
+state) uses the primary. ReplicaRoutingMiddleware decides per request:
+
+- a request that writes keeps its remaining queries on the primary, and its
+  client reads from the primary for the next REPLICA_MAX_LAG seconds (through
+  a cookie), so clients see their own creates and updates;
+- replicas more than REPLICA_MAX_LAG seconds behind, or unreachable, are
+  skipped until their next check, every REPLICA_CHECK_INTERVAL seconds;
+- all reads of one request go to the same database, so a page and its count
+  agree.
+"""
+import contextlib, contextvars, logging, random, threading, time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from .metrics import DB_REPLICA_LAG, DB_READ_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Models whose reads may be served by a replica. Sync job state is read right
+# after background threads update it, so it stays on the primary.
+REPLICA_MODELS = {'news.item', 'news.author', 'news.trendingstory'}
+
+# Cookie pinning a client that just wrote to the primary
+PIN_COOKIE = 'db_primary_pin'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds a replica's last replayed transaction is behind; 0 when it has
+# replayed everything it received (also when idle), or is not a standby at all
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_routing = contextvars.ContextVar('news_db_routing', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class RequestRouting:
+    """Where the reads of one request go"""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+        self.alias = None
+
+
+class ReplicaMonitor:
+    """Lag of every replica, checked at most every REPLICA_CHECK_INTERVAL seconds"""
+
+    def __init__(self):
+        self._lag = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def usable_replicas(self):
+        """Replicas reachable and within REPLICA_MAX_LAG at the last check"""
+        interval = getattr(settings, 'REPLICA_CHECK_INTERVAL', 5)
+        due = self._checked_at is None or time.monotonic() - self._checked_at >= interval
+        # One thread checks; the others use the previous results meanwhile
+        if due and self._lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 10)
+        return [alias for alias, lag in self._lag.items() if lag is not None and lag <= max_lag]
+
+    def check(self):
+        lags = {}
+        for alias in replica_aliases():
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute(LAG_SQL)
+                    lags[alias] = float(cursor.fetchone()[0])
+            except Exception as e:
+                logger.warning(f"Replica {alias} is unreachable, reading from the primary: {str(e)}")
+                connections[alias].close()
+                lags[alias] = None
+            DB_REPLICA_LAG.labels(alias).set(float('inf') if lags[alias] is None else lags[alias])
+        self._lag = lags
+        self._checked_at = time.monotonic()
+        return lags
+
+
+monitor = ReplicaMonitor()
+
+
+@contextlib.contextmanager
+def unpinned():
+    """
+    Writes in this block do not pin the client to the primary: for copies of
+    upstream data a read stores on the way, which the client did not write.
+    Reads after them in the block still go to the primary.
+    """
+    state = _routing.get()
+    wrote = state.wrote if state is not None else None
+    try:
+        yield
+    finally:
+        if state is not None:
+            state.wrote = wrote
+
+
+class ReplicaRouter:
+    """Send item reads of read-only API requests to a replica and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        if model._meta.label_lower not in REPLICA_MODELS:
+            return None
+        if state.alias is None:
+            replicas = monitor.usable_replicas()
+            state.alias = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+            DB_READ_REQUESTS.labels(state.alias).inc()
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let read-only requests read from replicas, keeping clients that wrote on the primary.
+
+    Not used unless DB_REPLICAS is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+            self.finish(state, response)
+            return response
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+            self.finish(state, response)
+            return response
+        finally:
+            _routing.reset(token)
+
+    def start(self, request):
+        pinned = PIN_COOKIE in request.COOKIES
+        return RequestRouting(use_replica=request.method in SAFE_METHODS and not pinned)
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_MAX_LAG', 10), httponly=True, samesite='Lax',
+            )
@@ -1,45 +1,238 @@
-import logging
+import logging, threading, time
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from django.conf import settings
 from django_apscheduler.jobstores import DjangoJobStore
-from .services import HackerNewsAPI
+from .db import uses_pooled_connection
+from .jobs import SyncJobRunner
+from .locks import AdvisoryLock
+from .metrics import SCHEDULER_RUN_SECONDS
+from .models import SyncJob
+from .trending import update_trending
 
 logger = logging.getLogger(__name__)
 
+SYNC_JOB_ID = 'sync_hackernews_data'
+TRENDING_JOB_ID = 'update_trending'
+
+# The scheduler running in this process, if it is the leader
+_scheduler = None
+
+
+class AdaptiveSyncPolicy:
+    """
+    Chooses the interval and batch size of the next scheduled sync.
+
+    The batch size is sized to cover the items Hacker News is expected to
+    publish before the next run, plus whatever lag is left over. While behind
+    maxitem the interval is halved, once caught up it is stretched again, and
+    when Firebase errors rise both the interval and the batch size back off.
+    Everything is clamped to the SYNC_INTERVAL_* and SYNC_BATCH_* settings.
+    """
+
+    def __init__(self):
+        self.min_interval = getattr(settings, 'SYNC_INTERVAL_MIN', 30)
+        self.max_interval = getattr(settings, 'SYNC_INTERVAL_MAX', 900)
+        self.default_interval = getattr(settings, 'SYNC_INTERVAL_DEFAULT', 300)
+        self.min_batch = getattr(settings, 'SYNC_BATCH_MIN', 100)
+        self.max_batch = getattr(settings, 'SYNC_BATCH_MAX', 2000)
+        self.error_backoff_rate = getattr(settings, 'SYNC_ERROR_BACKOFF_RATE', 0.2)
+
+    def current(self, last=None):
+        """Return the (interval, batch size) chosen after the last scheduled run"""
+        last = last or self._last_scheduled_run()
+        if last:
+            return last.next_interval, last.next_batch_size
+        return self.default_interval, self.min_batch
+
+    def update(self, job):
+        """Choose the next interval and batch size from a finished job and record them"""
+        # The finished job has no next_interval yet, so this is the run before it
+        previous = self._last_scheduled_run()
+        interval, batch_size = self.current(previous)
+        result = job.result or {}
+
+        ingest_rate = None
+        if previous and previous.result and 'current_max' in previous.result and 'current_max' in result:
+            seconds = (job.finished_at - previous.finished_at).total_seconds()
+            if seconds > 0:
+                ingest_rate = max(result['current_max'] - previous.result['current_max'], 0) / seconds
+
+        attempted = result.get('synced_count', 0) + result.get('failed_count', 0)
+        error_rate = result.get('failed_count', 0) / attempted if attempted else 0.0
+        if job.status == 'failed':
+            error_rate = 1.0
+
+        if error_rate > self.error_backoff_rate:
+            interval = interval * 2
+            batch_size = batch_size // 2
+        elif job.lag is not None:
+            interval = interval / 2 if job.lag > 0 else interval * 1.5
+            expected = (ingest_rate or 0) * interval
+            batch_size = int(expected * 1.2) + job.lag
+
+        # Never schedule runs closer together than a run takes
+        interval = max(interval, job.elapsed_time)
+        interval = int(min(max(interval, self.min_interval), self.max_interval))
+        batch_size = int(min(max(batch_size, self.min_batch), self.max_batch))
+
+        SyncJob.objects.filter(pk=job.pk).update(
+            ingest_rate=ingest_rate,
+            next_interval=interval,
+            next_batch_size=batch_size
+        )
+        logger.info(
+            f"Adaptive sync: lag={job.lag} ingest_rate={ingest_rate} error_rate={error_rate:.2f}, "
+            f"next run in {interval}s with batch size {batch_size}"
+        )
+        return interval, batch_size
+
+    @staticmethod
+    def _last_scheduled_run():
+        return SyncJob.objects.filter(
+            source='scheduler',
+            next_interval__isnull=False,
+            next_batch_size__isnull=False
+        ).order_by('-finished_at').first()
+
+
+@uses_pooled_connection
 def sync_hackernews_job():
     """Job to sync data from Hacker News API"""
     logger.info(f"Running scheduled HackerNews sync job at {datetime.now()}")
+    start_time = time.monotonic()
+    status = 'error'
     try:
-        result = HackerNewsAPI.sync_since_last()
-        logger.info(f"Scheduled sync complete: {result}")
+        policy = AdaptiveSyncPolicy()
+        _, batch_size = policy.current()
+        job = SyncJobRunner.run_now('since_last', 'scheduler', count=batch_size)
+        status = job.status
+        if job.status == 'skipped':
+            logger.warning("Skipped scheduled sync, another sync is still running")
+            return
+        logger.info(f"Scheduled sync complete: {job.result}")
+
+        interval, _ = policy.update(job)
+        if _scheduler is not None:
+            _scheduler.reschedule_job(SYNC_JOB_ID, jobstore='default', trigger='interval', seconds=interval)
     except Exception as e:
         logger.error(f"Error in scheduled sync job: {str(e)}", exc_info=True)
+    finally:
+        SCHEDULER_RUN_SECONDS.labels(status).observe(time.monotonic() - start_time)
 
-def start():
-    print("start function called for scheduler")
-    """Start the APScheduler and perform an initial sync"""
+
+@uses_pooled_connection
+def update_trending_job():
+    """Job to refresh recent stories and recompute the trending ranking"""
+    # A job left in the job store after TRENDING_INTERVAL was set to 0
+    if not getattr(settings, 'TRENDING_INTERVAL', 600):
+        return
+    try:
+        result = update_trending('scheduler')
+        logger.info(f"Trending run complete: {result}")
+    except Exception as e:
+        logger.error(f"Error in trending job: {str(e)}", exc_info=True)
+
+
+def create_scheduler():
+    """Create an APScheduler with the sync and trending jobs registered"""
     scheduler = BackgroundScheduler()
     scheduler.add_jobstore(DjangoJobStore(), "default")
-    print("scheduler created")
-    
-    # # Perform an initial sync before starting the scheduler
-    # logger.info("Performing initial sync...")
-    # try:
-    #     result = HackerNewsAPI.sync_since_last()
-    #     logger.info(f"Initial sync complete: {result}")
-    # except Exception as e:
-    #     logger.error(f"Error during initial sync: {str(e)}", exc_info=True)
-    
-    # Schedule the sync job to run every 5 minutes
+
+    # Schedule the sync job, resuming the interval chosen by the last run
+    interval, _ = AdaptiveSyncPolicy().current()
     scheduler.add_job(
         sync_hackernews_job,
         'interval',
-        minutes=5,
-        name='sync_hackernews_data',
+        seconds=interval,
+        name=SYNC_JOB_ID,
         jobstore='default',
         replace_existing=True,
-        id='sync_hackernews_data'
+        id=SYNC_JOB_ID,
+        max_instances=1,
+        coalesce=True
     )
-    
-    logger.info("Starting APScheduler...")
-    scheduler.start()
\ No newline at end of file
+
+    trending_interval = getattr(settings, 'TRENDING_INTERVAL', 600)
+    if trending_interval:
+        scheduler.add_job(
+            update_trending_job,
+            'interval',
+            seconds=trending_interval,
+            name=TRENDING_JOB_ID,
+            jobstore='default',
+            replace_existing=True,
+            id=TRENDING_JOB_ID,
+            max_instances=1,
+            coalesce=True
+        )
+    return scheduler
+
+
+class SchedulerLeader(threading.Thread):
+    """
+    Runs the scheduler in exactly one process across the deployment.
+
+    Every process that wants to run scheduled jobs starts one of these. It
+    competes for a Postgres advisory lock; the holder starts APScheduler and
+    keeps checking that its lock connection is alive, while the others retry
+    periodically so that one of them takes over if the leader goes away.
+    """
+
+    def __init__(self, retry_interval=None):
+        super().__init__(name='scheduler-leader', daemon=True)
+        if retry_interval is None:
+            retry_interval = getattr(settings, 'SCHEDULER_LEADER_RETRY', 30)
+        self.retry_interval = retry_interval
+        self.lock = AdvisoryLock('scheduler')
+        self.scheduler = None
+        self._stopping = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self.scheduler is not None
+
+    def run(self):
+        global _scheduler
+        while not self._stopping.is_set():
+            try:
+                if self.is_leader:
+                    if not self.lock.is_alive():
+                        logger.warning("Lost scheduler leadership, stopping APScheduler")
+                        self._stop_scheduler()
+                elif self.lock.acquire():
+                    logger.info("Elected scheduler leader, starting APScheduler")
+                    self.scheduler = create_scheduler()
+                    self.scheduler.start()
+                    _scheduler = self.scheduler
+                else:
+                    logger.debug("Another process is the scheduler leader, standing by")
+            except Exception as e:
+                logger.error(f"Error in scheduler leader election: {str(e)}", exc_info=True)
+                self._stop_scheduler()
+            self._stopping.wait(self.retry_interval)
+
+        self._stop_scheduler()
+
+    def stop(self):
+        """Stop scheduling and hand leadership to another process"""
+        self._stopping.set()
+        self.join()
+
+    def _stop_scheduler(self):
+        global _scheduler
+        _scheduler = None
+        if self.scheduler is not None:
+            try:
+                self.scheduler.shutdown(wait=False)
+            except Exception as e:
+                logger.warning(f"Error shutting down APScheduler: {str(e)}")
+            self.scheduler = None
+        self.lock.release()
+
+
+def start():
+    """Start competing for scheduler leadership in a background thread"""
+    leader = SchedulerLeader()
+    leader.start()
+    return leader
@@ -1,17 +1,18 @@
 from rest_framework import serializers
 from django.db.models import Max
-from .models import Item
+from .instrumentation import TimedSerializerMixin
+from .models import Author, Item, SyncJob
 import logging, uuid
 
 logger = logging.getLogger(__name__)
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for comment display (without nested comments)"""
     class Meta:
         model = Item
         exclude = ['parent', 'poll', 'kids', 'parts']
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Main serializer for Item model"""
     class Meta:
         model = Item
@@ -41,7 +42,7 @@ class ItemSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
     
 
-class ItemDetailSerializer(serializers.ModelSerializer):
+class ItemDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Detailed serializer with comments"""
     comments = serializers.SerializerMethodField()
     
@@ -50,11 +51,30 @@ class ItemDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
     
     def get_comments(self, obj):
-        """Get top-level comments for this item"""
+        """Get top-level comments for this item, unless the view already loaded them"""
+        if 'comments' in self.context:
+            return CommentSerializer(self.context['comments'], many=True).data
         if obj.kids:
             logger.debug(f"Fetching {len(obj.kids)} comments for item {obj.item_id}")
             comments = Item.objects.filter(item_id__in=obj.kids).order_by('-score')
             serialized = CommentSerializer(comments, many=True).data
             logger.debug(f"Retrieved {len(serialized)} comments for item {obj.item_id}")
             return serialized
-        return []
\ No newline at end of file
+        return []
+
+class SyncJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer reporting the progress of a background sync job"""
+    elapsed_time = serializers.FloatField(read_only=True)
+    rate = serializers.FloatField(read_only=True)
+    eta = serializers.FloatField(read_only=True, allow_null=True)
+    coalesced_into = serializers.SlugRelatedField(slug_field='job_id', read_only=True)
+    
+    class Meta:
+        model = SyncJob
+        exclude = ['id']
+
+class AuthorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for an author's profile and activity counters"""
+    class Meta:
+        model = Author
+        exclude = ['id']
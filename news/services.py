@@ -1,32 +1,146 @@
-import requests, logging, time
+import datetime, requests, logging, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from django.conf import settings
 from django.utils import timezone
+from .metrics import HN_FETCH_ERRORS, HN_FETCH_SECONDS, SYNC_ITEMS
 from .models import Item
+from .partitions import cover
+from .pipeline import IngestPipeline, link_items, normalize_item, write_items
 
 logger = logging.getLogger(__name__)
 
 class HackerNewsAPI:
     """Service class for interacting with the Hacker News API"""
-    BASE_URL = "https://hacker-news.firebaseio.com/v0"
+    BASE_URL = getattr(settings, 'HN_API_BASE_URL', "https://hacker-news.firebaseio.com/v0")
     
     @staticmethod
-    def get_item(item_id):
-        """Fetch an item from the Hacker News API"""
+    def _get(endpoint, url, session=None):
+        """GET url, recording its latency and any failure under endpoint"""
+        start_time = time.perf_counter()
+        try:
+            response = (session or requests).get(url, timeout=10)
+        except requests.exceptions.RequestException as e:
+            HN_FETCH_ERRORS.labels(endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            HN_FETCH_SECONDS.labels(endpoint).observe(time.perf_counter() - start_time)
+        if response.status_code != 200:
+            HN_FETCH_ERRORS.labels(endpoint, str(response.status_code)).inc()
+        return response
+    
+    @staticmethod
+    def get_item(item_id, not_found=None, session=None):
+        """
+        Fetch an item from the Hacker News API
+
+        Returns None on errors, and not_found if HN answers that the item
+        does not exist (a JSON null), so callers can tell the two apart.
+        Pass a requests session to reuse its connections.
+        """
         url = f"{HackerNewsAPI.BASE_URL}/item/{item_id}.json"
-        logger.debug(f"Fetching item {item_id} from HN API: {url}")
+        logger.debug("Fetching item %s from HN API: %s", item_id, url)
         
         try:
-            response = requests.get(url, timeout=10)
+            response = HackerNewsAPI._get('item', url, session=session)
             if response.status_code == 200:
                 data = response.json()
-                logger.debug(f"Successfully retrieved item {item_id}")
+                if data is None:
+                    logger.debug("Item %s does not exist on HN", item_id)
+                    return not_found
+                logger.debug("Successfully retrieved item %s", item_id)
                 return data
             else:
-                logger.warning(f"Failed to fetch item {item_id}: HTTP {response.status_code}")
+                logger.warning("Failed to fetch item %s: HTTP %s", item_id, response.status_code)
                 return None
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching item {item_id}: {str(e)}")
+            logger.error("Error fetching item %s: %s", item_id, e)
             return None
     
+    @staticmethod
+    def fetch_concurrently(fetch, keys):
+        """
+        Call fetch(key, session=...) for every key, HN_FETCH_CONCURRENCY at a time
+
+        Each thread reuses its own keep-alive session. Returns a dict of key
+        to result, leaving out keys whose result is falsy.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        local = threading.local()
+        sessions = []
+
+        def call(key):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                sessions.append(local.session)
+            return fetch(key, session=local.session)
+
+        max_workers = min(getattr(settings, 'HN_FETCH_CONCURRENCY', 8), len(keys))
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hn-fetch') as pool:
+                results = dict(zip(keys, pool.map(call, keys)))
+        finally:
+            for session in sessions:
+                session.close()
+        return {key: result for key, result in results.items() if result}
+    
+    @staticmethod
+    def get_items(item_ids):
+        """Fetch several items concurrently, returning a dict of item ID to data for those fetched"""
+        return HackerNewsAPI.fetch_concurrently(HackerNewsAPI.get_item, item_ids)
+    
+    @staticmethod
+    def get_user(username, not_found=None, session=None):
+        """
+        Fetch a user's profile from the Hacker News API
+
+        Returns None on errors and not_found if the user does not exist, as
+        get_item does.
+        """
+        url = f"{HackerNewsAPI.BASE_URL}/user/{quote(username, safe='')}.json"
+        logger.debug("Fetching user %s from HN API: %s", username, url)
+        
+        try:
+            response = HackerNewsAPI._get('user', url, session=session)
+            if response.status_code == 200:
+                data = response.json()
+                if data is None:
+                    logger.debug("User %s does not exist on HN", username)
+                    return not_found
+                return data
+            else:
+                logger.warning("Failed to fetch user %s: HTTP %s", username, response.status_code)
+                return None
+        except requests.exceptions.RequestException as e:
+            logger.error("Error fetching user %s: %s", username, e)
+            return None
+    
+    @staticmethod
+    def sync_poll_options(poll_item_id, part_ids):
+        """
+        Sync the options of a poll that are not in the database yet
+
+        The options are fetched concurrently, written in one batch and
+        linked to the poll, which must already be in the database. Returns
+        the number of options synced.
+        """
+        existing = set(Item.objects.filter(item_id__in=part_ids).values_list('item_id', flat=True))
+        missing = [part_id for part_id in part_ids if part_id not in existing]
+        if not missing:
+            return 0
+        
+        logger.debug("Fetching %d options of poll %s", len(missing), poll_item_id)
+        fetched = HackerNewsAPI.get_items(missing)
+        if len(fetched) < len(missing):
+            SYNC_ITEMS.labels('skipped').inc(len(missing) - len(fetched))
+        options = [normalize_item(part_id, data)[0] for part_id, data in fetched.items()]
+        if options:
+            write_items(options)
+            link_items([(option.item_id, 'poll', poll_item_id) for option in options])
+        return len(options)
+    
     @staticmethod
     def get_max_item_id():
         """Get the max item ID from HN"""
@@ -34,7 +148,7 @@ class HackerNewsAPI:
         logger.debug(f"Fetching max item ID from HN API: {url}")
         
         try:
-            response = requests.get(url, timeout=10)
+            response = HackerNewsAPI._get('maxitem', url)
             if response.status_code == 200:
                 max_id = response.json()
                 logger.info(f"Current max item ID on HN: {max_id}")
@@ -53,7 +167,7 @@ class HackerNewsAPI:
         logger.debug(f"Fetching newest stories from HN API: {url}")
         
         try:
-            response = requests.get(url, timeout=10)
+            response = HackerNewsAPI._get('newstories', url)
             if response.status_code == 200:
                 item_ids = response.json()[:count]
                 logger.info(f"Retrieved {len(item_ids)} newest story IDs")
@@ -66,139 +180,135 @@ class HackerNewsAPI:
             return []
     
     @staticmethod
-    def sync_item(item_id):
-        """Sync a single item to the database"""
+    def sync_item(item_id, data=None):
+        """
+        Sync a single item to the database, using data if it was already fetched
+
+        Runs the pipeline's normalize and write stages inline, syncing a
+        missing parent or poll first. The options of a poll are fetched
+        concurrently and written along with it.
+        """
         start_time = time.time()
-        logger.debug(f"Starting sync for item {item_id}")
+        logger.debug("Starting sync for item %s", item_id)
         
         # Get the item data from HN API
-        data = HackerNewsAPI.get_item(item_id)
+        if data is None:
+            data = HackerNewsAPI.get_item(item_id)
         if not data:
-            logger.warning(f"No data returned for item {item_id}, skipping sync")
+            logger.warning("No data returned for item %s, skipping sync", item_id)
+            SYNC_ITEMS.labels('skipped').inc()
             return None
         
         try:
-            # Convert time to datetime
-            time_value = data.get('time', 0)
-            if time_value:
-                time_dt = timezone.datetime.fromtimestamp(time_value, tz=timezone.get_current_timezone())
-            else:
-                time_dt = timezone.now()
-                logger.warning(f"No time value for item {item_id}, using current time")
+            item, links = normalize_item(item_id, data)
+            write_items([item])
             
-            # Create or update the item
-            item, created = Item.objects.update_or_create(
-                item_id=item_id,
-                defaults={
-                    'type': data.get('type', 'story'),
-                    'by': data.get('by'),
-                    'time': time_dt,
-                    'text': data.get('text'),
-                    'dead': data.get('dead', False),
-                    'kids': data.get('kids', []),
-                    'url': data.get('url'),
-                    'score': data.get('score', 0),
-                    'title': data.get('title'),
-                    'parts': data.get('parts', []),
-                    'descendants': data.get('descendants', 0),
-                }
-            )
-            
-            if created:
-                logger.info(f"Created new item in database: {item.type} (ID: {item.item_id})")
-            else:
-                logger.info(f"Updated existing item in database: {item.type} (ID: {item.item_id})")
+            # Resolve parent and poll relationships, syncing missing targets
+            unresolved = link_items([(item_id, field, target) for field, target in links.items()])
+            for _, field, target in unresolved:
+                logger.debug("%s %s not in database, syncing it first", field.capitalize(), target)
+                if HackerNewsAPI.sync_item(target):
+                    link_items([(item_id, field, target)])
             
-            # Handle parent relationship if present
-            if 'parent' in data:
-                parent_id = data['parent']
-                logger.debug(f"Item {item_id} has parent {parent_id}, resolving relationship")
-                
-                parent_item = Item.objects.filter(item_id=parent_id).first()
-                if not parent_item:
-                    logger.debug(f"Parent {parent_id} not in database, syncing it first")
-                    parent_item = HackerNewsAPI.sync_item(parent_id)
-                
-                if parent_item:
-                    item.parent = parent_item
-                    item.save()
-                    logger.debug(f"Set parent relationship for item {item_id} -> {parent_id}")
-            
-            # Handle poll relationship if present
-            if 'poll' in data:
-                poll_id = data['poll']
-                logger.debug(f"Item {item_id} is related to poll {poll_id}, resolving relationship")
-                
-                poll_item = Item.objects.filter(item_id=poll_id).first()
-                if not poll_item:
-                    logger.debug(f"Poll {poll_id} not in database, syncing it first")
-                    poll_item = HackerNewsAPI.sync_item(poll_id)
-                
-                if poll_item:
-                    item.poll = poll_item
-                    item.save()
-                    logger.debug(f"Set poll relationship for item {item_id} -> {poll_id}")
+            if item.type == 'poll' and item.parts:
+                HackerNewsAPI.sync_poll_options(item_id, item.parts)
             
             # Log completion time
             elapsed = time.time() - start_time
-            logger.debug(f"Completed sync for item {item_id} in {elapsed:.2f} seconds")
+            logger.debug("Completed sync for item %s in %.2f seconds", item_id, elapsed)
             
-            return item
+            return Item.objects.get(item_id=item_id)
             
         except Exception as e:
             logger.error(f"Error syncing item {item_id}: {str(e)}", exc_info=True)
+            SYNC_ITEMS.labels('skipped').inc()
             return None
     
     @staticmethod
-    def sync_latest_items(count=100):
-        """Sync the latest items from HN"""
+    def sync_items(item_ids, progress=None, expand_kids=False):
+        """
+        Sync items through the ingest pipeline
+
+        progress is called as progress(done, total) as each of item_ids is
+        written or fails. With expand_kids, the comments of stories are
+        synced as well.
+        """
         start_time = time.time()
-        logger.info(f"Starting sync of latest {count} items")
+        total = len(item_ids)
         
-        item_ids = HackerNewsAPI.get_latest_items(count)
-        synced_count = 0
-        failed_count = 0
-        
-        for item_id in item_ids:
-            try:
-                item = HackerNewsAPI.sync_item(item_id)
-                if item:
-                    synced_count += 1
-                    
-                    # Sync children (comments) for stories
-                    if item.type == 'story' and item.kids:
-                        logger.debug(f"Syncing {len(item.kids)} comments for story {item_id}")
-                        comment_sync_count = 0
-                        for kid_id in item.kids:
-                            comment = HackerNewsAPI.sync_item(kid_id)
-                            if comment:
-                                comment_sync_count += 1
-                        logger.debug(f"Synced {comment_sync_count}/{len(item.kids)} comments for story {item_id}")
-                else:
-                    failed_count += 1
-            except Exception as e:
-                logger.error(f"Unexpected error syncing item {item_id}: {str(e)}", exc_info=True)
-                failed_count += 1
-
-        # Log completion stats
-        elapsed = time.time() - start_time
-        logger.info(f"Completed sync: {synced_count} items synced, {failed_count} failed in {elapsed:.2f} seconds")
+        if progress:
+            progress(0, total)
         
+        report = (lambda done: progress(done, total)) if progress else None
+        with IngestPipeline(HackerNewsAPI.get_item, progress=report, expand_kids=expand_kids) as pipeline:
+            for item_id in item_ids:
+                if not pipeline.submit(item_id):
+                    logger.warning(f"Sync stopped, {total - pipeline.synced_count - pipeline.failed_count} items not synced")
+                    break
+        
+        elapsed = time.time() - start_time
         return {
-            "synced_count": synced_count,
-            "failed_count": failed_count,
-            "elapsed_time": elapsed
+            "synced_count": pipeline.synced_count,
+            "failed_count": pipeline.failed_count,
+            "elapsed_time": elapsed,
+            "pipeline": pipeline.stats(),
         }
     
     @staticmethod
-    def sync_since_last(last_id=None):
-        """Sync up to 100 new items since the last sync"""
-        start_time = time.time()
+    def sync_latest_items(count=100, progress=None):
+        """
+        Sync the latest items from HN, with their comments
+
+        If given, progress is called as progress(done, total) after each
+        top-level item has been processed.
+        """
+        logger.info(f"Starting sync of latest {count} items")
+        
+        item_ids = HackerNewsAPI.get_latest_items(count)
+        result = HackerNewsAPI.sync_items(item_ids, progress=progress, expand_kids=True)
         
+        # Log completion stats
+        logger.info(
+            "Completed sync: %d items synced, %d failed in %.2f seconds",
+            result['synced_count'], result['failed_count'], result['elapsed_time'],
+            extra={'synced': result['synced_count'], 'failed': result['failed_count'], 'elapsed_time': result['elapsed_time']},
+        )
+        
+        return result
+    
+    @staticmethod
+    def sync_recent_stories(count=1000, progress=None):
+        """
+        Resync up to count stories and polls posted in the last
+        TRENDING_REFRESH_AGE seconds, newest first, which records score
+        history snapshots of those that moved
+
+        progress is called as in sync_latest_items.
+        """
+        age = getattr(settings, 'TRENDING_REFRESH_AGE', 86400)
+        since = timezone.now() - datetime.timedelta(seconds=age)
+        item_ids = list(
+            Item.objects.filter(type__in=('story', 'poll'), time__gte=since, created_locally=False, dead=False)
+            .order_by('-time')
+            .values_list('item_id', flat=True)[:count]
+        )
+        logger.info(f"Refreshing {len(item_ids)} recent stories")
+        return HackerNewsAPI.sync_items(item_ids, progress=progress)
+
+    @staticmethod
+    def sync_since_last(last_id=None, progress=None, batch_size=100):
+        """
+        Sync up to batch_size new items since the last sync
+
+        progress is called as in sync_latest_items. The result includes the
+        lag, the number of items still left to sync up to maxitem.
+        """
         current_max = HackerNewsAPI.get_max_item_id()
         if not current_max:
             logger.error("Failed to get max item ID, aborting sync")
             return {"error": "Failed to get max item ID"}
+        # Add partitions for new IDs ahead of the writes
+        cover(current_max)
             
         if not last_id:
             last_item = Item.objects.filter(created_locally=False).order_by('-item_id').first()
@@ -206,37 +316,27 @@ class HackerNewsAPI:
                 last_id = last_item.item_id
                 logger.info(f"Last synced item ID from database: {last_id}")
             else:
-                logger.info("No existing items in database, syncing latest 100")
-                return HackerNewsAPI.sync_latest_items(100)
+                logger.info(f"No existing items in database, syncing latest {batch_size}")
+                return HackerNewsAPI.sync_latest_items(batch_size, progress=progress)
         
         # Calculate the range of items to sync
         sync_start = last_id + 1
-        sync_end = min(current_max, last_id + 100)
+        sync_end = min(current_max, last_id + batch_size)
         sync_total = sync_end - sync_start + 1
         logger.info(f"Syncing items from {sync_start} to {sync_end} (total: {sync_total})")
         
-        synced_count = 0
-        failed_count = 0
-        
-        for item_id in range(sync_start, sync_end + 1):
-            try:
-                item = HackerNewsAPI.sync_item(item_id)
-                if item:
-                    synced_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                logger.error(f"Error syncing item {item_id}: {str(e)}", exc_info=True)
-                failed_count += 1
+        result = HackerNewsAPI.sync_items(range(sync_start, sync_end + 1), progress=progress)
         
         # Log completion stats
-        elapsed = time.time() - start_time
-        logger.info(f"Completed incremental sync: {synced_count} items synced, {failed_count} failed in {elapsed:.2f} seconds")
+        logger.info(
+            "Completed incremental sync: %d items synced, %d failed in %.2f seconds",
+            result['synced_count'], result['failed_count'], result['elapsed_time'],
+            extra={'synced': result['synced_count'], 'failed': result['failed_count'], 'elapsed_time': result['elapsed_time']},
+        )
         
         return {
             "last_id": sync_end,
             "current_max": current_max,
-            "synced_count": synced_count,
-            "failed_count": failed_count,
-            "elapsed_time": elapsed
+            "lag": current_max - sync_end,
+            **result,
         }
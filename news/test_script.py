@@ -299,13 +299,24 @@ def test_sync_endpoint():
     print(f"Triggering sync with count={sync_data['count']}...")
     response = requests.post(f"{BASE_URL}/sync/", json=sync_data, headers=HEADERS)
     
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+    assert response.status_code == 202, f"Expected status code 202, got {response.status_code}"
     sync_result = response.json()
     print(f"Sync result: {sync_result}")
+    assert "job_id" in sync_result, "Response should contain a job_id"
     
-    # Give a little time for the sync to complete
+    # Poll the job until the sync completes
     print("Waiting for sync to complete...")
-    time.sleep(2)
+    job_url = f"{BASE_URL}/sync/{sync_result['job_id']}/"
+    for _ in range(30):
+        response = requests.get(job_url, headers=HEADERS)
+        assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+        job = response.json()
+        print(f"Job {job['status']}: {job['done']}/{job['total']} items")
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(2)
+    
+    assert job["status"] == "succeeded", f"Expected sync job to succeed, got {job['status']}"
     
     # Check how many items after sync
     response = requests.get(f"{BASE_URL}/items/", headers=HEADERS)
@@ -1,3 +1,626 @@
-from django.test import TestCase
+import datetime, threading, time
+from unittest import mock
+from django.http import HttpResponse
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from .domains import normalize_domain, normalize_url, url_fields, url_hash
+from .facets import FACET_FIELDS, compute_facets, grouped_column, grouping_bitmask
+from .importer import STAGING_COLUMNS, copy_value, id_list, to_row
+from .jobs import SyncJobRunner
+from .models import Author, Item, SyncJob
+from .pipeline import IngestPipeline, normalize_item, stored_items, write_items
+from .readthrough import SingleFlight, fetch_item
+from .routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, RequestRouting, _routing, unpinned
+from .scheduler import AdaptiveSyncPolicy
 
-# Create your tests here.
+NOW = datetime.datetime(2025, 3, 23, 12, 0, 0)
+
+
+@override_settings(
+    SYNC_INTERVAL_MIN=30, SYNC_INTERVAL_MAX=900, SYNC_INTERVAL_DEFAULT=300,
+    SYNC_BATCH_MIN=100, SYNC_BATCH_MAX=2000, SYNC_ERROR_BACKOFF_RATE=0.2,
+)
+class AdaptiveSyncPolicyTests(SimpleTestCase):
+    """AdaptiveSyncPolicy.update, without the database"""
+
+    def previous_run(self, interval=100, batch_size=400, current_max=10000):
+        return SyncJob(
+            source='scheduler', status='succeeded', next_interval=interval, next_batch_size=batch_size,
+            result={'current_max': current_max}, finished_at=NOW - datetime.timedelta(seconds=60),
+        )
+
+    def finished_job(self, synced=100, failed=0, lag=0, current_max=10600, status='succeeded', seconds=5):
+        return SyncJob(
+            source='scheduler', status=status, lag=lag,
+            result={'synced_count': synced, 'failed_count': failed, 'current_max': current_max},
+            started_at=NOW - datetime.timedelta(seconds=seconds), finished_at=NOW,
+        )
+
+    def update(self, job, previous):
+        with mock.patch.object(AdaptiveSyncPolicy, '_last_scheduled_run', return_value=previous), \
+                mock.patch.object(SyncJob, 'objects') as objects:
+            result = AdaptiveSyncPolicy().update(job)
+        self.recorded = objects.filter.return_value.update.call_args.kwargs
+        return result
+
+    def test_errors_back_off(self):
+        interval, batch_size = self.update(self.finished_job(synced=50, failed=50, lag=500), self.previous_run())
+        self.assertEqual((interval, batch_size), (200, 200))
+
+    def test_failed_job_backs_off(self):
+        job = self.finished_job(status='failed')
+        job.result = None
+        self.assertEqual(self.update(job, self.previous_run()), (200, 200))
+
+    def test_errors_below_the_threshold_do_not_back_off(self):
+        interval, _ = self.update(self.finished_job(synced=90, failed=10, lag=100), self.previous_run())
+        self.assertEqual(interval, 50)
+
+    def test_lag_halves_the_interval_and_covers_ingest_plus_lag(self):
+        # 600 new items in 60 seconds: 10 per second, 500 expected in 50 seconds
+        interval, batch_size = self.update(self.finished_job(lag=100), self.previous_run())
+        self.assertEqual((interval, batch_size), (50, 700))
+        self.assertEqual(self.recorded, {'ingest_rate': 10.0, 'next_interval': 50, 'next_batch_size': 700})
+
+    def test_caught_up_stretches_the_interval(self):
+        interval, batch_size = self.update(self.finished_job(lag=0), self.previous_run())
+        self.assertEqual((interval, batch_size), (150, 1800))
+
+    def test_clamped_to_the_settings(self):
+        interval, batch_size = self.update(
+            self.finished_job(lag=0, current_max=40000), self.previous_run(interval=800, batch_size=1500)
+        )
+        self.assertEqual((interval, batch_size), (900, 2000))
+
+        interval, batch_size = self.update(
+            self.finished_job(lag=0, current_max=10000), self.previous_run(interval=40, batch_size=100)
+        )
+        self.assertEqual((interval, batch_size), (60, 100))
+
+        interval, _ = self.update(self.finished_job(lag=10), self.previous_run(interval=40))
+        self.assertEqual(interval, 30)
+
+    def test_interval_at_least_the_run_time(self):
+        interval, _ = self.update(self.finished_job(lag=100, seconds=500), self.previous_run())
+        self.assertEqual(interval, 500)
+
+    def test_first_run_starts_from_the_defaults(self):
+        interval, batch_size = self.update(self.finished_job(synced=10, failed=10), None)
+        self.assertEqual((interval, batch_size), (600, 100))
+        self.assertIsNone(self.recorded['ingest_rate'])
+
+
+class FacetDecodingTests(SimpleTestCase):
+    """Decoding the rows of the GROUPING SETS facet query"""
+
+    def test_grouped_column(self):
+        # Over type, dead, created_locally and by, as grouped_counts() groups them
+        self.assertEqual(len(FACET_FIELDS) + 1, 4)
+        self.assertIsNone(grouped_column(0b1111, 4))
+        self.assertEqual(grouped_column(0b0111, 4), 0)
+        self.assertEqual(grouped_column(0b1011, 4), 1)
+        self.assertEqual(grouped_column(0b1101, 4), 2)
+        self.assertEqual(grouped_column(0b1110, 4), 3)
+        self.assertEqual(grouped_column(0b10, 2), 1)
+
+    def test_grouping_bitmask(self):
+        self.assertEqual(grouping_bitmask(3, 4), 0b1110)
+        self.assertEqual(grouping_bitmask(0, 4), 0b0111)
+        for count in range(1, 7):
+            for index in range(count):
+                self.assertEqual(grouped_column(grouping_bitmask(index, count), count), index)
+
+    def grouped_facets(self, rows, top_authors=10):
+        with mock.patch('news.facets.connections') as connections:
+            cursor = connections.__getitem__.return_value.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = rows
+            facets = compute_facets(Item.objects.all(), top_authors)
+        self.sql, self.params = cursor.execute.call_args.args
+        return facets
+
+    def test_compute_facets_from_grouped_rows(self):
+        rows = [
+            (0b1111, None, None, None, None, 7),
+            (0b0111, 'story', None, None, None, 4),
+            (0b0111, 'comment', None, None, None, 3),
+            (0b1011, None, False, None, None, 6),
+            (0b1011, None, True, None, None, 1),
+            (0b1101, None, None, False, None, 7),
+            (0b1110, None, None, None, 'pg', 5),
+            (0b1110, None, None, None, 'dang', 2),
+        ]
+        facets = self.grouped_facets(rows)
+
+        self.assertEqual(facets, {
+            'count': 7,
+            'type': {'story': 4, 'comment': 3},
+            'dead': {'false': 6, 'true': 1},
+            'created_locally': {'false': 7},
+            'top_authors': [{'by': 'pg', 'count': 5}, {'by': 'dang', 'count': 2}],
+        })
+        self.assertIn('GROUPING SETS', self.sql)
+        self.assertIn('facet_set <> 14 ', self.sql)
+        self.assertEqual(self.params[-1], 10)
+
+    def test_compute_facets_with_another_facet_field(self):
+        # The top authors are told apart by a bitmask over one more column
+        rows = [
+            (0b11111, None, None, None, None, None, 3),
+            (0b01111, 'story', None, None, None, None, 3),
+            (0b11101, None, None, None, 'example.com', None, 2),
+            (0b11110, None, None, None, None, 'pg', 3),
+        ]
+        with mock.patch('news.facets.FACET_FIELDS', FACET_FIELDS + ['domain']):
+            facets = self.grouped_facets(rows, top_authors=5)
+
+        self.assertEqual(facets['count'], 3)
+        self.assertEqual(facets['type'], {'story': 3})
+        self.assertEqual(facets['domain'], {'example.com': 2})
+        self.assertEqual(facets['top_authors'], [{'by': 'pg', 'count': 3}])
+        self.assertIn('facet_set <> 30 ', self.sql)
+
+
+class UnnormalisableFilterTests(TestCase):
+    """Domain and URL filters that cannot match anything, or match no stored item"""
+
+    def test_facets_with_an_unnormalisable_domain(self):
+        response = self.client.get('/api/items/facets/', {'domain': 'http://'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_facets_with_an_unnormalisable_url(self):
+        response = self.client.get('/api/items/facets/', {'url': 'not a url'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['top_authors'], [])
+
+    def test_domains_with_an_unnormalisable_url(self):
+        for url in ('nope', 'not a url'):
+            response = self.client.get('/api/domains/', {'url': url})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'results': []})
+
+    def test_domain_with_an_unnormalisable_url(self):
+        for url in ('nope', 'not a url'):
+            response = self.client.get('/api/domains/example.com/', {'url': url})
+            self.assertEqual(response.status_code, 404)
+
+
+class ConcurrentWriteTests(TransactionTestCase):
+    """Author counters when two writers store the same item at once"""
+
+    def test_new_item_written_twice_is_counted_once(self):
+        data = {'id': 1, 'type': 'story', 'by': 'alice', 'time': 1742731200, 'score': 5, 'title': 'Hello'}
+        errors = []
+
+        def slow_read(items):
+            stored = stored_items(items)
+            # Unless the writers are serialised, both read before either writes
+            time.sleep(0.2)
+            return stored
+
+        def write():
+            try:
+                write_items([normalize_item(1, data)[0]])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with mock.patch('news.pipeline.stored_items', side_effect=slow_read):
+            writers = [threading.Thread(target=write) for _ in range(2)]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+
+        self.assertEqual(errors, [])
+        author = Author.objects.get(username='alice')
+        self.assertEqual((author.stories, author.comments, author.total_score), (1, 0, 5))
+
+
+class IngestPipelineTests(SimpleTestCase):
+    """IngestPipeline's stages, with a stubbed fetcher and writer"""
+
+    ITEMS = {
+        1: {'id': 1, 'type': 'story', 'by': 'pg', 'time': 1742731200, 'title': 'One'},
+        2: {'id': 2, 'type': 'comment', 'by': 'dang', 'time': 1742731200, 'parent': 99},
+        3: {'id': 3, 'type': 'comment', 'by': 'pg', 'time': 1742731200, 'parent': 1},
+        99: {'id': 99, 'type': 'story', 'by': 'dang', 'time': 1742731100, 'title': 'Parent'},
+    }
+
+    def setUp(self):
+        self.written = []
+        self.linked = []
+        for target, stub in [
+            ('news.pipeline.write_items', self.write),
+            ('news.pipeline.link_items', self.link),
+            ('news.db.pooled_connection', mock.MagicMock()),
+        ]:
+            patcher = mock.patch(target, stub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, items):
+        self.written.append([item.item_id for item in items])
+        return len(items)
+
+    def link(self, links):
+        # Links to items not written yet are unresolved
+        stored = {item_id for batch in self.written for item_id in batch}
+        self.linked.append(sorted(links))
+        return [link for link in links if link[2] not in stored]
+
+    def fetch(self, item_id, session=None):
+        return self.ITEMS.get(item_id)
+
+    def test_submit_blocks_while_the_queue_is_full(self):
+        release = threading.Event()
+        fetched = threading.Semaphore(0)
+        submitted = []
+
+        def fetch(item_id, session=None):
+            fetched.release()
+            release.wait(5)
+            return self.fetch(item_id)
+
+        def feed():
+            for item_id in (1, 3, 99):
+                pipeline.submit(item_id)
+                submitted.append(item_id)
+
+        with IngestPipeline(fetch, concurrency=2, queue_size=2, batch_size=1) as pipeline:
+            feeder = threading.Thread(target=feed)
+            feeder.start()
+            for _ in range(2):
+                self.assertTrue(fetched.acquire(timeout=5))
+            time.sleep(0.1)
+            self.assertEqual(submitted, [1, 3])
+            release.set()
+            feeder.join(5)
+            self.assertEqual(submitted, [1, 3, 99])
+
+        self.assertEqual(pipeline.synced_count, 3)
+        self.assertEqual(sorted(sum(self.written, [])), [1, 3, 99])
+
+    def test_fetcher_survives_exceptions(self):
+        def fetch(item_id, session=None):
+            if item_id == 3:
+                raise ConnectionError("Connection reset")
+            return self.fetch(item_id)
+
+        with self.assertLogs('news.pipeline', 'ERROR') as logs:
+            with IngestPipeline(fetch, concurrency=1, follow_links=False) as pipeline:
+                for item_id in (3, 1, 99):
+                    pipeline.submit(item_id)
+        stats = pipeline.stats()
+
+        self.assertIn("Error fetching item 3", logs.output[0])
+        self.assertEqual((pipeline.synced_count, pipeline.failed_count), (2, 1))
+        self.assertEqual(sorted(sum(self.written, [])), [1, 99])
+        self.assertEqual(stats['stages']['fetch']['failed'], 1)
+
+    def test_batched_writes_and_links(self):
+        with IngestPipeline(self.fetch, concurrency=1, batch_size=3) as pipeline:
+            for item_id in (1, 2, 3):
+                pipeline.submit(item_id)
+
+        # The missing parent of 2 is fetched and written in a batch of its
+        # own, after which the link waiting for it is retried
+        self.assertEqual(self.written, [[1, 2, 3], [99]])
+        self.assertEqual(self.linked, [[(2, 'parent', 99), (3, 'parent', 1)], [(2, 'parent', 99)]])
+        self.assertEqual((pipeline.synced_count, pipeline.failed_count), (3, 0))
+
+
+class SyncJobRunnerTests(TestCase):
+    """Coalescing and skipping syncs, with the advisory lock stubbed"""
+
+    def setUp(self):
+        patcher = mock.patch('news.jobs.AdvisoryLock')
+        self.lock = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.lock.acquire.return_value = True
+        patcher = mock.patch.object(SyncJobRunner, 'get_executor')
+        self.executor = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def hold_lock(self):
+        """Make another sync hold the lock, returning its job"""
+        self.lock.acquire.return_value = False
+        return SyncJob.objects.create(kind='since_last', source='scheduler', status='running')
+
+    def test_submit_queues_a_job(self):
+        job = SyncJobRunner.submit(50)
+        self.assertEqual((job.status, job.kind, job.source, job.count), ('queued', 'latest', 'api', 50))
+        # The background run releases the lock once done
+        self.executor.submit.assert_called_once_with(SyncJobRunner._run_in_background, job.pk, self.lock)
+        self.lock.release.assert_not_called()
+
+    def test_submit_coalesces_into_the_running_job(self):
+        running = self.hold_lock()
+        job = SyncJobRunner.submit(50)
+        self.assertEqual(job.status, 'coalesced')
+        self.assertEqual(job.coalesced_into, running)
+        self.executor.submit.assert_not_called()
+
+    def test_run_now_skips_while_another_sync_runs(self):
+        running = self.hold_lock()
+        with mock.patch('news.jobs.HackerNewsAPI') as api:
+            job = SyncJobRunner.run_now('since_last', 'command')
+        self.assertEqual((job.status, job.source), ('skipped', 'command'))
+        self.assertEqual(job.coalesced_into, running)
+        api.sync_since_last.assert_not_called()
+
+    def test_run_now_runs_and_releases_the_lock(self):
+        with mock.patch('news.jobs.HackerNewsAPI') as api:
+            api.sync_since_last.return_value = {'synced_count': 3, 'failed_count': 0, 'lag': 0}
+            job = SyncJobRunner.run_now('since_last', 'scheduler', count=500)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result['synced_count'], 3)
+        api.sync_since_last.assert_called_once_with(progress=mock.ANY, batch_size=500)
+        self.lock.release.assert_called_once_with()
+
+    def test_post_sync_is_accepted(self):
+        response = self.client.post('/api/sync/', {'count': 5})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'accepted')
+        job = SyncJob.objects.get(job_id=response.json()['job_id'])
+        self.assertEqual((job.status, job.count), ('queued', 5))
+
+    def test_post_sync_is_coalesced_while_another_sync_runs(self):
+        running = self.hold_lock()
+        response = self.client.post('/api/sync/', {'count': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'coalesced')
+        self.assertEqual(response.json()['job_id'], str(running.job_id))
+        self.assertTrue(SyncJob.objects.filter(status='coalesced', coalesced_into=running).exists())
+
+
+class DomainTests(SimpleTestCase):
+    """Domain and URL hash normalisation"""
+
+    def test_normalize_domain(self):
+        self.assertEqual(normalize_domain('https://www.GitHub.com:443/x'), 'github.com')
+        self.assertEqual(normalize_domain('http://news.ycombinator.com./item?id=1'), 'news.ycombinator.com')
+        self.assertEqual(normalize_domain('www.example.org'), 'example.org')
+        self.assertEqual(normalize_domain('blog.www.example.org'), 'blog.www.example.org')
+        self.assertIsNone(normalize_domain(None))
+        self.assertIsNone(normalize_domain(''))
+        self.assertIsNone(normalize_domain('https:///path-only'))
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            normalize_url('https://www.example.com/post/?utm_source=hn&b=2&a=1&fbclid=x#comments'),
+            'example.com/post?a=1&b=2',
+        )
+        self.assertEqual(normalize_url('http://example.com/'), 'example.com')
+        self.assertEqual(normalize_url('example.com/post'), 'example.com/post')
+        self.assertIsNone(normalize_url('not a url'))
+
+    def test_reposts_hash_alike(self):
+        variants = [
+            'https://example.com/post',
+            'http://www.example.com/post/',
+            'https://EXAMPLE.com/post#top',
+            'https://example.com/post?utm_campaign=x',
+        ]
+        self.assertEqual(len({url_hash(url) for url in variants}), 1)
+        self.assertNotEqual(url_hash('https://example.com/post'), url_hash('https://example.com/other'))
+
+    def test_url_fields(self):
+        domain, digest = url_fields('https://www.example.com/post')
+        self.assertEqual(domain, 'example.com')
+        self.assertEqual(len(digest), 40)
+        self.assertEqual(url_fields(None), (None, None))
+        # An invalid port or IPv6 literal makes urlsplit raise
+        self.assertEqual(url_fields('http://[::1'), (None, None))
+
+
+@override_settings(REPLICA_MAX_LAG=10)
+class ReplicaRouterTests(SimpleTestCase):
+    """Routing reads to replicas and pinning clients that wrote"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patcher = mock.patch('news.routers.monitor.usable_replicas', return_value=['replica'])
+        self.usable_replicas = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, state):
+        token = _routing.set(state)
+        self.addCleanup(_routing.reset, token)
+        return state
+
+    def test_outside_requests_read_from_the_primary(self):
+        self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_read_only_requests_read_items_from_one_replica(self):
+        self.route(RequestRouting(use_replica=True))
+        self.assertEqual(self.router.db_for_read(Item), 'replica')
+        self.assertEqual(self.router.db_for_read(Author), 'replica')
+        self.assertEqual(self.usable_replicas.call_count, 1)
+        # Sync job state is read right after background threads write it
+        self.assertIsNone(self.router.db_for_read(SyncJob))
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        state = self.route(RequestRouting(use_replica=True))
+        self.assertEqual(self.router.db_for_write(Item), 'default')
+        self.assertTrue(state.wrote)
+        self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_no_usable_replica(self):
+        self.usable_replicas.return_value = []
+        self.route(RequestRouting(use_replica=True))
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+
+    def test_unpinned_writes(self):
+        state = self.route(RequestRouting(use_replica=True))
+        with unpinned():
+            self.router.db_for_write(Author)
+            self.assertIsNone(self.router.db_for_read(Author))
+        self.assertFalse(state.wrote)
+        self.assertEqual(self.router.db_for_read(Author), 'replica')
+
+    def test_middleware_pins_clients_that_wrote(self):
+        factory = RequestFactory()
+
+        def view(request):
+            if request.method == 'POST':
+                ReplicaRouter().db_for_write(Item)
+            return HttpResponse(str(_routing.get().use_replica))
+
+        with mock.patch('news.routers.replica_aliases', return_value=['replica']):
+            middleware = ReplicaRoutingMiddleware(view)
+
+        response = middleware(factory.get('/api/items/'))
+        self.assertEqual(response.content, b'True')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response = middleware(factory.post('/api/items/'))
+        self.assertEqual(response.content, b'False')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        request = factory.get('/api/items/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(middleware(request).content, b'False')
+        self.assertIsNone(_routing.get())
+
+    def test_read_through_does_not_pin(self):
+        def store(item_id):
+            ReplicaRouter().db_for_write(Item)
+            return Item(item_id=item_id)
+
+        def view(request):
+            fetch_item(8863)
+            return HttpResponse(str(self.router.db_for_read(Item)))
+
+        with mock.patch('news.routers.replica_aliases', return_value=['replica']):
+            middleware = ReplicaRoutingMiddleware(view)
+        with mock.patch('news.readthrough.cache') as cache, \
+                mock.patch('news.readthrough.is_plausible_item_id', return_value=True), \
+                mock.patch('news.readthrough._fetch_and_store', side_effect=store) as fetch_and_store:
+            cache.get.return_value = None
+            response = middleware(RequestFactory().get('/api/items/8863/'))
+
+        fetch_and_store.assert_called_once_with(8863)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(response.content, b'replica')
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Collapsing concurrent calls for one key"""
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return 'item'
+
+        def call():
+            results.append(flight.do(42, fetch))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        with self.assertLogs('news.readthrough', 'DEBUG') as logs:
+            for thread in threads:
+                thread.start()
+            # Land the flight once the four followers have joined it
+            deadline = time.monotonic() + 5
+            while len(logs.records) < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['item'] * 5)
+        self.assertEqual(flight._calls, {})
+
+    def test_exceptions_reach_every_caller_and_are_not_cached(self):
+        flight = SingleFlight()
+        with self.assertRaises(RuntimeError):
+            flight.do('key', mock.Mock(side_effect=RuntimeError('HN is down')))
+        self.assertEqual(flight.do('key', lambda: 'retried'), 'retried')
+
+    def test_keys_are_independent(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do(1, lambda: 'one'), 'one')
+        self.assertEqual(flight.do(2, lambda: 'two'), 'two')
+
+
+class ImportRowTests(SimpleTestCase):
+    """Staging rows of the importer and their COPY text encoding"""
+
+    def test_copy_value(self):
+        self.assertEqual(copy_value(None), '\\N')
+        self.assertEqual(copy_value(True), 't')
+        self.assertEqual(copy_value(False), 'f')
+        self.assertEqual(copy_value(0), '0')
+        self.assertEqual(copy_value([1, 2, 3]), '{1,2,3}')
+        self.assertEqual(copy_value([]), '{}')
+        self.assertEqual(copy_value('a\tb\nc\rd\\e\x00f'), 'a\\tb\\nc\\rd\\\\ef')
+        self.assertEqual(copy_value('\\N'), '\\\\N')
+
+    def test_id_list(self):
+        self.assertEqual(id_list([1, '2', 3.0, True, None, 2 ** 31, 4]), [1, 4])
+        self.assertEqual(id_list('1,2'), [])
+        self.assertEqual(id_list(None), [])
+
+    def test_api_format(self):
+        row = to_row(7, {
+            'id': 8863, 'type': 'story', 'by': 'dhouston', 'time': 1175714200, 'title': 'My YC app',
+            'url': 'http://www.getdropbox.com/u/2/screencast.html', 'score': 111, 'descendants': 71,
+            'kids': [8952, 9224], 'parent': None,
+        })
+        self.assertEqual(row['seq'], 7)
+        self.assertEqual(row['item_id'], 8863)
+        self.assertEqual(row['time'], '2007-04-04T19:16:40')
+        self.assertEqual(row['domain'], 'getdropbox.com')
+        self.assertEqual(row['kids'], [8952, 9224])
+        self.assertEqual((row['score'], row['descendants'], row['dead']), (111, 71, False))
+        self.assertEqual(set(row), set(STAGING_COLUMNS))
+
+    def test_export_format(self):
+        row = to_row(1, {
+            'item_id': 2, 'type': 'comment', 'time': '2025-03-23T14:08:00+02:00', 'parent': '1',
+            'score': None, 'descendants': 3.0, 'title': 42,
+        })
+        self.assertEqual(row['time'], '2025-03-23T12:08:00')
+        self.assertEqual((row['parent_item_id'], row['score'], row['descendants']), (1, 0, 3))
+        self.assertEqual(row['title'], '42')
+
+    def test_defaults_and_truncation(self):
+        row = to_row(1, {'id': 3, 'title': 'x' * 600})
+        self.assertEqual(row['type'], 'story')
+        self.assertEqual(len(row['title']), 500)
+        self.assertIsNotNone(row['time'])
+
+    def test_records_without_an_id_are_skipped(self):
+        self.assertIsNone(to_row(1, {'type': 'story'}))
+        self.assertIsNone(to_row(1, {'id': '12'}))
+        self.assertIsNone(to_row(1, {'id': 2 ** 31}))
+        self.assertIsNone(to_row(1, [1, 2]))
+
+    def test_invalid_fields_raise_value_error(self):
+        for data in (
+            {'id': 1, 'score': 'lots'},
+            {'id': 1, 'score': 2 ** 40},
+            {'id': 1, 'descendants': 1.5},
+            {'id': 1, 'parent': True},
+            {'id': 1, 'by': ['pg']},
+            {'id': 1, 'text': {'html': 'x'}},
+            {'id': 1, 'time': 'yesterday'},
+            {'id': 1, 'time': 1e300},
+            {'id': 1, 'time': [1175714200]},
+        ):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                to_row(1, data)
+
+    def test_rows_encode_as_one_copy_line(self):
+        row = to_row(1, {'id': 5, 'text': 'line one\nline\ttwo \\ end', 'kids': [6]})
+        line = '\t'.join(copy_value(row[column]) for column in STAGING_COLUMNS)
+        self.assertNotIn('\n', line)
+        self.assertEqual(len(line.split('\t')), len(STAGING_COLUMNS))
@@ -0,0 +1,62 @@
+import logging
+from collections import defaultdict
+from .models import Item
+from .serializers import CommentSerializer, ItemSerializer
+
+logger = logging.getLogger(__name__)
+
+# Deepest level of replies loaded for a thread
+MAX_THREAD_DEPTH = 100
+
+
+def collect_descendants(root, max_depth=MAX_THREAD_DEPTH):
+    """Load every reply below root, one query per level of the thread"""
+    descendants = []
+    level = [root.pk]
+    for _ in range(max_depth):
+        replies = list(Item.objects.filter(parent_id__in=level))
+        if not replies:
+            break
+        descendants.extend(replies)
+        level = [reply.pk for reply in replies]
+    return descendants
+
+
+async def acollect_descendants(root, max_depth=MAX_THREAD_DEPTH):
+    """Async version of collect_descendants using the async ORM"""
+    descendants = []
+    level = [root.pk]
+    for _ in range(max_depth):
+        replies = [reply async for reply in Item.objects.filter(parent_id__in=level)]
+        if not replies:
+            break
+        descendants.extend(replies)
+        level = [reply.pk for reply in replies]
+    return descendants
+
+
+def serialize_thread(root, descendants):
+    """
+    Nest serialized replies under their parents, starting from root.
+
+    Siblings follow their parent's kids list (HN's ranked display order),
+    with replies missing from it appended oldest first.
+    """
+    by_parent = defaultdict(list)
+    for reply in descendants:
+        by_parent[reply.parent_id].append(reply)
+
+    serialized = {
+        reply.pk: data
+        for reply, data in zip(descendants, CommentSerializer(descendants, many=True).data)
+    }
+
+    def attach(item, data):
+        replies = by_parent.get(item.pk, [])
+        rank = {kid: index for index, kid in enumerate(item.kids or [])}
+        replies.sort(key=lambda reply: (rank.get(reply.item_id, len(rank)), reply.time))
+        data['children'] = [attach(reply, serialized[reply.pk]) for reply in replies]
+        return data
+
+    logger.debug(f"Serializing thread {root.item_id} with {len(descendants)} replies")
+    return attach(root, ItemSerializer(root).data)
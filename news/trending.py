@@ -0,0 +1,151 @@
+"""
+Trending stories, ranked by recent velocity.
+
+A batch job (scheduled every TRENDING_INTERVAL seconds, or run with
+`manage.py update_trending`) refreshes the stories posted in the last
+TRENDING_REFRESH_AGE seconds, which records score history snapshots for
+those that moved, as a 'refresh' sync job (skipped while another sync
+holds the sync lock), then ranks stories by the points they gained per hour
+over the last TRENDING_WINDOW seconds, and replaces the TrendingStory rows
+in one transaction. /api/items/trending/ only reads those rows, so requests
+never aggregate the history.
+
+A story's gain is measured from its last snapshot before the window, or
+from its first snapshot in it if it is newer than that, to its latest one.
+Velocities are per hour since that baseline, counting at least
+TRENDING_MIN_HOURS so a story seen twice a minute apart does not top the
+ranking.
+"""
+import datetime, logging, time
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .history import maintain
+from .jobs import SyncJobRunner
+from .metrics import TRENDING_RUN_SECONDS
+from .models import Item, ScoreSnapshot, TrendingStory
+from .serializers import ItemSerializer
+
+logger = logging.getLogger(__name__)
+
+TRENDING_SQL = f"""
+    WITH recent AS (
+        SELECT item_id FROM {ScoreSnapshot._meta.db_table} WHERE at > %(start)s GROUP BY item_id
+    ), measured AS (
+        SELECT recent.item_id, latest.score, latest.descendants,
+               COALESCE(before.score, first.score) AS base_score,
+               COALESCE(before.descendants, first.descendants) AS base_descendants,
+               CASE WHEN before.score IS NULL THEN first.at ELSE %(start)s END AS base_at
+        FROM recent
+        CROSS JOIN LATERAL (
+            SELECT score, descendants FROM {ScoreSnapshot._meta.db_table}
+            WHERE item_id = recent.item_id ORDER BY at DESC LIMIT 1
+        ) AS latest
+        CROSS JOIN LATERAL (
+            SELECT score, descendants, at FROM {ScoreSnapshot._meta.db_table}
+            WHERE item_id = recent.item_id AND at > %(start)s ORDER BY at LIMIT 1
+        ) AS first
+        LEFT JOIN LATERAL (
+            SELECT score, descendants FROM {ScoreSnapshot._meta.db_table}
+            WHERE item_id = recent.item_id AND at <= %(start)s ORDER BY at DESC LIMIT 1
+        ) AS before ON true
+    ), rated AS (
+        SELECT item_id,
+               score - base_score AS score_gain,
+               COALESCE(descendants, 0) - COALESCE(base_descendants, 0) AS descendants_gain,
+               GREATEST(EXTRACT(EPOCH FROM %(now)s - base_at) / 3600, %(min_hours)s) AS hours
+        FROM measured
+    )
+    INSERT INTO {TrendingStory._meta.db_table}
+        (item_id, rank, score_gain, descendants_gain, score_velocity, descendants_velocity, computed_at)
+    SELECT item_id,
+           row_number() OVER (ORDER BY score_gain / hours DESC, descendants_gain / hours DESC, item_id DESC),
+           score_gain, descendants_gain, score_gain / hours, descendants_gain / hours, %(now)s
+    FROM rated
+    WHERE score_gain > 0
+      AND NOT EXISTS (SELECT 1 FROM {Item._meta.db_table} WHERE item_id = rated.item_id AND dead)
+    ORDER BY score_gain / hours DESC, descendants_gain / hours DESC, item_id DESC
+    LIMIT %(limit)s
+"""
+
+
+def compute_trending(now=None):
+    """Rank stories by velocity over the trending window, replacing the previous ranking"""
+    now = now or timezone.now()
+    window = getattr(settings, 'TRENDING_WINDOW', 21600)
+    params = {
+        'now': now,
+        'start': now - datetime.timedelta(seconds=window),
+        'min_hours': getattr(settings, 'TRENDING_MIN_HOURS', 0.5),
+        'limit': getattr(settings, 'TRENDING_SIZE', 100),
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TrendingStory._meta.db_table}")
+        cursor.execute(TRENDING_SQL, params)
+        ranked = cursor.rowcount
+    logger.info("Ranked %d trending stories", ranked)
+    return ranked
+
+
+def refresh_recent_stories(source):
+    """
+    Resync the stories posted in the last TRENDING_REFRESH_AGE seconds as a
+    'refresh' SyncJob, so it takes the sync lock like every other sync and
+    is skipped while one runs. Returns the job, or None if refreshing is off.
+    """
+    if not getattr(settings, 'TRENDING_REFRESH_AGE', 86400):
+        return None
+    job = SyncJobRunner.run_now('refresh', source, count=getattr(settings, 'TRENDING_REFRESH_MAX', 1000))
+    if job.status == 'skipped':
+        logger.warning("Skipped refreshing recent stories, another sync is still running")
+    return job
+
+
+def update_trending(source='command'):
+    """
+    The trending batch job: refresh recent stories, age the score history
+    and recompute the ranking. Returns a summary.
+    """
+    start_time = time.monotonic()
+    job = refresh_recent_stories(source)
+    refreshed = (job.result if job is not None else None) or {}
+    history = maintain()
+    ranked = compute_trending()
+    elapsed = time.monotonic() - start_time
+    TRENDING_RUN_SECONDS.observe(elapsed)
+    return {
+        'refreshed': refreshed.get('synced_count', 0),
+        'refresh_failed': refreshed.get('failed_count', 0),
+        'refresh_status': job.status if job is not None else None,
+        'ranked': ranked,
+        'history': history,
+        'elapsed_time': elapsed,
+    }
+
+
+def load_trending(limit):
+    """
+    The top stories of the last ranking, with their trending stats.
+
+    Returns (computed_at, stories), computed_at None if no ranking has been
+    computed yet.
+    """
+    ranking = list(TrendingStory.objects.all()[:limit])
+    if not ranking:
+        return None, []
+    items = Item.objects.in_bulk([entry.item_id for entry in ranking], field_name='item_id')
+    stories = []
+    for entry in ranking:
+        item = items.get(entry.item_id)
+        if item is None:
+            continue
+        data = ItemSerializer(item).data
+        data['trending'] = {
+            'rank': entry.rank,
+            'score_gain': entry.score_gain,
+            'descendants_gain': entry.descendants_gain,
+            'score_velocity': round(entry.score_velocity, 2),
+            'descendants_velocity': round(entry.descendants_velocity, 2),
+        }
+        stories.append(data)
+    return ranking[0].computed_at, stories
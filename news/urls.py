@@ -1,12 +1,38 @@
 from django.urls import path
+from .async_views import AsyncItemDetailView, AsyncItemListView, AsyncItemThreadView
 from .views import (
+    AuthorView,
+    DomainDetailView,
+    DomainListView,
+    ItemBatchView,
+    ItemExportView,
+    ItemFacetsView,
     ItemListCreateView, 
     ItemRetrieveUpdateDestroyView,
+    ItemThreadView,
+    PollView,
     SyncView,
+    SyncJobDetailView,
+    TrendingView,
+    RequestStatsView,
 )
 
 urlpatterns = [
     path('items/', ItemListCreateView.as_view(), name='item-list'),
+    path('items/batch/', ItemBatchView.as_view(), name='item-batch'),
+    path('items/export/', ItemExportView.as_view(), name='item-export'),
+    path('items/facets/', ItemFacetsView.as_view(), name='item-facets'),
+    path('items/trending/', TrendingView.as_view(), name='item-trending'),
     path('items/<int:item_id>/', ItemRetrieveUpdateDestroyView.as_view(), name='item-detail'),
+    path('items/<int:item_id>/thread/', ItemThreadView.as_view(), name='item-thread'),
+    path('items/<int:item_id>/poll/', PollView.as_view(), name='item-poll'),
+    path('async/items/', AsyncItemListView.as_view(), name='async-item-list'),
+    path('async/items/<int:item_id>/', AsyncItemDetailView.as_view(), name='async-item-detail'),
+    path('async/items/<int:item_id>/thread/', AsyncItemThreadView.as_view(), name='async-item-thread'),
+    path('domains/', DomainListView.as_view(), name='domain-list'),
+    path('domains/<str:domain>/', DomainDetailView.as_view(), name='domain-detail'),
+    path('users/<str:by>/', AuthorView.as_view(), name='author-detail'),
     path('sync/', SyncView.as_view(), name='sync'),
+    path('sync/<uuid:job_id>/', SyncJobDetailView.as_view(), name='sync-job-detail'),
+    path('stats/requests/', RequestStatsView.as_view(), name='request-stats'),
 ]
\ No newline at end of file
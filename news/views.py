@@ -1,34 +1,30 @@
-import logging
+import logging, os
 from rest_framework import generics, filters, status
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
-from django_filters import FilterSet, CharFilter, BooleanFilter
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Item
-from .serializers import ItemSerializer, ItemDetailSerializer
-from .services import HackerNewsAPI
+from .authors import get_author
+from .export import CONTENT_TYPES, ExportError, export_chunks, export_queryset
+from .domains import normalize_domain
+from .facets import FacetError, domain_stats, facet_counts, top_domains
+from .filters import ItemFilter
+from .instrumentation import request_stats
+from .jobs import SyncJobRunner
+from .metrics import render as render_metrics
+from .models import Item, SyncJob
+from .polls import load_poll, serialize_poll
+from .serializers import AuthorSerializer, ItemSerializer, ItemDetailSerializer, SyncJobSerializer
+from .readthrough import fetch_item, fetch_items
+from .threads import collect_descendants, serialize_thread
+from .trending import load_trending
 
 logger = logging.getLogger(__name__)
 
-class ItemFilter(FilterSet):
-    """FilterSet for Item model"""
-    type = CharFilter(field_name='type')
-    by = CharFilter(field_name='by')
-    dead = BooleanFilter(field_name='dead')
-    created_locally = BooleanFilter(field_name='created_locally')
-    top_level = BooleanFilter(method='filter_top_level')
-    
-    def filter_top_level(self, queryset, name, value):
-        """Filter for top-level items (no parent)"""
-        if value:
-            return queryset.filter(parent__isnull=True)
-        return queryset
-    
-    class Meta:
-        model = Item
-        fields = ['type', 'by', 'dead', 'created_locally']
-
-
 class ItemListCreateView(generics.ListCreateAPIView):
     """
     API endpoint for listing and creating HN items.
@@ -77,6 +73,8 @@ class ItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     
     GET:
     - Returns detailed information about a specific item, including comments
+    - With ITEM_READ_THROUGH enabled, an item that has not been synced yet is
+      fetched from Hacker News, stored and returned instead of a 404
     
     PUT/PATCH:
     - Updates a locally created item (not from Hacker News)
@@ -94,6 +92,18 @@ class ItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return ItemDetailSerializer
         return ItemSerializer
     
+    def get_object(self):
+        """Fall back to fetching the item from Hacker News on a read miss"""
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method != 'GET' or not getattr(settings, 'ITEM_READ_THROUGH', False):
+                raise
+            item = fetch_item(self.kwargs['item_id'])
+            if item is None:
+                raise
+            return item
+    
     def update(self, request, *args, **kwargs):
         """Override update method to add protection for HN items"""
         item_id = kwargs.get('item_id')
@@ -123,14 +133,288 @@ class ItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return super().destroy(request, *args, **kwargs)
 
 
-class SyncView(APIView):
+class ItemExportView(View):
+    """
+    API endpoint for exporting items in bulk.
+    
+    GET:
+    - Streams every matching item as NDJSON (default) or CSV (format=csv),
+      ordered by item_id, in constant memory
+    - Supports the same filters as GET /api/items/
+    - since: only export items synced after this ISO timestamp, less
+      EXPORT_SINCE_OVERLAP seconds. The X-Export-Watermark response header
+      holds the value to pass as since for the next incremental export;
+      consecutive exports overlap, so upsert their rows by item_id
+    """
+    def get(self, request):
+        fmt = request.GET.get('format', 'ndjson')
+        params = request.GET.copy()
+        params.pop('format', None)
+        logger.info(f"ItemExportView.get called with params: {request.GET.dict()}")
+        
+        try:
+            if fmt not in CONTENT_TYPES:
+                raise ExportError(f"Unsupported format: {fmt}")
+            queryset, watermark = export_queryset(params)
+        except ExportError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        
+        response = StreamingHttpResponse(export_chunks(queryset, fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="items.{fmt}"'
+        response['X-Export-Watermark'] = watermark.isoformat()
+        return response
+
+
+class ItemFacetsView(APIView):
+    """
+    API endpoint for counting items by facet.
+    
+    GET:
+    - Returns the number of matching items, their counts per type, dead and
+      created_locally value, and their top authors, from one grouped query
+    - Supports the same filters as GET /api/items/
+    - Results are cached per filter until items are next written
+    """
+    def get(self, request, format=None):
+        try:
+            facets = facet_counts(request.query_params)
+        except FacetError as e:
+            return Response({"error": e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(facets)
+
+
+class TrendingView(APIView):
+    """
+    API endpoint for the stories trending now.
+    
+    GET:
+    - Returns the stories that gained the most points per hour over the
+      last TRENDING_WINDOW seconds, with their gains and velocities, as
+      ranked by the last trending run
+    - limit: number of stories returned (default 30, at most TRENDING_SIZE)
+    """
+    def get(self, request, format=None):
+        try:
+            limit = int(request.query_params.get('limit', 30))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), getattr(settings, 'TRENDING_SIZE', 100))
+        computed_at, stories = load_trending(limit)
+        return Response({
+            'computed_at': computed_at,
+            'window': getattr(settings, 'TRENDING_WINDOW', 21600),
+            'results': stories,
+        })
+
+
+class DomainListView(APIView):
+    """
+    API endpoint for the domains stories link to.
+    
+    GET:
+    - Returns the domains with the most matching items, each with its number
+      of items and stories, total and average score, and latest item time
+    - limit: number of domains returned (default 20, at most 100)
+    - Supports the same filters as GET /api/items/
+    """
+    def get(self, request, format=None):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        params = request.query_params.copy()
+        params.pop('limit', None)
+        try:
+            domains = top_domains(params, limit)
+        except FacetError as e:
+            return Response({"error": e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": domains})
+
+
+class DomainDetailView(APIView):
+    """
+    API endpoint for the stats of one domain.
+    
+    GET:
+    - Returns the domain's number of items and stories, total and average
+      score, number of authors, and first and latest item times
+    - Supports the same filters as GET /api/items/, e.g. type=story
+    """
+    def get(self, request, domain, format=None):
+        domain = normalize_domain(domain)
+        try:
+            stats = domain_stats(domain, request.query_params) if domain else None
+        except FacetError as e:
+            return Response({"error": e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        if stats is None:
+            raise Http404
+        return Response(stats)
+
+
+class AuthorView(APIView):
+    """
+    API endpoint for a Hacker News user.
+    
+    GET:
+    - Returns the user's profile (karma, created, about, submitted) and their
+      stored stories, comments, total score and newest item time, precomputed
+      when items are written
+    - Profiles not fetched yet, or older than AUTHOR_SYNC_TTL seconds, are
+      fetched from Hacker News first
+    """
+    def get(self, request, by, format=None):
+        author = get_author(by)
+        if author is None:
+            raise Http404
+        return Response(AuthorSerializer(author).data)
+
+
+class ItemBatchView(APIView):
+    """
+    API endpoint for looking up many items at once.
+    
+    GET:
+    - ids: comma-separated item IDs (up to ITEM_BATCH_MAX_IDS)
+    
+    POST:
+    - ids: list of item IDs, for lists too long for a query string
+    
+    Both accept:
+    - keyed: return results as an object keyed by item_id instead of a list
+      in the requested order
+    - fetch_missing: fetch IDs not in the database from Hacker News
+    
+    Items are loaded with a single query. IDs that could not be found are
+    listed under "missing".
+    """
+    def get(self, request, format=None):
+        """Handle GET requests with IDs in the query string"""
+        return self.lookup(request, request.query_params.getlist('ids'))
+    
+    def post(self, request, format=None):
+        """Handle POST requests with IDs in the body"""
+        ids = request.data.get('ids', [])
+        return self.lookup(request, ids if isinstance(ids, list) else [ids])
+    
+    def lookup(self, request, raw_ids):
+        data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+        params = {**request.query_params.dict(), **(data if isinstance(data, dict) else {})}
+        keyed = str(params.get('keyed', '')).lower() in ('1', 'true')
+        fetch_missing = str(params.get('fetch_missing', '')).lower() in ('1', 'true')
+        
+        try:
+            item_ids = self.parse_ids(raw_ids)
+        except ValueError:
+            return Response(
+                {"error": "ids must be a list of integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_ids = getattr(settings, 'ITEM_BATCH_MAX_IDS', 500)
+        if not item_ids:
+            return Response({"error": "No ids provided"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(item_ids) > max_ids:
+            return Response(
+                {"error": f"Too many ids: {len(item_ids)} (limit: {max_ids})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        items = {item.item_id: item for item in Item.objects.filter(item_id__in=item_ids)}
+        missing = [item_id for item_id in item_ids if item_id not in items]
+        logger.info(f"ItemBatchView found {len(items)}/{len(item_ids)} items")
+        
+        if missing and fetch_missing:
+            fetched = fetch_items(missing)
+            items.update({item_id: item for item_id, item in fetched.items() if item})
+            missing = [item_id for item_id in missing if item_id not in items]
+            logger.info(f"ItemBatchView fetched {len(fetched) - len(missing)} missing items from HN")
+        
+        found = [items[item_id] for item_id in item_ids if item_id in items]
+        data = ItemSerializer(found, many=True).data
+        if keyed:
+            results = {str(item['item_id']): item for item in data}
+        else:
+            results = data
+        return Response({"results": results, "missing": missing})
+    
+    @staticmethod
+    def parse_ids(raw_ids):
+        """Flatten comma-separated values into unique integer IDs, keeping order"""
+        item_ids = []
+        for value in raw_ids:
+            for part in str(value).split(','):
+                if part.strip():
+                    item_ids.append(int(part))
+        return list(dict.fromkeys(item_ids))
+
+
+class ItemThreadView(generics.RetrieveAPIView):
+    """
+    API endpoint for reading a whole discussion thread.
+    
+    GET:
+    - Returns the item with all of its replies nested under "children",
+      siblings in Hacker News' ranked display order
+    """
+    queryset = Item.objects.all()
+    serializer_class = ItemSerializer
+    lookup_field = 'item_id'
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Load the replies level by level and nest them"""
+        root = self.get_object()
+        descendants = collect_descendants(root)
+        logger.info(f"ItemThreadView.retrieve loaded {len(descendants)} replies for item {root.item_id}")
+        return Response(serialize_thread(root, descendants))
+
+
+class PollView(APIView):
+    """
+    API endpoint for reading a poll with its results.
+    
+    GET:
+    - Returns the poll with its options in display order, each with its
+      votes and share of the total, loaded together in a single query
+    - fetch_missing: fetch options not in the database from Hacker News.
+      Options still missing are listed under "missing"
+    """
+    def get(self, request, item_id, format=None):
+        poll, options, missing = load_poll(item_id)
+        if poll is None and getattr(settings, 'ITEM_READ_THROUGH', False) and fetch_item(item_id):
+            # A replica may not have the fetched poll yet
+            poll, options, missing = load_poll(item_id, using=DEFAULT_DB_ALIAS)
+        if poll is None:
+            raise Http404
+        if poll.type != 'poll':
+            return Response({"error": f"Item {item_id} is not a poll"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        fetch_missing = request.query_params.get('fetch_missing', '').lower() in ('1', 'true')
+        if missing and fetch_missing:
+            logger.info(f"PollView fetching {len(missing)} missing options of poll {item_id}")
+            fetch_items(missing)
+            poll, options, missing = load_poll(item_id, using=DEFAULT_DB_ALIAS)
+        return Response(serialize_poll(poll, options, missing))
+
+
+class SyncView(generics.ListAPIView):
     """
     API endpoint for manually triggering a sync with Hacker News.
     
+    GET:
+    - Returns recent sync jobs from every source (API, scheduler, commands)
+    - Supports filtering by status, source and kind, e.g. ?status=skipped
+    
     POST:
-    - Triggers a sync with Hacker News
+    - Enqueues a background sync with Hacker News and returns 202 with a job ID
     - Can specify a count parameter to limit the number of items to sync
+    - If a sync is already running, the request is coalesced into it and the
+      running job's ID is returned with 200 instead
     """
+    queryset = SyncJob.objects.select_related('coalesced_into')
+    serializer_class = SyncJobSerializer
+    filterset_fields = ['status', 'source', 'kind']
+    ordering_fields = ['created_at']
+    
     def post(self, request, format=None):
         """Handle POST requests to trigger a sync"""
         logger.info(f"SyncView.post called with data: {request.data}")
@@ -143,17 +427,69 @@ class SyncView(APIView):
                 count = 100
                 logger.warning(f"Invalid count parameter: {request.data.get('count')}, using default: 100")
 
-            logger.info(f"Starting manual sync with count={count}")
-            result = HackerNewsAPI.sync_latest_items(count)
+            logger.info(f"Enqueuing manual sync with count={count}")
+            job = SyncJobRunner.submit(count)
+            
+            if job.status == 'coalesced':
+                running = job.coalesced_into or job
+                return Response({
+                    "status": "coalesced",
+                    "job_id": running.job_id,
+                    "status_url": reverse('sync-job-detail', kwargs={'job_id': running.job_id}, request=request),
+                    "message": "A sync is already running, this request has been merged into it"
+                })
             
             return Response({
-                "status": "success",
-                "result": result,
-                "message": f"Successfully synced {result.get('synced_count', 0)} items"
-            })
+                "status": "accepted",
+                "job_id": job.job_id,
+                "status_url": reverse('sync-job-detail', kwargs={'job_id': job.job_id}, request=request),
+                "message": f"Sync of {count} items has been queued"
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             logger.error(f"Error in manual sync: {str(e)}", exc_info=True)
             return Response({
                 "status": "error",
                 "message": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class SyncJobDetailView(generics.RetrieveAPIView):
+    """
+    API endpoint for checking on a background sync job.
+    
+    GET:
+    - Returns the job status and progress (items done/total, rate and ETA)
+    """
+    queryset = SyncJob.objects.select_related('coalesced_into')
+    serializer_class = SyncJobSerializer
+    lookup_field = 'job_id'
+
+
+class RequestStatsView(APIView):
+    """
+    API endpoint for the per-route request metrics of this process.
+    
+    GET:
+    - Request count, mean total/DB/serializer time, mean and max queries,
+      requests over their query budget and a latency histogram per route
+    - Aggregates are per worker process and reset when it restarts
+    """
+    def get(self, request):
+        return Response({
+            "pid": os.getpid(),
+            "routes": request_stats.snapshot(),
+        })
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint.
+    
+    GET:
+    - HN fetch latency and errors, items written/skipped, sync lag, sync job
+      and scheduler run durations, and API request latency by route, in the
+      Prometheus text format
+    """
+    def get(self, request):
+        body, content_type = render_metrics()
+        return HttpResponse(body, content_type=content_type)
@@ -62,6 +62,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     'whitenoise.runserver_nostatic',
     'corsheaders',
@@ -85,7 +86,69 @@ REST_FRAMEWORK = {
 APSCHEDULER_DATETIME_FORMAT = "N j, Y, f:s a"
 SCHEDULER_DEFAULT = True
 
+# Whether web processes compete to run the scheduled jobs. Set to false when
+# running `manage.py run_scheduler` as a separate process.
+SCHEDULER_AUTOSTART = os.environ.get('SCHEDULER_AUTOSTART', 'true').lower() in ('1', 'true', 'yes')
+# Seconds between leadership attempts by standby processes
+SCHEDULER_LEADER_RETRY = int(os.environ.get('SCHEDULER_LEADER_RETRY', 30))
+
+# Base URL of the HN API; point it at a local stand-in (see benchmarks/fake_hn.py)
+# to sync without network access
+HN_API_BASE_URL = os.environ.get('HN_API_BASE_URL', 'https://hacker-news.firebaseio.com/v0')
+
+# Number of concurrent requests when fetching several items from the HN API
+HN_FETCH_CONCURRENCY = int(os.environ.get('HN_FETCH_CONCURRENCY', 8))
+
+# Fetch user profiles from HN on GET /api/users/{by}/ when they were never
+# fetched or are older than AUTHOR_SYNC_TTL seconds
+AUTHOR_SYNC = os.environ.get('AUTHOR_SYNC', 'true').lower() in ('1', 'true', 'yes')
+AUTHOR_SYNC_TTL = int(os.environ.get('AUTHOR_SYNC_TTL', 86400))
+
+# Maximum number of IDs accepted by the batch lookup endpoint
+ITEM_BATCH_MAX_IDS = int(os.environ.get('ITEM_BATCH_MAX_IDS', 500))
+
+# Fetch items missing from the database from HN on GET /api/items/{item_id}/
+ITEM_READ_THROUGH = os.environ.get('ITEM_READ_THROUGH', 'false').lower() in ('1', 'true', 'yes')
+# Seconds to remember item IDs that HN reports as null
+READ_THROUGH_NEGATIVE_TTL = int(os.environ.get('READ_THROUGH_NEGATIVE_TTL', 600))
+
+# Rows fetched per round trip from the server-side cursor when exporting items
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+# Seconds an incremental export reaches back before its since watermark, to
+# pick up writes that committed late; keep it above the longest transaction
+# writing items (an import chunk) and the replica lag
+EXPORT_SINCE_OVERLAP = int(os.environ.get('EXPORT_SINCE_OVERLAP', 900))
+
+# Ingest pipeline used by syncs: concurrent HN fetches, bound of each stage's
+# queue, and number of items upserted per write
+SYNC_FETCH_CONCURRENCY = int(os.environ.get('SYNC_FETCH_CONCURRENCY', 8))
+SYNC_QUEUE_SIZE = int(os.environ.get('SYNC_QUEUE_SIZE', 200))
+SYNC_WRITE_BATCH_SIZE = int(os.environ.get('SYNC_WRITE_BATCH_SIZE', 100))
+
+# Per-request query count and timing instrumentation, reported in a
+# Server-Timing response header (which can be turned off separately)
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION', 'true').lower() in ('1', 'true', 'yes')
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() in ('1', 'true', 'yes')
+
+# Requests making more queries than their budget are logged as warnings;
+# QUERY_BUDGETS overrides the default per route, e.g. {'/api/items/': 5}
+QUERY_BUDGET_DEFAULT = int(os.environ.get('QUERY_BUDGET_DEFAULT', 20))
+QUERY_BUDGETS = {}
+
+# Bounds for the adaptive sync schedule. The scheduled sync starts every
+# SYNC_INTERVAL_DEFAULT seconds with SYNC_BATCH_MIN items, then tunes both from
+# the lag behind HN's maxitem, the ingest rate and the Firebase error rate.
+SYNC_INTERVAL_MIN = int(os.environ.get('SYNC_INTERVAL_MIN', 30))
+SYNC_INTERVAL_MAX = int(os.environ.get('SYNC_INTERVAL_MAX', 900))
+SYNC_INTERVAL_DEFAULT = int(os.environ.get('SYNC_INTERVAL_DEFAULT', 300))
+SYNC_BATCH_MIN = int(os.environ.get('SYNC_BATCH_MIN', 100))
+SYNC_BATCH_MAX = int(os.environ.get('SYNC_BATCH_MAX', 2000))
+# Share of failed item fetches above which the schedule backs off
+SYNC_ERROR_BACKOFF_RATE = float(os.environ.get('SYNC_ERROR_BACKOFF_RATE', 0.2))
+
 MIDDLEWARE = [
+    'news.instrumentation.RequestInstrumentationMiddleware',
+    'news.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -128,9 +191,83 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Keep connections open between requests for this many seconds (0: close after each request)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Check that a reused connection still works before its first query
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
+    }
+}
+
+# Read replicas as comma-separated host[:port], using the primary's database
+# name and credentials. Item reads of read-only API requests go to a replica;
+# see news/routers.py
+DB_REPLICAS = [replica.strip() for replica in os.environ.get('DB_REPLICAS', '').split(',') if replica.strip()]
+for index, replica in enumerate(DB_REPLICAS, 1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'],
+        HOST=host,
+        PORT=port or DATABASES['default']['PORT'],
+        OPTIONS={'connect_timeout': 2},
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['news.routers.ReplicaRouter']
+
+# Replicas further behind than this many seconds are skipped, and clients
+# that wrote read from the primary for as long
+REPLICA_MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG', 10))
+
+# Seconds between checks of the replicas' lag
+REPLICA_CHECK_INTERVAL = int(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+
+# Idle connections kept for background threads (sync jobs, scheduler runs,
+# the pipeline writer, read-through fetches); see news/db.py
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))
+
+# news_item is range-partitioned by item_id into partitions of this many IDs.
+# Changing it only affects partitions created from then on.
+ITEM_PARTITION_SIZE = int(os.environ.get('ITEM_PARTITION_SIZE', 1000000))
+
+# Empty partitions kept ready beyond the highest item ID seen
+ITEM_PARTITIONS_AHEAD = int(os.environ.get('ITEM_PARTITIONS_AHEAD', 2))
+
+# Cache backend and location, e.g. django.core.cache.backends.memcached.PyMemcacheCache
+# and 127.0.0.1:11211. The default in-memory cache is separate for every process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+# Seconds facet counts stay cached; writes in this process (or any process,
+# with a shared cache) invalidate them sooner
+FACETS_CACHE_TTL = int(os.environ.get('FACETS_CACHE_TTL', 300))
+
+# Number of top authors returned by the facets endpoint
+FACETS_TOP_AUTHORS = int(os.environ.get('FACETS_TOP_AUTHORS', 10))
+
+# Record score and descendants snapshots of stories whose values changed when
+# syncs write them. Snapshots are kept as they are for SCORE_HISTORY_RAW_DAYS
+# days, then downsampled to one per story and hour, and dropped after
+# SCORE_HISTORY_RETENTION_DAYS days.
+SCORE_HISTORY = os.environ.get('SCORE_HISTORY', 'true').lower() in ('1', 'true', 'yes')
+SCORE_HISTORY_RAW_DAYS = int(os.environ.get('SCORE_HISTORY_RAW_DAYS', 2))
+SCORE_HISTORY_RETENTION_DAYS = int(os.environ.get('SCORE_HISTORY_RETENTION_DAYS', 30))
+
+# Seconds between trending runs of the scheduler (0 disables them). Each run
+# resyncs up to TRENDING_REFRESH_MAX stories posted in the last
+# TRENDING_REFRESH_AGE seconds, then ranks the TRENDING_SIZE stories that
+# gained the most points per hour over the last TRENDING_WINDOW seconds,
+# counting at least TRENDING_MIN_HOURS hours.
+TRENDING_INTERVAL = int(os.environ.get('TRENDING_INTERVAL', 600))
+TRENDING_REFRESH_AGE = int(os.environ.get('TRENDING_REFRESH_AGE', 86400))
+TRENDING_REFRESH_MAX = int(os.environ.get('TRENDING_REFRESH_MAX', 1000))
+TRENDING_WINDOW = int(os.environ.get('TRENDING_WINDOW', 21600))
+TRENDING_SIZE = int(os.environ.get('TRENDING_SIZE', 100))
+TRENDING_MIN_HOURS = float(os.environ.get('TRENDING_MIN_HOURS', 0.5))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -191,6 +328,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 # Logging configuration
+
+# Log line format: 'text' (the formatters below) or 'json' (one JSON object per line)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+
+# Level of the news app's logger; DEBUG logs a line for every fetched item
+NEWS_LOG_LEVEL = os.environ.get('NEWS_LOG_LEVEL', 'DEBUG').upper()
+
+# Write the news app's records from a background thread instead of the logging one
+LOG_QUEUE = os.environ.get('LOG_QUEUE', 'false').lower() in ('1', 'true', 'yes')
+
+# Records waiting for the background thread before new ones are dropped
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -203,6 +353,9 @@ LOGGING = {
             'format': '{levelname} {asctime} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'news.log.JsonFormatter',
+        },
     },
     'handlers': {
         'console': {
@@ -235,7 +388,7 @@ LOGGING = {
         },
         'news': {
             'handlers': ['console', 'file', 'error_file'],
-            'level': 'DEBUG',  # Enable DEBUG logs for your app
+            'level': NEWS_LOG_LEVEL,
             'propagate': False,
         },
         'apscheduler': {
@@ -244,4 +397,16 @@ LOGGING = {
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+
+if LOG_FORMAT == 'json':
+    for handler in LOGGING['handlers'].values():
+        handler['formatter'] = 'json'
+
+if LOG_QUEUE:
+    LOGGING['handlers']['queue'] = {
+        '()': 'news.log.QueueListenerHandler',
+        'handlers': LOGGING['loggers']['news']['handlers'],
+        'queue_size': LOG_QUEUE_SIZE,
+    }
+    LOGGING['loggers']['news']['handlers'] = ['queue']
@@ -19,10 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from news.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('news.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
 urlpatterns += staticfiles_urlpatterns()